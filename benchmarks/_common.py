@@ -0,0 +1,58 @@
+"""
+Shared helpers for the benchmarks.
+"""
+
+import sys
+import time
+
+
+class SynchronousReactor(object):
+    """
+    Just enough of a reactor to run calls from other threads immediately.
+
+    This removes the cost of thread switches and reactor wakeups, leaving only
+    the overhead added by Crochet itself.
+    """
+
+    def callFromThread(self, f, *args, **kwargs):
+        f(*args, **kwargs)
+
+    def callLater(self, delay, f, *args, **kwargs):
+        raise NotImplementedError("Not supported by SynchronousReactor.")
+
+    def addSystemEventTrigger(self, when, event, f):
+        pass
+
+
+def synchronous_eventloop():
+    """
+    Return a crochet EventLoop using a SynchronousReactor.
+    """
+    from crochet._eventloop import EventLoop
+    reactor = SynchronousReactor()
+    eventloop = EventLoop(lambda: reactor, lambda *args: None)
+    eventloop.no_setup()
+    return eventloop
+
+
+def per_call(f, iterations):
+    """
+    Call f() the given number of times, return the average number of
+    microseconds per call (best of three runs).
+    """
+    best = None
+    for _ in range(3):
+        start = time.perf_counter()
+        for _ in range(iterations):
+            f()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best / iterations * 1e6
+
+
+def report(name, value, unit="us/call"):
+    """
+    Print a single benchmark result.
+    """
+    sys.stdout.write("%-50s %10.2f %s\n" % (name, value, unit))
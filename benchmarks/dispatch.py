@@ -0,0 +1,84 @@
+"""
+Measure the per-call cost of calling @wait_for and @run_in_reactor decorated
+functions.
+
+With --synchronous (the default) calls are run immediately in the calling
+thread, so the numbers only reflect Crochet's own dispatch overhead. With
+--reactor a real reactor thread is started with crochet.setup(), so the
+numbers include the thread hop.
+
+The "per-call run_in_reactor" line reproduces how @wait_for used to be
+implemented, re-applying @run_in_reactor to a fresh closure on every call, so
+it can be compared against the current implementation.
+"""
+
+import argparse
+
+from crochet import Tracer, InMemoryExporter
+
+from _common import per_call, report, synchronous_eventloop
+
+
+def old_wait_for(eventloop, timeout):
+    """
+    The original @wait_for implementation, using public APIs only.
+    """
+    def decorator(function):
+        def wrapper(*args, **kwargs):
+            @eventloop.run_in_reactor
+            def run():
+                return function(*args, **kwargs)
+
+            return run().wait(timeout)
+        return wrapper
+    return decorator
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--reactor", action="store_true",
+                        help="Run calls in a real reactor thread.")
+    parser.add_argument("--iterations", type=int, default=20000)
+    options = parser.parse_args()
+
+    if options.reactor:
+        import crochet
+        crochet.setup()
+        eventloop = crochet._main
+        iterations = options.iterations // 10
+    else:
+        eventloop = synchronous_eventloop()
+        iterations = options.iterations
+
+    def add(a, b):
+        return a + b
+
+    wait_for_add = eventloop.wait_for(timeout=10)(add)
+    old_wait_for_add = old_wait_for(eventloop, 10)(add)
+    run_in_reactor_add = eventloop.run_in_reactor(add)
+    no_context_wait_for_add = eventloop.wait_for(
+        timeout=10, propagate_context=False)(add)
+    no_context_run_in_reactor_add = eventloop.run_in_reactor(
+        propagate_context=False)(add)
+
+    report("@wait_for",
+           per_call(lambda: wait_for_add(1, 2), iterations))
+    report("@wait_for (per-call run_in_reactor)",
+           per_call(lambda: old_wait_for_add(1, 2), iterations))
+    report("@run_in_reactor + wait()",
+           per_call(lambda: run_in_reactor_add(1, 2).wait(10), iterations))
+    report("@wait_for (propagate_context=False)",
+           per_call(lambda: no_context_wait_for_add(1, 2), iterations))
+    report("@run_in_reactor + wait() (propagate_context=False)",
+           per_call(lambda: no_context_run_in_reactor_add(1, 2).wait(10),
+                    iterations))
+
+    for sample_rate in (1.0, 0.01):
+        eventloop.set_tracer(Tracer(InMemoryExporter(), sample_rate))
+        report("@wait_for (traced, sample_rate=%s)" % (sample_rate, ),
+               per_call(lambda: wait_for_add(1, 2), iterations))
+    eventloop.set_tracer(None)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Measure the memory used by, and the time taken to create, EventualResult
+instances hooked up to a Deferred, as done for every @run_in_reactor call.
+"""
+
+import argparse
+import gc
+import tracemalloc
+
+from twisted.internet.defer import Deferred
+
+from crochet import EventualResult
+
+from _common import per_call, report
+
+
+def memory_per_instance(factory, count):
+    """
+    Return the average number of bytes allocated by each call to factory(),
+    keeping all the created objects alive.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objects = [factory() for _ in range(count)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objects
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=100000)
+    options = parser.parse_args()
+
+    def connected():
+        result = EventualResult(None, None)
+        result._connect_deferred(Deferred())
+        return result
+
+    deferred_only = memory_per_instance(Deferred, options.count)
+    with_result = memory_per_instance(connected, options.count)
+    report("Deferred alone", deferred_only, "bytes")
+    report("EventualResult (excluding its Deferred)",
+           with_result - deferred_only, "bytes")
+    report("Create EventualResult + connect Deferred",
+           per_call(connected, options.count))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Measure how Crochet's log writer thread copes with a storm of log messages,
+e.g. from a flood of failing connections.
+
+The reactor thread is simulated by this thread logging messages as fast as
+it can, while the writer thread passes them on to the logging module. For
+each observer this reports the cost of logging a message in the reactor
+thread, how many messages were queued at most, and how long it took until
+everything had been written.
+
+The "unbounded" lines use a reproduction of the original ThreadLogObserver,
+which queued every message and wrote them one at a time to a
+PythonLoggingObserver.
+
+The last two storms log info messages while the "twisted" logger is set to
+ERROR, so they all end up being discarded, either by the logging module or,
+when filtering by level, before they are even queued.
+"""
+
+import argparse
+import io
+import logging
+import threading
+import time
+from queue import SimpleQueue
+
+from twisted.logger import LogLevel, STDLibLogObserver
+from twisted.python.log import PythonLoggingObserver
+
+from crochet._eventloop import ThreadLogObserver
+
+from _common import report
+
+_STOP = object()
+
+
+class UnboundedThreadLogObserver(object):
+    """
+    The original ThreadLogObserver.
+    """
+
+    def __init__(self, observer):
+        self._observer = observer
+        self._queue = SimpleQueue()
+        self._thread = threading.Thread(target=self._reader)
+        self._thread.start()
+
+    def _reader(self):
+        while True:
+            msg = self._queue.get()
+            if msg is _STOP:
+                return
+            try:
+                self._observer(msg)
+            except Exception:
+                pass
+
+    def stop(self):
+        self._queue.put(_STOP)
+
+    def __len__(self):
+        return self._queue.qsize()
+
+    def __call__(self, msg):
+        self._queue.put(msg)
+
+
+def storm(name, observer, messages, level=LogLevel.error):
+    """
+    Log the given number of messages at the given level to the observer, and
+    report the results.
+    """
+    max_depth = 0
+    start = time.perf_counter()
+    for i in range(messages):
+        observer({
+            "message": (), "isError": 1, "system": "-", "time": time.time(),
+            "log_level": level, "log_format": "Connection {number} refused",
+            "number": i})
+        if i % 1000 == 0:
+            max_depth = max(max_depth, len(observer))
+    logged = time.perf_counter()
+    observer.stop()
+    observer._thread.join()
+    finished = time.perf_counter()
+    report(name + ": log() in reactor thread",
+           (logged - start) / messages * 1e6)
+    report(name + ": max queued", max_depth, "messages")
+    report(name + ": until all written", finished - start, "s")
+    dropped = getattr(observer, "dropped", 0)
+    if dropped:
+        report(name + ": dropped", dropped, "messages")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--messages", type=int, default=200000)
+    options = parser.parse_args()
+
+    handler = logging.StreamHandler(io.StringIO())
+    logger = logging.getLogger("twisted")
+    logger.addHandler(handler)
+    logger.propagate = False
+
+    storm("unbounded",
+          UnboundedThreadLogObserver(PythonLoggingObserver().emit),
+          options.messages)
+    storm("bounded (drop-newest)",
+          ThreadLogObserver(STDLibLogObserver()),
+          options.messages)
+
+    logger.setLevel(logging.ERROR)
+    storm("level ERROR, unfiltered",
+          ThreadLogObserver(STDLibLogObserver()),
+          options.messages, LogLevel.info)
+    storm("level ERROR, filtered",
+          ThreadLogObserver(STDLibLogObserver(), logger=logger),
+          options.messages, LogLevel.info)
+
+
+if __name__ == '__main__':
+    main()
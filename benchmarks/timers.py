@@ -0,0 +1,143 @@
+"""
+Compare the cost of tracking call deadlines with one reactor.callLater() per
+call against Crochet's TimerWheel, with many timeouts pending at once.
+
+For each size N, N timeouts between 1 and 10 minutes away are scheduled and
+then all cancelled, as happens when calls finish before their deadline. For
+callLater() the reactor's runUntilCurrent() is run after each phase, since
+that is where new delayed calls are added to the reactor's heap and
+cancelled ones are removed from it. Memory is measured with all N timeouts
+pending.
+
+The "tick" lines measure the steady-state cost while the N timeouts are
+pending but none is due: for callLater() that is the reactor's
+runUntilCurrent() finding nothing to do, and for the TimerWheel it is the
+10ms tick that visits one slot, averaged over a whole revolution of the
+wheel, since every far-future timer in the visited slot gets looked at.
+"""
+
+import argparse
+import gc
+import random
+import time
+import tracemalloc
+
+from twisted.internet.selectreactor import SelectReactor
+from twisted.internet.task import Clock
+
+from crochet._timerwheel import TimerWheel
+
+from _common import report
+
+
+def measure(reactor, add, delays):
+    """
+    Schedule a timeout for each delay using add(), then cancel them all.
+
+    Return a tuple of (microseconds per add, microseconds per cancel).
+    """
+    gc.collect()
+    start = time.perf_counter()
+    timers = [add(delay) for delay in delays]
+    reactor.runUntilCurrent()
+    added = time.perf_counter()
+    for timer in timers:
+        timer.cancel()
+    reactor.runUntilCurrent()
+    cancelled = time.perf_counter()
+    count = len(delays)
+    return ((added - start) / count * 1e6,
+            (cancelled - added) / count * 1e6)
+
+
+def memory(reactor, add, delays):
+    """
+    Return the average number of bytes used by each pending timeout.
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    timers = [add(delay) for delay in delays]
+    reactor.runUntilCurrent()
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    for timer in timers:
+        timer.cancel()
+    reactor.runUntilCurrent()
+    return used / len(delays)
+
+
+def call_later_tick(reactor, add, delays, ticks=512):
+    """
+    Return the microseconds the reactor spends on delayed calls per loop
+    iteration, with a timeout pending for each delay but none due.
+    """
+    timers = [add(delay) for delay in delays]
+    reactor.runUntilCurrent()
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        reactor.runUntilCurrent()
+    elapsed = time.perf_counter() - start
+    for timer in timers:
+        timer.cancel()
+    reactor.runUntilCurrent()
+    return elapsed / ticks * 1e6
+
+
+def wheel_tick(delays, noop):
+    """
+    Return the average microseconds per TimerWheel tick, over one revolution
+    of the wheel, with a timeout pending for each delay but none due.
+    """
+    clock = Clock()
+    wheel = TimerWheel(clock)
+    timers = [wheel.add(delay, noop) for delay in delays]
+    ticks = len(wheel._slots)
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(ticks):
+        clock.advance(wheel._resolution)
+    elapsed = time.perf_counter() - start
+    for timer in timers:
+        timer.cancel()
+    return elapsed / ticks * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+",
+                        default=[10000, 100000, 1000000])
+    options = parser.parse_args()
+
+    def noop():
+        pass
+
+    for size in options.sizes:
+        delays = [random.uniform(60, 600) for _ in range(size)]
+
+        reactor = SelectReactor()
+
+        def call_later(delay):
+            return reactor.callLater(delay, noop)
+
+        wheel = TimerWheel(reactor)
+
+        def wheel_add(delay):
+            return wheel.add(delay, noop)
+
+        for name, add in [("callLater", call_later),
+                          ("TimerWheel", wheel_add)]:
+            add_time, cancel_time = measure(reactor, add, delays)
+            report("%s add (N=%d)" % (name, size), add_time)
+            report("%s cancel (N=%d)" % (name, size), cancel_time)
+            report("%s memory (N=%d)" % (name, size),
+                   memory(reactor, add, delays), "bytes/timeout")
+        report("callLater tick (N=%d)" % (size, ),
+               call_later_tick(reactor, call_later, delays), "us/tick")
+        report("TimerWheel tick (N=%d)" % (size, ),
+               wheel_tick(delays, noop), "us/tick")
+
+
+if __name__ == '__main__':
+    main()
@@ -2,14 +2,23 @@
 Crochet: Use Twisted Anywhere!
 """
 
-from twisted.python.log import startLoggingWithObserver
+from twisted.logger import globalLogBeginner
 from twisted.python.runtime import platform
 
 from ._shutdown import _watchdog, register
 from ._eventloop import (
-    EventualResult, EventLoop, _store, ReactorStopped
+    EventualResult, EventLoop, ReactorStopped, wait_all, wait_any,
+    as_completed, ReactorExecutor, retrieve_result, set_stash_limit,
+    set_result_store
 )
 from ._eventloop import TimeoutError  # pylint: disable=redefined-builtin
+from ._resultstore import IResultStore, ResultStore, ResultNotReady
+from ._admission import InFlightLimit, InFlightLimitExceeded
+from ._slowcallbacks import SlowCallback
+from ._profiler import ReactorProfile
+from ._tracing import (
+    Tracer, Span, InMemoryExporter, JSONLinesExporter, current_span
+)
 from ._version import get_versions
 
 if platform.type == "posix":
@@ -23,19 +32,40 @@ __version__ = get_versions()['version']
 del get_versions
 
 
+def __getattr__(name):
+    # SQLiteResultStore needs the sqlite3 module, which not every Python
+    # build includes, so it is only imported when used. For the same reason
+    # these names aren't in __all__, so "from crochet import *" works
+    # without it:
+    if name in ("SQLiteResultStore", "PickleSerializer"):
+        from . import _sqlitestore
+        return getattr(_sqlitestore, name)
+    raise AttributeError(
+        "module %r has no attribute %r" % (__name__, name))
+
+
 def _importReactor():
     from twisted.internet import reactor
     return reactor
 
 
 _main = EventLoop(
-    _importReactor, register, startLoggingWithObserver, _watchdog,
+    _importReactor, register, globalLogBeginner.beginLoggingTo, _watchdog,
     reapAllProcesses)
 setup = _main.setup
 no_setup = _main.no_setup
 run_in_reactor = _main.run_in_reactor
 wait_for = _main.wait_for
-retrieve_result = _store.retrieve
+submit_many = _main.submit_many
+set_in_flight_limit = _main.set_in_flight_limit
+reactor_stats = _main.reactor_stats
+stats = _main.stats
+render_metrics = _main.render_metrics
+serve_metrics = _main.serve_metrics
+set_tracer = _main.set_tracer
+slow_callbacks = _main.slow_callbacks
+profile_reactor = _main.profile_reactor
+set_log_queue_limit = _main.set_log_queue_limit
 
 
 __all__ = [
@@ -44,8 +74,36 @@ __all__ = [
     "EventualResult",
     "TimeoutError",
     "retrieve_result",
+    "set_stash_limit",
+    "set_result_store",
+    "IResultStore",
+    "ResultStore",
+    "ResultNotReady",
     "no_setup",
     "wait_for",
+    "submit_many",
+    "wait_all",
+    "wait_any",
+    "as_completed",
+    "ReactorExecutor",
+    "InFlightLimit",
+    "InFlightLimitExceeded",
+    "set_in_flight_limit",
+    "reactor_stats",
+    "stats",
+    "render_metrics",
+    "serve_metrics",
+    "Tracer",
+    "Span",
+    "InMemoryExporter",
+    "JSONLinesExporter",
+    "set_tracer",
+    "current_span",
+    "SlowCallback",
+    "slow_callbacks",
+    "ReactorProfile",
+    "profile_reactor",
+    "set_log_queue_limit",
     "ReactorStopped",
     "__version__",
 ]
@@ -1,29 +1,245 @@
 import sys
 
-from typing import Any, Callable, Generic, Optional, TypeVar
+from concurrent.futures import Executor, Future
+
+from typing import Any, Callable, ContextManager, Dict, Generator, Generic, Iterable, Iterator, List, Literal, Optional, Protocol, Sequence, Tuple, TypeVar, Union, IO, overload
 from twisted.python.failure import Failure
 
 _T = TypeVar("_T")
 _T_co = TypeVar("_T_co", covariant=True)
 _F = TypeVar("_F", bound=Callable[..., Any])
 
-def setup() -> None: ...
+def setup(
+    monitor: bool = ..., slow_callback_threshold: Optional[float] = ...
+) -> None: ...
+@overload
 def run_in_reactor(
     function: Callable[..., _T]
 ) -> Callable[..., EventualResult[_T]]: ...
+@overload
+def run_in_reactor(
+    *,
+    inline: Literal[False] = ...,
+    timeout: Optional[float] = ...,
+    in_flight_limit: Optional[InFlightLimit] = ...,
+    priority: str = ...,
+    propagate_context: bool = ...
+) -> Callable[[Callable[..., _T]], Callable[..., EventualResult[_T]]]: ...
+@overload
+def run_in_reactor(
+    *,
+    inline: Literal[True],
+    timeout: Optional[float] = ...,
+    in_flight_limit: Optional[InFlightLimit] = ...,
+    priority: str = ...,
+    propagate_context: bool = ...
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]: ...
+@overload
+def run_in_reactor(
+    *,
+    inline: bool,
+    timeout: Optional[float] = ...,
+    in_flight_limit: Optional[InFlightLimit] = ...,
+    priority: str = ...,
+    propagate_context: bool = ...
+) -> Callable[[Callable[..., Any]], Callable[..., Any]]: ...
 
 class EventualResult(Generic[_T_co]):
     def cancel(self) -> None: ...
     def wait(self, timeout: float) -> _T_co: ...
-    def stash(self) -> int: ...
+    def stash(self, ttl: Optional[float] = ...) -> int: ...
     def original_failure(self) -> Optional[Failure]: ...
+    def as_future(self) -> Future[_T_co]: ...
+    def __await__(self) -> Generator[Any, None, _T_co]: ...
+
+class ReactorExecutor(Executor):
+    def __init__(self) -> None: ...
 
 class TimeoutError(Exception): ...
 
 def retrieve_result(result_id: int) -> EventualResult[object]: ...
+def set_stash_limit(
+    max_size: Optional[int] = ..., ttl: Optional[float] = ...
+) -> None: ...
+
+class ResultNotReady(Exception): ...
+
+class IResultStore(Protocol):
+    evicted: int
+    expired: int
+    def __len__(self) -> int: ...
+    def configure(
+        self, max_size: Optional[int] = ..., ttl: Optional[float] = ...
+    ) -> None: ...
+    def store(
+        self, deferred_result: EventualResult[Any], ttl: Optional[float] = ...
+    ) -> int: ...
+    def retrieve(self, result_id: int) -> EventualResult[object]: ...
+    def expire(self) -> None: ...
+    def stats(self) -> Dict[str, int]: ...
+    def log_errors(self) -> None: ...
+
+class ResultStore:
+    evicted: int
+    expired: int
+    def __init__(
+        self,
+        max_size: Optional[int] = ...,
+        ttl: Optional[float] = ...,
+        clock: Callable[[], float] = ...,
+    ) -> None: ...
+    def __len__(self) -> int: ...
+    def configure(
+        self, max_size: Optional[int] = ..., ttl: Optional[float] = ...
+    ) -> None: ...
+    def store(
+        self, deferred_result: EventualResult[Any], ttl: Optional[float] = ...
+    ) -> int: ...
+    def retrieve(self, result_id: int) -> EventualResult[object]: ...
+    def expire(self) -> None: ...
+    def stats(self) -> Dict[str, int]: ...
+    def log_errors(self) -> None: ...
+
+class PickleSerializer:
+    protocol: int
+    def __init__(self, protocol: int = ...) -> None: ...
+    def dumps(self, obj: object) -> bytes: ...
+    def loads(self, data: bytes) -> object: ...
+
+class SQLiteResultStore:
+    evicted: int
+    expired: int
+    def __init__(
+        self,
+        path: str,
+        serializer: Any = ...,
+        max_size: Optional[int] = ...,
+        ttl: Optional[float] = ...,
+        clock: Callable[[], float] = ...,
+        timeout: float = ...,
+    ) -> None: ...
+    def __len__(self) -> int: ...
+    def configure(
+        self, max_size: Optional[int] = ..., ttl: Optional[float] = ...
+    ) -> None: ...
+    def store(
+        self, deferred_result: EventualResult[Any], ttl: Optional[float] = ...
+    ) -> int: ...
+    def retrieve(self, result_id: int) -> EventualResult[object]: ...
+    def expire(self) -> None: ...
+    def stats(self) -> Dict[str, int]: ...
+    def flush(self, timeout: Optional[float] = ...) -> bool: ...
+    def log_errors(self) -> None: ...
+    def close(self) -> None: ...
+
+def set_result_store(store: IResultStore) -> None: ...
 def no_setup() -> None: ...
-def wait_for(timeout: float) -> Callable[[_F], _F]: ...
+def wait_for(
+    timeout: float,
+    in_flight_limit: Optional[InFlightLimit] = ...,
+    priority: str = ...,
+    propagate_context: bool = ...
+) -> Callable[[_F], _F]: ...
+def submit_many(
+    function: Callable[..., _T], arguments: Iterable[Sequence[Any]]
+) -> List[EventualResult[_T]]: ...
+
+def wait_all(
+    results: Iterable[EventualResult[_T]], timeout: float
+) -> List[_T]: ...
+def wait_any(
+    results: Iterable[EventualResult[_T]], timeout: float
+) -> EventualResult[_T]: ...
+def as_completed(
+    results: Iterable[EventualResult[_T]], timeout: float
+) -> Iterator[EventualResult[_T]]: ...
 
 class ReactorStopped(Exception): ...
 
+class InFlightLimit:
+    limit: int
+    policy: str
+    admitted: int
+    blocked: int
+    rejected: int
+    shed: int
+    def __init__(self, limit: int, policy: str = ...) -> None: ...
+    @property
+    def in_flight(self) -> int: ...
+
+class InFlightLimitExceeded(Exception): ...
+
+def set_in_flight_limit(in_flight_limit: Optional[InFlightLimit]) -> None: ...
+def set_log_queue_limit(
+    limit: int, policy: str = ..., level: int = ...
+) -> None: ...
+def reactor_stats() -> Dict[str, Any]: ...
+def stats() -> Dict[str, Dict[str, Any]]: ...
+def render_metrics() -> str: ...
+def serve_metrics(port: int, interface: str = ...) -> Any: ...
+
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float
+    end_time: Optional[float]
+    status: str
+    attributes: Dict[str, Any]
+    events: List[Tuple[str, float]]
+    @property
+    def recording(self) -> bool: ...
+    def set_attribute(self, key: str, value: Any) -> None: ...
+    def add_event(self, name: str) -> None: ...
+    def set_error(self, exc_type: type) -> None: ...
+    def finish(self, status: Optional[str] = ...) -> None: ...
+    def to_dict(self) -> Dict[str, Any]: ...
+
+class Tracer:
+    exporter: Any
+    sample_rate: float
+    def __init__(self, exporter: Any, sample_rate: float = ...) -> None: ...
+    def start_span(
+        self,
+        name: str,
+        parent: Optional[Span] = ...,
+        attributes: Optional[Dict[str, Any]] = ...
+    ) -> Span: ...
+    def span(
+        self, name: str, attributes: Optional[Dict[str, Any]] = ...
+    ) -> ContextManager[Span]: ...
+
+class InMemoryExporter:
+    def __init__(self, capacity: int = ...) -> None: ...
+    def export(self, span: Span) -> None: ...
+    def spans(self) -> List[Span]: ...
+    def clear(self) -> None: ...
+
+class JSONLinesExporter:
+    def __init__(self, file: Union[str, IO[str]]) -> None: ...
+    def export(self, span: Span) -> None: ...
+    def flush(self) -> None: ...
+    def close(self) -> None: ...
+
+def set_tracer(tracer: Optional[Tracer]) -> None: ...
+def current_span() -> Optional[Span]: ...
+
+class SlowCallback:
+    function: str
+    duration: float
+    stack: str
+
+def slow_callbacks() -> List[SlowCallback]: ...
+
+class ReactorProfile:
+    stacks: Dict[str, int]
+    samples: int
+    duration: float
+    def folded(self) -> str: ...
+
+def profile_reactor(
+    seconds: float = ..., interval: float = ...
+) -> ReactorProfile: ...
+
 __version__: str
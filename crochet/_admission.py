@@ -0,0 +1,163 @@
+"""
+Admission control: limiting the number of calls in flight in the reactor.
+"""
+
+import threading
+import time
+
+from twisted.python import threadable
+from twisted.python.failure import Failure
+
+
+class InFlightLimitExceeded(Exception):
+    """
+    A call was not run, or its result was discarded, because too many calls
+    were already in flight.
+    """
+
+
+class InFlightLimit(object):
+    """
+    A limit on the number of calls that can be in flight at once.
+
+    A call is in flight from the moment it is submitted to the reactor until
+    its EventualResult has a result. When a call is submitted while the limit
+    is reached, what happens depends on the policy:
+
+    * "block": the calling thread blocks until another call finishes (for
+      @wait_for, for at most the timeout). If the limit is still reached,
+      InFlightLimitExceeded is raised.
+    * "fail": InFlightLimitExceeded is raised immediately.
+    * "shed-oldest": the oldest call still in flight gets an
+      InFlightLimitExceeded result, its Deferred is cancelled, and the new
+      call is admitted.
+
+    Calls made from the reactor thread are never blocked, since that would
+    deadlock; InFlightLimitExceeded is raised instead.
+
+    The admitted, blocked, rejected and shed attributes count how many calls
+    were admitted, had to wait for a slot, were refused, and were shed
+    respectively.
+    """
+    POLICIES = ("block", "fail", "shed-oldest")
+
+    def __init__(self, limit, policy="block"):
+        if limit < 1:
+            raise ValueError("limit must be at least 1")
+        if policy not in self.POLICIES:
+            raise ValueError("policy must be one of %s" % (self.POLICIES, ))
+        self.limit = limit
+        self.policy = policy
+        self.admitted = 0
+        self.blocked = 0
+        self.rejected = 0
+        self.shed = 0
+        self._condition = threading.Condition()
+        # EventualResults in flight, oldest first:
+        self._in_flight = {}
+
+    def __repr__(self):
+        return "<InFlightLimit limit=%d policy=%r in_flight=%d>" % (
+            self.limit, self.policy, self.in_flight)
+
+    @property
+    def in_flight(self):
+        """
+        The number of calls currently in flight.
+        """
+        return len(self._in_flight)
+
+    def _reject(self):
+        """
+        Count and raise a rejection. Must be called with the condition held.
+        """
+        self.rejected += 1
+        raise InFlightLimitExceeded(
+            "%d calls already in flight" % (self.limit, ))
+
+    def admit(self, result, timeout=None):
+        """
+        Admit the given EventualResult, applying the policy if the limit has
+        been reached.
+
+        timeout is the longest the "block" policy will wait, in seconds, or
+        None to wait indefinitely.
+        """
+        self.admit_many([result], timeout)
+
+    def admit_many(self, results, timeout=None):
+        """
+        Admit all of the given EventualResults, or none of them.
+
+        The policy applies as for admit(), except that "block" waits until
+        there are enough free slots for the whole batch, so that a batch never
+        holds on to some slots while waiting for more. A batch larger than the
+        limit can never be admitted, so it is always refused.
+        """
+        needed = len(results)
+        shed = []
+        with self._condition:
+            if needed > self.limit:
+                self._reject()
+            if len(self._in_flight) + needed > self.limit:
+                if self.policy == "shed-oldest":
+                    while len(self._in_flight) + needed > self.limit:
+                        oldest = next(iter(self._in_flight))
+                        del self._in_flight[oldest]
+                        shed.append(oldest)
+                        self.shed += 1
+                elif self.policy == "fail" or threadable.isInIOThread():
+                    self._reject()
+                else:
+                    self.blocked += 1
+                    if timeout is not None:
+                        deadline = time.monotonic() + timeout
+                    while len(self._in_flight) + needed > self.limit:
+                        if timeout is None:
+                            self._condition.wait()
+                            continue
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject()
+                        self._condition.wait(remaining)
+            for result in results:
+                self._in_flight[result] = True
+            self.admitted += needed
+        for result in results:
+            if not result._add_waiter(self._release):
+                self._release(result)
+        for result in shed:
+            _shed(result)
+
+    def _release(self, result):
+        """
+        Free the slot used by an EventualResult once it has a result.
+        """
+        with self._condition:
+            if self._in_flight.pop(result, None) is not None:
+                # Waiting batches may need more than one slot, so a single
+                # notify() could wake one that still can't proceed:
+                self._condition.notify_all()
+
+
+def _cancel_deferred(result):
+    """
+    Cancel the Deferred of an EventualResult, if it has been started.
+
+    Should only be run in Twisted thread.
+    """
+    if result._deferred is not None:
+        result._deferred.cancel()
+
+
+def _shed(result):
+    """
+    Discard an in-flight call: give its EventualResult an
+    InFlightLimitExceeded result and cancel its Deferred.
+    """
+    result._set_result(Failure(InFlightLimitExceeded(
+        "Call shed to make room for newer calls")))
+    # Shedding is configured behavior, so it's not an unhandled error if
+    # nobody retrieves the result:
+    result._result_retrieved = True
+    result._reactor.callFromThread(_cancel_deferred, result)
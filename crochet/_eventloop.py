@@ -2,28 +2,89 @@
 Expose Twisted's event loop to threaded programs.
 """
 
+import logging
 import threading
+import time
+from asyncio import CancelledError as AsyncioCancelledError, get_running_loop
 import weakref
 import warnings
-from inspect import iscoroutinefunction
-from functools import wraps
-from queue import SimpleQueue
+from contextvars import copy_context
+from concurrent.futures import Executor, Future, InvalidStateError
+from concurrent.futures import wait as wait_for_futures
+from collections import deque
+from inspect import iscoroutine, iscoroutinefunction
+from functools import partial, wraps
+from queue import Empty, SimpleQueue
 
 from twisted.python import threadable
 from twisted.python.runtime import platform
 from twisted.python.failure import Failure
-from twisted.python.log import PythonLoggingObserver, err
-from twisted.internet.defer import maybeDeferred, ensureDeferred
+from twisted.python.log import err
+from twisted.logger import ILogObserver, LogLevel, STDLibLogObserver
+from twisted.internet.defer import (
+    CancelledError, Deferred, maybeDeferred, ensureDeferred, fail, succeed)
 from twisted.internet.task import LoopingCall
 
 import wrapt
+from zope.interface import implementer
 
 from ._util import synchronized
 from ._resultstore import ResultStore
+from ._submission import SubmissionQueue
+from ._timerwheel import TimerWheel
+from ._admission import InFlightLimitExceeded
+from ._monitor import ReactorMonitor
+from ._slowcallbacks import SlowCallbackDetector
+from ._profiler import sample_thread
+from ._stats import CallTiming, FunctionStats
+from ._tracing import _current_span
 
 _store = ResultStore()
 
 
+def set_result_store(store):
+    """
+    Use the given store, which should provide IResultStore, for
+    EventualResult.stash() and retrieve_result(), instead of the default
+    in-memory ResultStore; for example, a SQLiteResultStore lets other
+    processes on the host retrieve results.
+
+    Results stashed in the previous store can no longer be retrieved, so call
+    this before stashing anything.
+    """
+    global _store  # pylint: disable=global-statement
+    _store = store
+
+
+def retrieve_result(result_id):
+    """
+    Return the EventualResult stashed with the given uid, and remove it from
+    the store.
+
+    Raises KeyError if there is no such result, e.g. because it was already
+    retrieved, evicted or expired, and ResultNotReady if another process
+    stashed it and it doesn't have a result yet.
+    """
+    return _store.retrieve(result_id)
+
+
+def set_stash_limit(max_size=None, ttl=None):
+    """
+    Limit the number of results EventualResult.stash() keeps to max_size,
+    discarding the least recently stashed result to make room, and discard
+    results that haven't been retrieved after ttl seconds. None means no
+    limit.
+    """
+    _store.configure(max_size, ttl)
+
+
+def _log_stashed_errors():
+    """
+    Log errors for stashed results that were never retrieved.
+    """
+    _store.log_errors()
+
+
 class TimeoutError(Exception):  # pylint: disable=redefined-builtin
     """
     A timeout has been hit.
@@ -37,6 +98,49 @@ class ReactorStopped(Exception):
     """
 
 
+class _RegistryShard(object):
+    """
+    Part of a ResultRegistry, used by a subset of threads.
+    """
+
+    def __init__(self):
+        self._results = weakref.WeakSet()
+        self._stopped = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._results)
+
+    @synchronized
+    def register(self, result):
+        """
+        Register an EventualResult.
+        """
+        if self._stopped:
+            raise ReactorStopped()
+        self._results.add(result)
+
+    @synchronized
+    def register_many(self, results):
+        """
+        Register multiple EventualResults at once.
+        """
+        if self._stopped:
+            raise ReactorStopped()
+        for result in results:
+            self._results.add(result)
+
+    @synchronized
+    def stop(self):
+        """
+        Fire all registered EventualResults with ReactorStopped, and refuse
+        any new registrations.
+        """
+        self._stopped = True
+        for result in self._results:
+            result._set_result(Failure(ReactorStopped()))
+
+
 class ResultRegistry(object):
     """
     Keep track of EventualResults.
@@ -48,25 +152,50 @@ class ResultRegistry(object):
     2. Already registered EventualResult instances are "fired" with a
        ReactorStopped exception to unblock any remaining EventualResult.wait()
        calls.
+
+    Registration happens on every call, from any number of threads, so rather
+    than having a single lock results are registered in one of a number of
+    shards, chosen by the registering thread's id. Threads only contend with
+    other threads using the same shard.
     """
 
+    SHARDS = 16
+
     def __init__(self):
-        self._results = weakref.WeakSet()
-        self._stopped = False
-        self._lock = threading.Lock()
+        self._shards = tuple(_RegistryShard() for _ in range(self.SHARDS))
+
+    def _shard(self):
+        """
+        Return the shard used by the current thread.
+        """
+        return self._shards[threading.get_native_id() % len(self._shards)]
+
+    def __contains__(self, result):
+        return any(result in shard._results for shard in self._shards)
+
+    def __len__(self):
+        """
+        Return the number of registered EventualResults that haven't been
+        garbage collected yet.
+        """
+        return sum(len(shard) for shard in self._shards)
 
-    @synchronized
     def register(self, result):
         """
         Register an EventualResult.
 
         May be called in any thread.
         """
-        if self._stopped:
-            raise ReactorStopped()
-        self._results.add(result)
+        self._shard().register(result)
+
+    def register_many(self, results):
+        """
+        Register multiple EventualResults at once.
+
+        May be called in any thread.
+        """
+        self._shard().register_many(results)
 
-    @synchronized
     def stop(self):
         """
         Indicate no more results will get pushed into EventualResults, since
@@ -74,9 +203,84 @@ class ResultRegistry(object):
 
         This should be called in the reactor thread.
         """
-        self._stopped = True
-        for result in self._results:
-            result._set_result(Failure(ReactorStopped()))
+        for shard in self._shards:
+            shard.stop()
+
+
+# EventualResults don't have a lock of their own, since most are never waited
+# on. Instead, access to their list of waiters is protected by one of a fixed
+# number of shared locks, chosen by id():
+_WAITER_GUARDS = tuple(threading.Lock() for _ in range(64))
+
+
+def _waiter_guard(eventual_result):
+    """
+    Return the lock protecting the given EventualResult's waiters.
+    """
+    return _WAITER_GUARDS[(id(eventual_result) >> 4) % len(_WAITER_GUARDS)]
+
+
+def _put_result(result, eventual):
+    """
+    Deferred callback that sets the result of an EventualResult, given a
+    weakref to it.
+
+    Because EventualResult uses __del__, we need to make sure there are no
+    cycles involving it, which is why we use a weakref.
+    """
+    eventual = eventual()
+    if eventual is not None:
+        if eventual._timing is not None:
+            eventual._timing.fired(result)
+        eventual._set_result(result)
+    elif isinstance(result, Failure):
+        err(result, "Unhandled error in EventualResult")
+
+
+def _fire_span(span, result):
+    """
+    Record that a traced call has a result, and its status.
+    """
+    span.add_event("fired")
+    if isinstance(result, Failure):
+        if result.check(TimeoutError):
+            span.status = "timeout"
+        elif result.check(CancelledError):
+            span.status = "cancelled"
+        else:
+            span.set_error(result.type)
+
+
+class _Waiter(object):
+    """
+    Blocks a thread until an EventualResult has a result.
+
+    Only allocated when a thread actually has to block.
+    """
+    __slots__ = ("_lock", )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lock.acquire()
+
+    def __call__(self, eventual_result):
+        """
+        Wake up the waiting thread.
+
+        Called in the reactor thread once the EventualResult has a result.
+        """
+        self._lock.release()
+
+    def wait(self, timeout):
+        """
+        Block for up to the given number of seconds, returning whether or not
+        we were woken up.
+        """
+        if timeout is None:
+            return self._lock.acquire()
+        if timeout <= 0:
+            return self._lock.acquire(False)
+        return self._lock.acquire(True, min(timeout, threading.TIMEOUT_MAX))
 
 
 class EventualResult(object):
@@ -89,6 +293,10 @@ class EventualResult(object):
     In general you should not create these directly; instead use functions
     decorated with @run_in_reactor.
     """
+    # Many of these may be in flight at once, so keep them small:
+    __slots__ = (
+        "_deferred", "_reactor", "_value", "_result_retrieved", "_result_set",
+        "_waiters", "_timing", "_span", "__weakref__")
 
     def __init__(self, deferred, _reactor):
         """
@@ -99,7 +307,14 @@ class EventualResult(object):
         self._reactor = _reactor
         self._value = None
         self._result_retrieved = False
-        self._result_set = threading.Event()
+        self._result_set = False
+        # None, or a list of callables to call with this EventualResult once
+        # it has a result:
+        self._waiters = None
+        # A CallTiming, for calls to decorated functions:
+        self._timing = None
+        # A recording tracing Span, for traced calls:
+        self._span = None
         if deferred is not None:
             self._connect_deferred(deferred)
 
@@ -110,33 +325,64 @@ class EventualResult(object):
         Should only be run in Twisted thread, and only called once.
         """
         self._deferred = deferred
+        deferred.addBoth(_put_result, weakref.ref(self))
 
-        # Because we use __del__, we need to make sure there are no cycles
-        # involving this object, which is why we use a weakref:
-        def put(result, eventual=weakref.ref(self)):
-            eventual = eventual()
-            if eventual:
-                eventual._set_result(result)
-            else:
-                err(result, "Unhandled error in EventualResult")
+    def _set_result(self, result):
+        """
+        Set the result of the EventualResult, if not already set, and notify
+        any waiters.
 
-        deferred.addBoth(put)
+        This usually happens in the reactor thread, either as a result of
+        Deferred firing, or as a result of ResultRegistry.stop(), but calls
+        can also be shed by admission control in other threads.
+        """
+        with _waiter_guard(self):
+            if self._result_set:
+                return
+            self._value = result
+            self._result_set = True
+            waiters = self._waiters
+            self._waiters = None
+        span = self._span
+        if span is not None:
+            _fire_span(span, result)
+        if waiters is not None:
+            for waiter in waiters:
+                waiter(self)
+        # A blocked thread finishes the span once it wakes up, so the span
+        # covers that too; otherwise it ends here:
+        if span is not None and not any(
+                isinstance(waiter, _Waiter) for waiter in waiters or ()):
+            span.finish()
+
+    def _add_waiter(self, waiter):
+        """
+        Arrange for waiter(self) to be called in the reactor thread once a
+        result is available.
 
-    def _set_result(self, result):
+        Returns False, without adding the waiter, if the result is already
+        available.
         """
-        Set the result of the EventualResult, if not already set.
+        with _waiter_guard(self):
+            if self._result_set:
+                return False
+            if self._waiters is None:
+                self._waiters = [waiter]
+            else:
+                self._waiters.append(waiter)
+            return True
 
-        This can only happen in the reactor thread, either as a result of
-        Deferred firing, or as a result of ResultRegistry.stop(). So, no need
-        for thread-safety.
+    def _remove_waiter(self, waiter):
         """
-        if self._result_set.isSet():
-            return
-        self._value = result
-        self._result_set.set()
+        Remove a waiter added with _add_waiter(), if it hasn't been called
+        yet.
+        """
+        with _waiter_guard(self):
+            if self._waiters is not None and waiter in self._waiters:
+                self._waiters.remove(waiter)
 
     def __del__(self):
-        if self._result_retrieved or not self._result_set.isSet():
+        if self._result_retrieved or not self._result_set:
             return
         if isinstance(self._value, Failure):
             err(self._value, "Unhandled error in EventualResult")
@@ -151,7 +397,11 @@ class EventualResult(object):
 
         Multiple calls will have no additional effect.
         """
-        self._reactor.callFromThread(lambda: self._deferred.cancel())
+        if self._result_set:
+            # Already finished, so there's nothing to cancel; this also covers
+            # results with no reactor, e.g. those loaded from a result store.
+            return
+        self._reactor.callFromThread(_cancel, self)
 
     def _result(self, timeout):
         """
@@ -166,11 +416,20 @@ class EventualResult(object):
         returned on one call, additional calls will return/raise the same
         result.
         """
-        self._result_set.wait(timeout)
-        # In Python 2.6 we can't rely on the return result of wait(), so we
-        # have to check manually:
-        if not self._result_set.is_set():
-            raise TimeoutError()
+        if not self._result_set:
+            waiter = _Waiter()
+            if self._add_waiter(waiter):
+                if waiter.wait(timeout):
+                    if self._timing is not None:
+                        self._timing.woke()
+                else:
+                    self._remove_waiter(waiter)
+                if self._span is not None and self._result_set:
+                    self._span.finish()
+            # The result may have been set after the timeout was hit, so check
+            # again:
+            if not self._result_set:
+                raise TimeoutError()
         self._result_retrieved = True
         return self._value
 
@@ -187,23 +446,25 @@ class EventualResult(object):
         returned or raised on one call, additional calls will return/raise the
         same result.
         """
-        if threadable.isInIOThread():
-            raise RuntimeError(
-                "EventualResult.wait() must not be run in the reactor thread.")
+        _check_not_reactor_thread("EventualResult.wait()")
 
         result = self._result(timeout)
         if isinstance(result, Failure):
             result.raiseException()
         return result
 
-    def stash(self):
+    def stash(self, ttl=None):
         """
         Store the EventualResult in memory for later retrieval.
 
         Returns a integer uid which can be passed to crochet.retrieve_result()
         to retrieve the instance later on.
+
+        If ttl is given, the result is discarded if it hasn't been retrieved
+        after that many seconds; otherwise the default set with
+        crochet.set_stash_limit() applies.
         """
-        return _store.store(self)
+        return _store.store(self, ttl)
 
     def original_failure(self):
         """
@@ -224,52 +485,646 @@ class EventualResult(object):
         else:
             return None
 
+    def as_future(self):
+        """
+        Return a concurrent.futures.Future that will have the same result as
+        this EventualResult.
+
+        The result is set on the Future directly from the reactor thread, so
+        no extra thread is involved. Cancelling the Future cancels this
+        EventualResult.
+        """
+        # Whoever uses the Future is now responsible for any error:
+        self._result_retrieved = True
+        future = Future()
+        future.add_done_callback(self._cancel_if_cancelled)
+        copy = partial(_copy_to_future, future)
+        if not self._add_waiter(copy):
+            copy(self)
+        return future
+
+    def __await__(self):
+        """
+        Wait for the result in an asyncio coroutine, e.g. ``await result``.
+
+        This works with an asyncio event loop running in any thread. No thread
+        is blocked: the result is delivered to the event loop from the reactor
+        thread using loop.call_soon_threadsafe(). Cancelling the awaiting task
+        cancels this EventualResult.
+        """
+        # Whoever awaits is now responsible for any error:
+        self._result_retrieved = True
+        loop = get_running_loop()
+        future = loop.create_future()
+        deliver = partial(_deliver_to_asyncio, loop, future)
+        if not self._add_waiter(deliver):
+            _copy_to_asyncio_future(future, self)
+        try:
+            return (yield from future.__await__())
+        except AsyncioCancelledError:
+            self._remove_waiter(deliver)
+            self.cancel()
+            raise
+
+    def _cancel_if_cancelled(self, future):
+        """
+        Cancel this EventualResult if the Future from as_future() was
+        cancelled.
+        """
+        if future.cancelled():
+            self.cancel()
+
+
+def _check_not_reactor_thread(name):
+    """
+    Raise a RuntimeError if called in the reactor thread, where blocking is
+    not allowed.
+    """
+    if threadable.isInIOThread():
+        raise RuntimeError(
+            "%s must not be run in the reactor thread." % (name, ))
+
+
+def _as_completed(results, timeout):
+    """
+    Implementation of as_completed().
+
+    A single queue is used to get notified of all results, so the calling
+    thread only ever blocks on one thing.
+    """
+    deadline = None if timeout is None else time.monotonic() + timeout
+    completed = SimpleQueue()
+    notify = completed.put
+    pending = set()
+    try:
+        for result in results:
+            if result in pending:
+                continue
+            if result._add_waiter(notify):
+                pending.add(result)
+            else:
+                yield result
+        while pending:
+            if deadline is None:
+                result = completed.get()
+            else:
+                remaining = max(deadline - time.monotonic(), 0)
+                try:
+                    result = completed.get(timeout=remaining)
+                except Empty:
+                    raise TimeoutError()
+            pending.discard(result)
+            yield result
+    finally:
+        for result in pending:
+            result._remove_waiter(notify)
+
+
+def as_completed(results, timeout):
+    """
+    Return an iterator over the given EventualResults that yields each of
+    them as soon as its result is available.
+
+    Results that are already available are yielded first. If the given number
+    of seconds pass before all the results are available, the iterator raises
+    a TimeoutError.
+
+    Must not be called in the reactor thread.
+    """
+    _check_not_reactor_thread("as_completed()")
+    return _as_completed(list(results), timeout)
+
+
+def wait_any(results, timeout):
+    """
+    Wait until at least one of the given EventualResults has a result, and
+    return that EventualResult.
+
+    If the given number of seconds pass with no result, a TimeoutError is
+    raised.
+
+    Must not be called in the reactor thread.
+    """
+    _check_not_reactor_thread("wait_any()")
+    completed = _as_completed(list(results), timeout)
+    try:
+        return next(completed)
+    except StopIteration:
+        raise ValueError("wait_any() requires at least one EventualResult.")
+    finally:
+        completed.close()
+
+
+def wait_all(results, timeout):
+    """
+    Wait until all of the given EventualResults have a result, and return a
+    list of their results in the same order.
+
+    If the given number of seconds pass before all results are available, a
+    TimeoutError is raised. If any of the results is an exception, the
+    exception of the first such result (in the order given) is raised.
+
+    Must not be called in the reactor thread.
+    """
+    _check_not_reactor_thread("wait_all()")
+    results = list(results)
+    for _ in _as_completed(results, timeout):
+        pass
+    return [result.wait(0) for result in results]
+
+
+def _call_function(function, args, kwargs):
+    """
+    Call a regular function, returning a Deferred that fires with its result.
+
+    Should only be run in Twisted thread.
+    """
+    return maybeDeferred(function, *args, **kwargs)
+
+
+def _call_coroutine(function, args, kwargs):
+    """
+    Call an async function, returning a Deferred that fires with its result.
+
+    Should only be run in Twisted thread.
+    """
+    return ensureDeferred(function(*args, **kwargs))
+
+
+def _caller(function):
+    """
+    Return _call_coroutine if the function is an async function, otherwise
+    _call_function.
+
+    This is done once, when a function is decorated, rather than on every
+    call.
+    """
+    # Unwrap classmethod and staticmethod objects:
+    if iscoroutinefunction(getattr(function, "__func__", function)):
+        return _call_coroutine
+    return _call_function
+
+
+def _start(call, function, result, args, kwargs):
+    """
+    Call the function using the given caller, hooking up the EventualResult
+    to its result.
+
+    If the EventualResult already has a result, e.g. because admission
+    control shed the call, the function is not called.
+
+    Should only be run in Twisted thread.
+    """
+    if result._result_set:
+        result._connect_deferred(Deferred())
+        return
+    if result._timing is not None:
+        result._timing.started()
+    if result._span is not None:
+        result._span.add_event("started")
+    result._connect_deferred(call(function, args, kwargs))
+
+
+def _expire(result):
+    """
+    Time out an EventualResult whose deadline has passed, and cancel the
+    underlying Deferred.
+
+    Should only be run in Twisted thread.
+    """
+    result._set_result(Failure(TimeoutError()))
+    if result._timing is not None:
+        result._timing.timed_out()
+    # The caller asked for the timeout, so it's not an unhandled error if
+    # nobody retrieves it:
+    result._result_retrieved = True
+    result._deferred.cancel()
+
+
+def _cancel(result):
+    """
+    Cancel the Deferred of an EventualResult. If the reactor hasn't started
+    the call yet, e.g. because it is queued behind other calls, give it a
+    CancelledError result instead, so it is never started.
+
+    Should only be run in Twisted thread.
+    """
+    if result._deferred is not None:
+        result._deferred.cancel()
+    elif not result._result_set:
+        if result._timing is not None:
+            result._timing.cancelled()
+        result._set_result(Failure(CancelledError()))
+
+
+def _cancel_timer(value, timer):
+    """
+    Deferred callback that cancels a deadline timer once a result is
+    available.
+    """
+    if timer.active():
+        timer.cancel()
+    return value
+
+
+def _start_with_deadline(timers, deadline, call, function, result, args,
+                         kwargs):
+    """
+    Like _start(), but time out the EventualResult and cancel the underlying
+    Deferred once the deadline (in time.monotonic() terms) passes. The
+    deadline is tracked by the given TimerWheel.
+
+    If the deadline has already passed the function is not called at all.
+
+    Should only be run in Twisted thread.
+    """
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        result._connect_deferred(Deferred())
+        _expire(result)
+        return
+    _start(call, function, result, args, kwargs)
+    if not result._result_set:
+        timer = timers.add(remaining, _expire, result)
+        result._deferred.addBoth(_cancel_timer, timer)
+
+
+def _check_priority(priority):
+    """
+    Raise a ValueError if priority isn't a valid call priority.
+    """
+    if priority not in SubmissionQueue.PRIORITIES:
+        raise ValueError(
+            "priority must be one of %s" % (SubmissionQueue.PRIORITIES, ))
+
+
+def _decorate(wrapper, function):
+    """
+    Wrap a function using a wrapt-style wrapper, preserving its signature but
+    not its async-ness: the decorated function is always a regular function.
+    """
+    if iscoroutinefunction(function):
+        # Create a non-async wrapper with same signature.
+        @wraps(function)
+        def non_async_wrapper():
+            pass
+    else:
+        # Just use default behavior of looking at underlying object.
+        non_async_wrapper = None
+
+    return wrapt.decorator(wrapper, adapter=non_async_wrapper)(function)
+
+
+def _run_batch(function, batch):
+    """
+    Call the function once for each (EventualResult, args) pair in the batch,
+    hooking up each EventualResult to the result of the corresponding call.
+
+    Should only be run in Twisted thread.
+    """
+    call = _caller(function)
+    for result, args in batch:
+        _start(call, function, result, args, {})
+
+
+def _copy_to_future(future, eventual_result):
+    """
+    Set the result of the EventualResult on a concurrent.futures.Future.
+    """
+    value = eventual_result._value
+    try:
+        if isinstance(value, Failure):
+            future.set_exception(value.value)
+        else:
+            future.set_result(value)
+    except InvalidStateError:
+        # The Future was cancelled.
+        pass
+
+
+def _copy_to_asyncio_future(future, eventual_result):
+    """
+    Set the result of the EventualResult on an asyncio Future.
+
+    Runs in the asyncio event loop's thread.
+    """
+    if future.done():
+        # The awaiting task was cancelled.
+        return
+    value = eventual_result._value
+    if isinstance(value, Failure):
+        future.set_exception(value.value)
+    else:
+        future.set_result(value)
+
+
+def _deliver_to_asyncio(loop, future, eventual_result):
+    """
+    Arrange for the result of the EventualResult to be set on an asyncio
+    Future, in its event loop's thread.
+    """
+    try:
+        loop.call_soon_threadsafe(
+            _copy_to_asyncio_future, future, eventual_result)
+    except RuntimeError:
+        # The event loop has been closed, so nobody is waiting any more.
+        pass
+
+
+def _call_any(function, args, kwargs):
+    """
+    Call a function that may return a Deferred, a coroutine or a regular
+    value, returning a Deferred that fires with its result.
+
+    Should only be run in Twisted thread.
+    """
+    try:
+        result = function(*args, **kwargs)
+    except BaseException:
+        return fail()
+    if isinstance(result, Deferred):
+        return result
+    if iscoroutine(result):
+        return ensureDeferred(result)
+    return succeed(result)
+
+
+class ReactorExecutor(Executor):
+    """
+    A concurrent.futures.Executor that runs callables in the reactor thread.
+
+    Callables may return Deferreds or coroutines, in which case the Future's
+    result is their eventual result.
+    """
+
+    def __init__(self, _eventloop=None):
+        if _eventloop is None:
+            from . import _main as _eventloop
+        self._eventloop = _eventloop
+        self._shutdown = False
+        self._futures = set()
+        self._lock = threading.Lock()
+
+    def _add(self, function, args, kwargs):
+        """
+        Submit a call, and return a Future for its result.
+
+        The lock isn't held while submitting: an in-flight limit may block,
+        or shed older calls, whose Futures then need the lock in _discard().
+        """
+        if self._shutdown:
+            raise RuntimeError("cannot schedule new futures after shutdown")
+        future = self._eventloop._submit(
+            _call_any, function, args, kwargs).as_future()
+        with self._lock:
+            if not self._shutdown:
+                self._futures.add(future)
+                return future
+        # shutdown() was called while the call was being submitted:
+        future.cancel()
+        raise RuntimeError("cannot schedule new futures after shutdown")
+
+    @synchronized
+    def _discard(self, future):
+        """
+        Stop tracking a Future once it is done.
+        """
+        self._futures.discard(future)
+
+    def submit(self, fn, /, *args, **kwargs):
+        """
+        Call fn(*args, **kwargs) in the reactor thread, returning a Future.
+
+        May be called in any thread.
+        """
+        future = self._add(fn, args, kwargs)
+        future.add_done_callback(self._discard)
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        """
+        Refuse any new calls, optionally cancelling the calls already
+        submitted, and if wait is true wait until they are done.
+        """
+        with self._lock:
+            self._shutdown = True
+            futures = list(self._futures)
+        if cancel_futures:
+            for future in futures:
+                future.cancel()
+        if wait:
+            wait_for_futures(futures)
+
+
+_STDLIB_LEVELS = {
+    LogLevel.debug: logging.DEBUG,
+    LogLevel.info: logging.INFO,
+    LogLevel.warn: logging.WARNING,
+    LogLevel.error: logging.ERROR,
+    LogLevel.critical: logging.CRITICAL,
+}
+
+
+def _log_level(event):
+    """
+    Return the logging module level that STDLibLogObserver will log a Twisted
+    log event at.
+    """
+    return _STDLIB_LEVELS.get(event.get("log_level"), logging.INFO)
+
 
-_STOP = object()
+def _check_log_queue_limit(limit, policy):
+    """
+    Raise a ValueError if the limit or policy for a ThreadLogObserver are
+    invalid.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if policy not in ThreadLogObserver.POLICIES:
+        raise ValueError(
+            "policy must be one of %s" % (ThreadLogObserver.POLICIES, ))
 
 
+@implementer(ILogObserver)
 class ThreadLogObserver(object):
     """
     A log observer that wraps another observer, and calls it in a thread.
 
-    In particular, used to wrap PythonLoggingObserver, so that blocking
-    logging.py Handlers don't block the event loop.
+    In particular, used to wrap STDLibLogObserver, so that blocking
+    logging.py Handlers don't block the event loop. Events are queued as they
+    are, so formatting them is left to the thread, and only happens if a
+    handler actually emits the message.
+
+    Messages are queued, and the thread writes everything queued in one batch
+    each time it wakes up. At most limit messages are queued, besides the
+    batch being written; once the limit is reached, further messages are
+    handled according to the policy:
+
+    * "drop-newest": the new message is dropped.
+    * "drop-oldest": the oldest queued message is dropped to make room.
+    * "drop-by-level": the new message is dropped if its logging level is
+      below level; otherwise the oldest queued message below level is
+      dropped to make room, so that important messages keep getting through
+      without pushing out other important messages. If every queued message
+      is at or above level, the new message is dropped.
+
+    The dropped attribute counts dropped messages. Once the queue has been
+    emptied after dropping messages, or every SUMMARY_INTERVAL seconds while
+    it keeps dropping them, a warning saying how many were dropped is written.
+
+    If logger is a logging.Logger, messages whose level it isn't enabled for
+    are discarded immediately, rather than being queued only for the wrapped
+    observer to discard them. The logger caches its effective level, and
+    refreshes it whenever the logging configuration changes.
     """
+    POLICIES = ("drop-newest", "drop-oldest", "drop-by-level")
+    SUMMARY_INTERVAL = 10
 
-    def __init__(self, observer):
+    def __init__(self, observer, limit=10000, policy="drop-newest",
+                 level=logging.WARNING, logger=None):
         self._observer = observer
-        self._queue = SimpleQueue()
+        self._logger = logger
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._queue = deque()
+        # Queued messages whose level is below level:
+        self._below_level = 0
+        # Messages taken from the queue that haven't been written yet:
+        self._writing = 0
+        # Whether the thread is waiting for messages:
+        self._waiting = False
+        self._stopped = False
+        self.dropped = 0
+        self._unreported = 0
+        self._last_summary = time.monotonic()
+        self.configure(limit, policy, level)
         self._thread = threading.Thread(
             target=self._reader, name="CrochetLogWriter")
         self._thread.start()
 
+    def configure(self, limit, policy="drop-newest", level=logging.WARNING):
+        """
+        Change the limit on queued messages, and the policy for what to do
+        once it is reached.
+        """
+        _check_log_queue_limit(limit, policy)
+        with self._lock:
+            self.limit = limit
+            self.policy = policy
+            self.level = level
+            self._below_level = sum(
+                1 for msg in self._queue if _log_level(msg) < level)
+
     def _reader(self):
         """
-        Runs in a thread, reads messages from a queue and writes them to
-        the wrapped observer.
+        Runs in a thread, reads batches of messages from the queue and writes
+        them to the wrapped observer.
         """
         while True:
-            msg = self._queue.get()
-            if msg is _STOP:
+            with self._lock:
+                while not self._queue and not self._stopped:
+                    self._waiting = True
+                    self._wakeup.wait()
+                    self._waiting = False
+                batch = self._queue
+                self._queue = deque()
+                self._below_level = 0
+                self._writing = len(batch)
+                stopped = self._stopped
+            for msg in batch:
+                self._write(msg)
+                self._writing -= 1
+            self._summarize(stopped)
+            if stopped:
                 return
-            try:
-                self._observer(msg)
-            except Exception:
-                # Lower-level logging system blew up, nothing we can do, so
-                # just drop on the floor.
-                pass
+
+    def _write(self, msg):
+        try:
+            self._observer(msg)
+        except Exception:
+            # Lower-level logging system blew up, nothing we can do, so
+            # just drop on the floor.
+            pass
+
+    def _summarize(self, force):
+        """
+        Write a warning saying how many messages were dropped since the last
+        one, if any were, and either force is true, the queue is empty, or
+        SUMMARY_INTERVAL has passed.
+        """
+        with self._lock:
+            dropped = self._unreported
+            if not dropped:
+                return
+            now = time.monotonic()
+            if (not force and self._queue
+                    and now - self._last_summary < self.SUMMARY_INTERVAL):
+                return
+            self._unreported = 0
+            self._last_summary = now
+        self._write({
+            "log_level": LogLevel.warn, "log_namespace": "crochet",
+            "log_system": "crochet", "log_time": time.time(),
+            "log_format": (
+                "Dropped {dropped} log messages because the logging queue "
+                "was full"),
+            "dropped": dropped,
+        })
 
     def stop(self):
         """
-        Stop the thread.
+        Stop the thread, once the messages queued so far have been written.
+        """
+        with self._lock:
+            self._stopped = True
+            self._wakeup.notify()
+
+    def __len__(self):
+        """
+        Return the number of messages waiting to be written.
         """
-        self._queue.put(_STOP)
+        return len(self._queue) + self._writing
 
     def __call__(self, msg):
         """
         A log observer that writes to a queue.
         """
-        self._queue.put(msg)
+        level = _log_level(msg)
+        if self._logger is not None and not self._logger.isEnabledFor(level):
+            return
+        with self._lock:
+            below_level = level < self.level
+            if len(self._queue) >= self.limit:
+                self.dropped += 1
+                self._unreported += 1
+                if self.policy == "drop-newest":
+                    return
+                if self.policy == "drop-oldest":
+                    if _log_level(self._queue.popleft()) < self.level:
+                        self._below_level -= 1
+                elif below_level or not self._drop_below_level():
+                    return
+            self._queue.append(msg)
+            if below_level:
+                self._below_level += 1
+            if self._waiting:
+                self._wakeup.notify()
+
+    def _drop_below_level(self):
+        """
+        Drop the oldest queued message whose level is below level, returning
+        False if there is none.
+
+        Must be called with the lock held.
+        """
+        if not self._below_level:
+            return False
+        for i, msg in enumerate(self._queue):
+            if _log_level(msg) < self.level:
+                del self._queue[i]
+                self._below_level -= 1
+                return True
+        return False
 
 
 class EventLoop(object):
@@ -281,26 +1136,33 @@ class EventLoop(object):
         self,
         reactorFactory,
         atexit_register,
-        startLoggingWithObserver=None,
+        beginLoggingTo=None,
         watchdog_thread=None,
         reapAllProcesses=None
     ):
         """
         reactorFactory: Zero-argument callable that returns a reactor.
         atexit_register: atexit.register, or look-alike.
-        startLoggingWithObserver: Either None, or
-            twisted.python.log.startLoggingWithObserver or lookalike.
+        beginLoggingTo: Either None, or
+            twisted.logger.globalLogBeginner.beginLoggingTo or lookalike.
         watchdog_thread: crochet._shutdown.Watchdog instance, or None.
         reapAllProcesses: twisted.internet.process.reapAllProcesses or
             lookalike.
         """
         self._reactorFactory = reactorFactory
         self._atexit_register = atexit_register
-        self._startLoggingWithObserver = startLoggingWithObserver
+        self._beginLoggingTo = beginLoggingTo
         self._started = False
         self._lock = threading.Lock()
         self._watchdog_thread = watchdog_thread
         self._reapAllProcesses = reapAllProcesses
+        self._in_flight_limit = None
+        self._monitor = None
+        self._slow_callback_detector = None
+        self._function_stats = {}
+        self._log_observer = None
+        self._log_queue_limit = (10000, "drop-newest", logging.WARNING)
+        self._tracer = None
 
     def _startReapingProcesses(self):
         """
@@ -317,13 +1179,34 @@ class EventLoop(object):
         self._started = True
         self._reactor = self._reactorFactory()
         self._registry = ResultRegistry()
+        self._submissions = SubmissionQueue(self._reactor)
+        self._timers = TimerWheel(self._reactor)
         # We want to unblock EventualResult regardless of how the reactor is
         # run, so we always register this:
         self._reactor.addSystemEventTrigger(
             "before", "shutdown", self._registry.stop)
 
+    def _start_monitor(self):
+        """
+        Start a ReactorMonitor, unless one is already running.
+        """
+        if self._monitor is None:
+            self._monitor = ReactorMonitor(self._reactor, self._submissions)
+            self._reactor.callFromThread(self._monitor.start)
+
+    def _start_slow_callback_detector(self, threshold):
+        """
+        Start a SlowCallbackDetector, unless one is already running.
+        """
+        if self._slow_callback_detector is None:
+            detector = SlowCallbackDetector(self._reactor, threshold)
+            self._slow_callback_detector = detector
+            self._reactor.callFromThread(detector.start)
+            self._reactor.addSystemEventTrigger(
+                "before", "shutdown", detector.stop)
+
     @synchronized
-    def setup(self):
+    def setup(self, monitor=False, slow_callback_threshold=None):
         """
         Initialize the crochet library.
 
@@ -332,23 +1215,41 @@ class EventLoop(object):
 
         This must be called at least once before the library can be used, and
         can be called multiple times.
+
+        If monitor is true, the reactor's responsiveness is monitored; see
+        reactor_stats(). This works even if the library was already set up,
+        by this or another caller, or with no_setup().
+
+        If slow_callback_threshold is a number of seconds, whenever the
+        reactor thread is blocked for longer than that its stack is logged;
+        see slow_callbacks(). Like monitor, this works even if the library was
+        already set up.
         """
         if self._started:
+            if monitor:
+                self._start_monitor()
+            if slow_callback_threshold is not None:
+                self._start_slow_callback_detector(slow_callback_threshold)
             return
         self._common_setup()
+        if monitor:
+            self._start_monitor()
+        if slow_callback_threshold is not None:
+            self._start_slow_callback_detector(slow_callback_threshold)
         if platform.type == "posix":
             self._reactor.callFromThread(self._startReapingProcesses)
-        if self._startLoggingWithObserver:
-            observer = ThreadLogObserver(PythonLoggingObserver().emit)
+        if self._beginLoggingTo:
+            observer = ThreadLogObserver(
+                STDLibLogObserver(), *self._log_queue_limit,
+                logger=logging.getLogger("twisted"))
+            self._log_observer = observer
 
             def start():
                 # Twisted is going to override warnings.showwarning; let's
                 # make sure that has no effect:
-                from twisted.python import log
-                original = log.showwarning
-                log.showwarning = warnings.showwarning
-                self._startLoggingWithObserver(observer, False)
-                log.showwarning = original
+                original = warnings.showwarning
+                self._beginLoggingTo([observer], redirectStandardIO=False)
+                warnings.showwarning = original
 
             self._reactor.callFromThread(start)
 
@@ -361,7 +1262,7 @@ class EventLoop(object):
             name="CrochetReactor")
         t.start()
         self._atexit_register(self._reactor.callFromThread, self._reactor.stop)
-        self._atexit_register(_store.log_errors)
+        self._atexit_register(_log_stashed_errors)
         if self._watchdog_thread is not None:
             self._watchdog_thread.start()
 
@@ -384,13 +1285,323 @@ class EventLoop(object):
                 "using crochet are imported and call setup().")
         self._common_setup()
 
-    def run_in_reactor(self, function):
+    def _stats_for(self, function):
+        """
+        Return the FunctionStats for a function being decorated.
+        """
+        name = "%s.%s" % (
+            getattr(function, "__module__", None),
+            getattr(function, "__qualname__", repr(function)))
+        return self._function_stats.setdefault(name, FunctionStats(name))
+
+    def stats(self):
+        """
+        Return statistics for calls to functions decorated with
+        run_in_reactor() or wait_for(), as a dictionary mapping each
+        function's fully qualified name to a dictionary.
+
+        Each function's dictionary has "calls", "errors", "timeouts" and
+        "cancellations" counts, and histogram summaries (as returned by
+        reactor_stats()) for three phases of each call, in seconds:
+        "submit_to_start", from the call being made until the reactor thread
+        starts running it; "start_to_fire", from then until its result is
+        available; and "fire_to_wake", from then until a thread blocked in
+        EventualResult.wait() wakes up with it.
+
+        Inline calls from the reactor thread aren't included.
+        """
+        return dict(
+            (name, stats.snapshot())
+            for (name, stats) in list(self._function_stats.items()))
+
+    def reactor_stats(self):
+        """
+        Return a dictionary describing how busy the reactor thread is.
+
+        "queued_calls" is the number of calls waiting for the reactor thread
+        to run them, and "reactor_queued_calls" is the length of the reactor's
+        own callFromThread() queue. "registered_results" is the number of
+        EventualResult instances created by calls that are still alive,
+        "stashed_results" the number stored with EventualResult.stash(),
+        "stashed_evicted" and "stashed_expired" the number of stashed results
+        discarded because of the limits set with set_stash_limit() (all three
+        come from the result store's stats(), which never waits for a
+        database),
+        "log_queue_depth" the number of log messages waiting to be passed on to
+        the logging module, and "log_dropped" the number of log messages
+        dropped because too many were queued; see set_log_queue_limit().
+
+        If monitoring was enabled with setup(monitor=True), there are also
+        histogram summaries (dictionaries with "count", "sum", "mean", "max",
+        "p50", "p90", "p99" and "buckets" keys) for "loop_lag", how late the
+        reactor runs timers, in seconds; "queue_wait", how long submitted
+        calls wait before the reactor gets to them, in seconds; and
+        "queue_depth" and "reactor_queue_depth", periodic samples of the two
+        queue lengths.
+
+        If slow callback detection was enabled with
+        setup(slow_callback_threshold=...), "slow_callbacks" is the number of
+        times the reactor thread was found to be blocked.
+        """
+        stashed = _store.stats()
+        stats = {
+            "queued_calls": 0,
+            "reactor_queued_calls": 0,
+            "registered_results": 0,
+            "stashed_results": stashed["results"],
+            "stashed_evicted": stashed["evicted"],
+            "stashed_expired": stashed["expired"],
+            "log_queue_depth": 0,
+            "log_dropped": 0,
+        }
+        if not self._started:
+            return stats
+        stats["queued_calls"] = len(self._submissions)
+        stats["reactor_queued_calls"] = len(
+            getattr(self._reactor, "threadCallQueue", ()))
+        stats["registered_results"] = len(self._registry)
+        if self._log_observer is not None:
+            stats["log_queue_depth"] = len(self._log_observer)
+            stats["log_dropped"] = self._log_observer.dropped
+        if self._monitor is not None:
+            stats.update(self._monitor.stats())
+        if self._slow_callback_detector is not None:
+            stats["slow_callbacks"] = self._slow_callback_detector.detected
+        return stats
+
+    def slow_callbacks(self):
+        """
+        Return a list of the most recent times the reactor thread was blocked
+        for longer than the threshold given to setup(slow_callback_threshold=),
+        oldest first, as crochet.SlowCallback instances.
+
+        Each has the name of the function the reactor was running, roughly
+        how long it blocked for, in seconds, and the reactor thread's stack
+        when this was noticed. A stall that is still in progress is not
+        included.
+        """
+        if self._slow_callback_detector is None:
+            return []
+        return list(self._slow_callback_detector.slow_callbacks)
+
+    def profile_reactor(self, seconds=10, interval=0.01):
+        """
+        Profile the reactor thread by sampling its stack every interval
+        seconds, for the given number of seconds, and return a
+        crochet.ReactorProfile.
+
+        Sampling is done by the calling thread, which blocks until it is
+        done; other threads aren't affected. This must not be called from the
+        reactor thread.
+        """
+        _check_not_reactor_thread("profile_reactor()")
+        thread_ident = self._call_in_reactor(threading.get_ident).wait(10)
+        return sample_thread(thread_ident, seconds, interval)
+
+    def render_metrics(self):
+        """
+        Return the statistics from reactor_stats() and stats(), and those of
+        the limit set with set_in_flight_limit(), as a string in the
+        Prometheus text exposition format.
+        """
+        from ._prometheus import render_metrics
+        return render_metrics(self)
+
+    def serve_metrics(self, port, interface="127.0.0.1"):
+        """
+        Serve the output of render_metrics() over HTTP on the given TCP port,
+        from the reactor thread.
+
+        Blocks until the port is listening, and returns the IListeningPort.
+        """
+        from ._prometheus import listen_metrics
+        return self._call_in_reactor(
+            listen_metrics, self, port, interface).wait(10)
+
+    def set_in_flight_limit(self, in_flight_limit):
+        """
+        Limit the number of calls in flight at once, across all functions
+        called via this EventLoop.
+
+        in_flight_limit is a crochet.InFlightLimit, or None to remove the
+        limit. Calls from the reactor thread with @run_in_reactor(inline=True)
+        are run immediately, and so are not limited.
+        """
+        self._in_flight_limit = in_flight_limit
+
+    def set_log_queue_limit(self, limit, policy="drop-newest",
+                            level=logging.WARNING):
+        """
+        Limit the number of Twisted log messages queued for the thread that
+        passes them on to the logging module, by default 10000.
+
+        Once the limit is reached, further messages are handled according to
+        the policy: "drop-newest" drops them, "drop-oldest" drops the oldest
+        queued message to make room, and "drop-by-level" drops them if their
+        logging level is below level, and otherwise makes room by dropping the
+        oldest queued message below level, if there is one. Once the queue
+        has been emptied, a warning says how many messages were dropped;
+        reactor_stats() counts them too.
+
+        This may be called before or after setup().
+        """
+        _check_log_queue_limit(limit, policy)
+        self._log_queue_limit = (limit, policy, level)
+        if self._log_observer is not None:
+            self._log_observer.configure(limit, policy, level)
+
+    def set_tracer(self, tracer):
+        """
+        Trace calls to functions decorated with run_in_reactor() or
+        wait_for().
+
+        tracer is a crochet.Tracer, or None to stop tracing. Each call gets a
+        span, named after the function, from when it is made until its result
+        is available or, if a thread is blocked waiting for it, until that
+        thread wakes up. The span is the current span while the function
+        runs in the reactor thread, so Twisted code can create child spans.
+        """
+        self._tracer = tracer
+
+    def _admit(self, result, in_flight_limit, deadline):
+        """
+        Admit an EventualResult under the given per-function InFlightLimit (or
+        None) and the global one, if any.
+
+        If deadline (in time.monotonic() terms) is not None, "block" limits
+        only wait until then, in total.
+
+        If either refuses it, the EventualResult is given the
+        InFlightLimitExceeded failure so it doesn't hold on to a slot, and the
+        exception is raised.
+        """
+        try:
+            for limit in (in_flight_limit, self._in_flight_limit):
+                if limit is not None:
+                    timeout = None
+                    if deadline is not None:
+                        timeout = max(deadline - time.monotonic(), 0)
+                    limit.admit(result, timeout)
+        except InFlightLimitExceeded:
+            result._set_result(Failure())
+            result._result_retrieved = True
+            raise
+
+    def _call_in_reactor(self, function, *args):
+        """
+        Call the function in the reactor thread with the given arguments, and
+        return an EventualResult for its result.
+
+        This is for crochet's own calls, so they are submitted at "high"
+        priority and aren't subject to in-flight limits: they shouldn't be
+        delayed or rejected by the load they're meant to help diagnose.
+        """
+        result = EventualResult(None, self._reactor)
+        self._registry.register(result)
+        self._submissions.submit(
+            _start, _call_function, function, result, args, {},
+            priority="high")
+        return result
+
+    def _submit(self, call, function, args, kwargs, timeout=None,
+                in_flight_limit=None, priority="normal", stats=None,
+                propagate_context=True):
+        """
+        Create and register an EventualResult, and arrange for the function to
+        be called in the reactor thread with its result hooked up to the
+        EventualResult.
+
+        call is _call_function or _call_coroutine, as chosen by _caller().
+
+        If timeout is not None, the reactor will time out the EventualResult
+        and cancel the underlying Deferred once that many seconds have passed,
+        whether or not anyone is still waiting for the result. The time spent
+        waiting for admission by an InFlightLimit counts towards it.
+
+        in_flight_limit is a per-function InFlightLimit, or None.
+
+        priority is one of SubmissionQueue.PRIORITIES.
+
+        stats is the FunctionStats to record the call in, or None.
+
+        If propagate_context is true, the function is run in a copy of the
+        calling thread's contextvars context.
+        """
+        result = EventualResult(None, self._reactor)
+        self._registry.register(result)
+        span = None
+        if stats is not None and self._tracer is not None:
+            span = self._tracer.start_span(stats.name)
+            if span.recording:
+                result._span = span
+        deadline = None
+        if timeout is not None:
+            deadline = time.monotonic() + timeout
+        if in_flight_limit is not None or self._in_flight_limit is not None:
+            self._admit(result, in_flight_limit, deadline)
+        if stats is not None:
+            result._timing = CallTiming(stats)
+        if timeout is None:
+            start = (_start, call, function, result, args, kwargs)
+        else:
+            start = (
+                _start_with_deadline, self._timers, deadline, call, function,
+                result, args, kwargs)
+        if propagate_context:
+            context = copy_context()
+            if span is not None:
+                context.run(_current_span.set, span)
+            self._submissions.submit(context.run, *start, priority=priority)
+        else:
+            self._submissions.submit(*start, priority=priority)
+        return result
+
+    def run_in_reactor(self, function=None, inline=False, timeout=None,
+                       in_flight_limit=None, priority="normal",
+                       propagate_context=True):
         """
         A decorator that ensures the wrapped function runs in the
         reactor thread.
 
         When the wrapped function is called, an EventualResult is returned.
+
+        The decorator can also be called with keyword arguments only, e.g.
+        @run_in_reactor(inline=True):
+
+        If inline is true, when the wrapped function is called from the
+        reactor thread it is called immediately, and a Deferred is returned
+        instead of an EventualResult. This is useful for code that is called
+        both from Twisted and from other threads.
+
+        If timeout is a number of seconds (a float), once it passes the
+        reactor will cancel the Deferred being waited on and the
+        EventualResult's result will be a crochet.TimeoutError, even if nobody
+        is waiting for the result. For inline calls, the returned Deferred is
+        cancelled instead.
+
+        in_flight_limit is a crochet.InFlightLimit that applies to calls of
+        this function only, in addition to any limit set with
+        set_in_flight_limit(). Inline calls are not limited.
+
+        priority is "high", "normal" or "low". When many calls are queued for
+        the reactor, higher priority calls are run first, though lower
+        priority calls still get a share so they aren't starved.
+
+        By default the function runs in a copy of the calling thread's
+        contextvars context, as captured when it was called. This includes
+        the tracing span, when tracing with set_tracer(). Pass
+        propagate_context=False to skip this, for slightly cheaper calls.
         """
+        if function is None:
+            return partial(
+                self.run_in_reactor, inline=inline, timeout=timeout,
+                in_flight_limit=in_flight_limit, priority=priority,
+                propagate_context=propagate_context)
+
+        _check_priority(priority)
+        call = _caller(function)
+        stats = self._stats_for(function)
+
         def _run_in_reactor(wrapped, _, args, kwargs):
             """
             Implementation: A decorator that ensures the wrapped function runs in
@@ -398,33 +1609,56 @@ class EventLoop(object):
 
             When the wrapped function is called, an EventualResult is returned.
             """
+            if inline and threadable.isInIOThread():
+                d = call(wrapped, args, kwargs)
+                if timeout is not None:
+                    d.addTimeout(timeout, self._reactor)
+                return d
+            return self._submit(
+                call, wrapped, args, kwargs, timeout, in_flight_limit,
+                priority, stats, propagate_context)
+
+        return _decorate(_run_in_reactor, function)
+
+    def submit_many(self, function, arguments):
+        """
+        Call a function in the reactor thread once per tuple of positional
+        arguments in the given iterable.
 
-            if iscoroutinefunction(wrapped):
-                def runs_in_reactor(result, args, kwargs):
-                    d = ensureDeferred(wrapped(*args, **kwargs))
-                    result._connect_deferred(d)
-            else:
-                def runs_in_reactor(result, args, kwargs):
-                    d = maybeDeferred(wrapped, *args, **kwargs)
-                    result._connect_deferred(d)
-
-            result = EventualResult(None, self._reactor)
-            self._registry.register(result)
-            self._reactor.callFromThread(runs_in_reactor, result, args, kwargs)
-            return result
+        The whole batch is handed over to the reactor thread at once, which is
+        cheaper than calling a @run_in_reactor-decorated function in a loop.
 
-        if iscoroutinefunction(function):
-            # Create a non-async wrapper with same signature.
-            @wraps(function)
-            def non_async_wrapper():
-                pass
-        else:
-            # Just use default behavior of looking at underlying object.
-            non_async_wrapper = None
+        Returns a list of EventualResult, one per tuple of arguments, in the
+        same order.
 
-        return wrapt.decorator(_run_in_reactor, adapter=non_async_wrapper)(function)
+        Any limit set with set_in_flight_limit() applies to each call, and the
+        batch is admitted all at once; if it is refused, none of the calls are
+        run. With the "block" policy this waits until there is room for the
+        whole batch, and a batch larger than the limit is always refused.
 
-    def wait_for(self, timeout):
+        The calls run in a copy of the calling thread's contextvars context.
+        """
+        batch = [
+            (EventualResult(None, self._reactor), tuple(args))
+            for args in arguments
+        ]
+        results = [result for (result, _) in batch]
+        self._registry.register_many(results)
+        if self._in_flight_limit is not None:
+            try:
+                self._in_flight_limit.admit_many(results)
+            except InFlightLimitExceeded:
+                for result in results:
+                    result._set_result(Failure())
+                    result._result_retrieved = True
+                raise
+        if batch:
+            self._submissions.submit(
+                copy_context().run, _run_batch, function, batch)
+        return results
+
+    def wait_for(self, timeout, in_flight_limit=None, priority="normal",
+                 propagate_context=True):
         """
         A decorator factory that ensures the wrapped function runs in the
         reactor thread.
@@ -432,35 +1666,34 @@ class EventLoop(object):
         When the wrapped function is called, its result is returned or its
         exception raised. Deferreds are handled transparently. Calls will
         timeout after the given number of seconds (a float), raising a
-        crochet.TimeoutError, and cancelling the Deferred being waited on.
+        crochet.TimeoutError. The reactor cancels the Deferred being waited
+        on at the same deadline; if the deadline passes before the reactor
+        gets around to calling the function, it is not called at all.
+
+        in_flight_limit is a crochet.InFlightLimit that applies to calls of
+        this function only, in addition to any limit set with
+        set_in_flight_limit(). A "block" policy waits at most the timeout.
+
+        priority is "high", "normal" or "low", and propagate_context controls
+        whether the function runs in a copy of the calling thread's
+        contextvars context, as for run_in_reactor().
         """
+        _check_priority(priority)
 
         def decorator(function):
-            def wrapper(function, _, args, kwargs):
-                @self.run_in_reactor
-                def run():
-                    if iscoroutinefunction(function):
-                        return ensureDeferred(function(*args, **kwargs))
-                    else:
-                        return function(*args, **kwargs)
-
-                eventual_result = run()
-                try:
-                    return eventual_result.wait(timeout)
-                except TimeoutError:
-                    eventual_result.cancel()
-                    raise
-
-            if iscoroutinefunction(function):
-                # Create a non-async wrapper with same signature.
-                @wraps(function)
-                def non_async_wrapper():
-                    pass
-            else:
-                # Just use default behavior of looking at underlying object.
-                non_async_wrapper = None
-
-            wrapper = wrapt.decorator(wrapper, adapter=non_async_wrapper)
-            return wrapper(function)
+            call = _caller(function)
+            stats = self._stats_for(function)
+
+            def wrapper(wrapped, _, args, kwargs):
+                # Time spent blocked by an InFlightLimit counts towards the
+                # timeout:
+                deadline = time.monotonic() + timeout
+                eventual_result = self._submit(
+                    call, wrapped, args, kwargs, timeout, in_flight_limit,
+                    priority, stats, propagate_context)
+                return eventual_result.wait(
+                    max(deadline - time.monotonic(), 0))
+
+            return _decorate(wrapper, function)
 
         return decorator
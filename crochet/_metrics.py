@@ -0,0 +1,107 @@
+"""
+Cheap in-process metrics.
+"""
+
+from bisect import bisect_left
+
+
+def exponential_bounds(start, factor, count):
+    """
+    Return a list of count bucket upper bounds, starting at start and each one
+    factor times bigger than the previous one.
+    """
+    return [start * factor ** i for i in range(count)]
+
+
+def latency_histogram():
+    """
+    Return a Histogram for durations in seconds, from 10µs to over a minute.
+    """
+    return Histogram(exponential_bounds(0.00001, 2, 24))
+
+
+def count_histogram():
+    """
+    Return a Histogram for sizes, e.g. queue lengths, up to about a million.
+    """
+    return Histogram(exponential_bounds(1, 2, 21))
+
+
+class Histogram(object):
+    """
+    A histogram with fixed bucket bounds.
+
+    Recording a value is O(log(number of buckets)) and allocates nothing, so
+    it is cheap enough to do on hot paths. It is not thread-safe: values
+    should only be recorded from one thread at a time, though snapshots may be
+    taken from any thread.
+    """
+
+    def __init__(self, bounds):
+        """
+        bounds is an increasing list of bucket upper bounds; values larger
+        than the last bound go in an extra overflow bucket.
+        """
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def record(self, value):
+        """
+        Record a value.
+        """
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def merge(self, other):
+        """
+        Add the values recorded by another Histogram with the same bounds.
+        """
+        for i, count in enumerate(other.counts):
+            self.counts[i] += count
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction, counts=None):
+        """
+        Return an upper bound for the given fraction (e.g. 0.99) of the
+        recorded values: the upper bound of the bucket it falls in, or the
+        maximum value if it falls in the overflow bucket. Returns 0 if nothing
+        has been recorded.
+        """
+        if counts is None:
+            counts = list(self.counts)
+        total = sum(counts)
+        if total == 0:
+            return 0
+        target = fraction * total
+        seen = 0
+        for bound, count in zip(self.bounds, counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        """
+        Return a dictionary summarizing the histogram.
+        """
+        counts = list(self.counts)
+        count = sum(counts)
+        total = self.sum
+        return {
+            "count": count,
+            "sum": total,
+            "mean": total / count if count else 0,
+            "max": self.max,
+            "p50": self.percentile(0.5, counts),
+            "p90": self.percentile(0.9, counts),
+            "p99": self.percentile(0.99, counts),
+            "buckets": list(zip(self.bounds + [float("inf")], counts)),
+        }
@@ -0,0 +1,64 @@
+"""
+Monitoring of the reactor thread's health.
+"""
+
+from ._metrics import latency_histogram, count_histogram
+
+
+class ReactorMonitor(object):
+    """
+    Periodically sample how responsive the reactor is.
+
+    Every interval seconds a timer fires in the reactor thread. The
+    difference between when it was scheduled to fire and when it actually
+    fired is the loop lag: how long the reactor was too busy to get to it.
+    Each time, the number of calls queued by Crochet and the length of the
+    reactor's own callFromThread() queue are sampled too. In addition, the
+    time each batch of submitted calls waited before the reactor ran it is
+    recorded.
+    """
+
+    def __init__(self, reactor, submissions, interval=0.1):
+        self._reactor = reactor
+        self._submissions = submissions
+        self._interval = interval
+        self._expected = None
+        self.loop_lag = latency_histogram()
+        self.queue_wait = latency_histogram()
+        self.queue_depth = count_histogram()
+        self.reactor_queue_depth = count_histogram()
+
+    def start(self):
+        """
+        Start monitoring.
+
+        Should only be run in Twisted thread.
+        """
+        self._submissions.wait_times = self.queue_wait
+        self._schedule()
+
+    def _schedule(self):
+        self._expected = self._reactor.seconds() + self._interval
+        self._reactor.callLater(self._interval, self._sample)
+
+    def _sample(self):
+        """
+        Record the loop lag and queue depths, and schedule the next sample.
+        """
+        self.loop_lag.record(
+            max(self._reactor.seconds() - self._expected, 0))
+        self.queue_depth.record(len(self._submissions))
+        self.reactor_queue_depth.record(
+            len(getattr(self._reactor, "threadCallQueue", ())))
+        self._schedule()
+
+    def stats(self):
+        """
+        Return a dictionary of histogram snapshots.
+        """
+        return {
+            "loop_lag": self.loop_lag.snapshot(),
+            "queue_wait": self.queue_wait.snapshot(),
+            "queue_depth": self.queue_depth.snapshot(),
+            "reactor_queue_depth": self.reactor_queue_depth.snapshot(),
+        }
@@ -0,0 +1,75 @@
+"""
+A sampling profiler for the reactor thread.
+"""
+
+import sys
+import time
+
+
+class ReactorProfile(object):
+    """
+    The result of profiling the reactor thread.
+
+    stacks maps each stack seen, as a string of semicolon-separated function
+    names from outermost to innermost, to how many samples saw it. samples is
+    the total number of samples, and duration how long sampling took, in
+    seconds.
+    """
+
+    def __init__(self, stacks, samples, duration):
+        self.stacks = stacks
+        self.samples = samples
+        self.duration = duration
+
+    def folded(self):
+        """
+        Return the stacks in the "folded" format read by flamegraph.pl,
+        speedscope and similar tools: one line per stack, with the stack and
+        its number of samples separated by a space, most common first.
+        """
+        return "".join(
+            "%s %d\n" % (stack, count) for (stack, count) in sorted(
+                self.stacks.items(), key=lambda item: (-item[1], item[0])))
+
+
+def _name(module, code):
+    return "%s.%s" % (module, getattr(code, "co_qualname", code.co_name))
+
+
+def sample_thread(thread_ident, seconds, interval, clock=time.monotonic,
+                  sleep=time.sleep):
+    """
+    Sample the stack of the thread with the given identifier every interval
+    seconds, for the given number of seconds, and return a ReactorProfile.
+
+    Runs in the calling thread. Each sample only records the code objects on
+    the stack; they are turned into names once sampling is done.
+    """
+    counts = {}
+    modules = {}
+    samples = 0
+    started = clock()
+    deadline = started + seconds
+    while True:
+        frame = sys._current_frames().get(thread_ident)
+        if frame is not None:
+            codes = []
+            while frame is not None:
+                code = frame.f_code
+                if code not in modules:
+                    modules[code] = frame.f_globals.get("__name__")
+                codes.append(code)
+                frame = frame.f_back
+            key = tuple(codes)
+            counts[key] = counts.get(key, 0) + 1
+            samples += 1
+        now = clock()
+        if now >= deadline:
+            break
+        sleep(min(interval, deadline - now))
+    stacks = {}
+    for codes, count in counts.items():
+        stack = ";".join(
+            _name(modules[code], code) for code in reversed(codes))
+        stacks[stack] = stacks.get(stack, 0) + count
+    return ReactorProfile(stacks, samples, now - started)
@@ -0,0 +1,193 @@
+"""
+Export Crochet's statistics in the Prometheus text exposition format.
+"""
+
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+CONTENT_TYPE = b"text/plain; version=0.0.4; charset=utf-8"
+
+_GAUGES = [
+    ("queued_calls", "crochet_queued_calls",
+     "Calls waiting for the reactor thread to run them."),
+    ("reactor_queued_calls", "crochet_reactor_queued_calls",
+     "Length of the reactor's callFromThread() queue."),
+    ("registered_results", "crochet_registered_results",
+     "EventualResults created by calls that are still alive."),
+    ("stashed_results", "crochet_stashed_results",
+     "EventualResults stored with EventualResult.stash()."),
+    ("log_queue_depth", "crochet_log_queue_depth",
+     "Log messages waiting to be passed on to the logging module."),
+]
+
+_HISTOGRAMS = [
+    ("loop_lag", "crochet_loop_lag_seconds",
+     "How late the reactor fired the monitor's timer."),
+    ("queue_wait", "crochet_queue_wait_seconds",
+     "How long submitted calls waited for the reactor thread."),
+    ("queue_depth", "crochet_queue_depth",
+     "Sampled number of calls waiting for the reactor thread."),
+    ("reactor_queue_depth", "crochet_reactor_queue_depth",
+     "Sampled length of the reactor's callFromThread() queue."),
+]
+
+_IN_FLIGHT_COUNTERS = ["admitted", "blocked", "rejected", "shed"]
+
+_CALL_COUNTERS = [
+    ("calls", "crochet_calls_total", "Calls to the function."),
+    ("errors", "crochet_call_errors_total", "Calls that failed."),
+    ("timeouts", "crochet_call_timeouts_total", "Calls that timed out."),
+    ("cancellations", "crochet_call_cancellations_total",
+     "Calls that were cancelled."),
+]
+
+_PHASES = ["submit_to_start", "start_to_fire", "fire_to_wake"]
+
+
+def _escape(value):
+    """
+    Escape a label value.
+    """
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace(
+        '"', '\\"')
+
+
+def _labels(labels):
+    """
+    Format a sequence of (name, value) pairs as a label set.
+    """
+    if not labels:
+        return ""
+    return "{%s}" % (",".join(
+        '%s="%s"' % (name, _escape(value)) for (name, value) in labels), )
+
+
+def _number(value):
+    """
+    Format a sample value.
+    """
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value)
+
+
+class _Writer(object):
+    """
+    Accumulates lines of the exposition format.
+    """
+
+    def __init__(self):
+        self.lines = []
+
+    def header(self, name, metric_type, description):
+        self.lines.append("# HELP %s %s" % (name, description))
+        self.lines.append("# TYPE %s %s" % (name, metric_type))
+
+    def sample(self, name, value, labels=()):
+        self.lines.append(
+            "%s%s %s" % (name, _labels(labels), _number(value)))
+
+    def histogram(self, name, snapshot, labels=()):
+        """
+        Write the samples for a histogram summary, as returned by
+        Histogram.snapshot().
+        """
+        cumulative = 0
+        for bound, count in snapshot["buckets"]:
+            cumulative += count
+            self.sample(
+                name + "_bucket", cumulative,
+                tuple(labels) + (("le", _number(float(bound))), ))
+        self.sample(name + "_sum", snapshot["sum"], labels)
+        self.sample(name + "_count", snapshot["count"], labels)
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+
+def render_metrics(eventloop):
+    """
+    Return the given EventLoop's statistics in the Prometheus text exposition
+    format.
+    """
+    out = _Writer()
+    reactor_stats = eventloop.reactor_stats()
+    for key, name, description in _GAUGES:
+        out.header(name, "gauge", description)
+        out.sample(name, reactor_stats[key])
+    for key, name, description in _HISTOGRAMS:
+        if key in reactor_stats:
+            out.header(name, "histogram", description)
+            out.histogram(name, reactor_stats[key])
+
+    for key, reason in [("stashed_evicted", "evicted"),
+                        ("stashed_expired", "expired")]:
+        name = "crochet_%s_results_total" % (key, )
+        out.header(name, "counter",
+                   "Stashed EventualResults %s before being retrieved."
+                   % (reason, ))
+        out.sample(name, reactor_stats[key])
+    name = "crochet_log_dropped_total"
+    out.header(name, "counter",
+               "Log messages dropped because too many were queued.")
+    out.sample(name, reactor_stats["log_dropped"])
+    if "slow_callbacks" in reactor_stats:
+        name = "crochet_slow_callbacks_total"
+        out.header(name, "counter",
+                   "Times the reactor thread was blocked for too long.")
+        out.sample(name, reactor_stats["slow_callbacks"])
+
+    limit = eventloop._in_flight_limit
+    if limit is not None:
+        out.header("crochet_in_flight_calls", "gauge",
+                   "Calls in flight under the global limit.")
+        out.sample("crochet_in_flight_calls", limit.in_flight)
+        out.header("crochet_in_flight_limit", "gauge",
+                   "The global limit on calls in flight.")
+        out.sample("crochet_in_flight_limit", limit.limit)
+        for counter in _IN_FLIGHT_COUNTERS:
+            name = "crochet_in_flight_%s_total" % (counter, )
+            out.header(name, "counter",
+                       "Calls %s by the global in-flight limit." % (counter, ))
+            out.sample(name, getattr(limit, counter))
+
+    function_stats = sorted(eventloop.stats().items())
+    if function_stats:
+        for key, name, description in _CALL_COUNTERS:
+            out.header(name, "counter", description)
+            for function, stats in function_stats:
+                out.sample(name, stats[key], [("function", function)])
+        name = "crochet_call_phase_seconds"
+        out.header(name, "histogram", "Duration of each phase of calls.")
+        for function, stats in function_stats:
+            for phase in _PHASES:
+                out.histogram(
+                    name, stats[phase],
+                    [("function", function), ("phase", phase)])
+    return out.render()
+
+
+class MetricsResource(Resource):
+    """
+    A Twisted Web resource serving an EventLoop's statistics in the Prometheus
+    text exposition format.
+    """
+    isLeaf = True
+
+    def __init__(self, eventloop):
+        Resource.__init__(self)
+        self._eventloop = eventloop
+
+    def render_GET(self, request):
+        request.setHeader(b"content-type", CONTENT_TYPE)
+        return render_metrics(self._eventloop).encode("utf-8")
+
+
+def listen_metrics(eventloop, port, interface):
+    """
+    Serve a MetricsResource over HTTP on the given port and interface.
+
+    Should only be run in Twisted thread.
+    """
+    return eventloop._reactor.listenTCP(
+        port, Site(MetricsResource(eventloop)), interface=interface)
@@ -2,13 +2,98 @@
 In-memory store for EventualResults.
 """
 
+import heapq
 import threading
+import time
+from collections import OrderedDict
 
 from twisted.python import log
+from zope.interface import Attribute, Interface, implementer
 
 from ._util import synchronized
 
 
+class ResultNotReady(Exception):
+    """
+    The stashed EventualResult exists, but it is held by another process and
+    doesn't have a result yet.
+    """
+
+
+def _check_limits(max_size, ttl):
+    """
+    Raise a ValueError if the limits for a result store are invalid.
+    """
+    if max_size is not None and max_size < 1:
+        raise ValueError("max_size must be at least 1")
+    if ttl is not None and ttl <= 0:
+        raise ValueError("ttl must be positive")
+
+
+class IResultStore(Interface):
+    """
+    A store for EventualResults, as used by EventualResult.stash() and
+    retrieve_result(); set_result_store() accepts any object providing it.
+
+    Methods other than stats() may be called from any thread.
+    """
+
+    evicted = Attribute(
+        "The number of results removed to keep the store within max_size.")
+    expired = Attribute(
+        "The number of results removed because their TTL passed.")
+
+    def __len__():
+        """
+        Return the number of stored EventualResults.
+        """
+
+    def configure(max_size=None, ttl=None):
+        """
+        Limit the store to max_size results, and set the default number of
+        seconds before stored results expire. None means no limit.
+        """
+
+    def store(deferred_result, ttl=None):
+        """
+        Store an EventualResult, which expires after ttl seconds, or the
+        store's default TTL if ttl is None.
+
+        Return an integer, a unique identifier that can be used to retrieve
+        it.
+        """
+
+    def retrieve(result_id):
+        """
+        Return the given EventualResult, and remove it from the store.
+
+        Raises KeyError if there is no such result, including if it was
+        evicted or has expired, and may raise ResultNotReady if it is held
+        elsewhere and doesn't have a result yet.
+        """
+
+    def expire():
+        """
+        Remove results whose TTL has passed.
+        """
+
+    def stats():
+        """
+        Return a dictionary with "results", the number of stored results, and
+        the "evicted" and "expired" counts.
+
+        Called by reactor_stats(), possibly in the reactor thread, so it must
+        not block; the values may be slightly out of date.
+        """
+
+    def log_errors():
+        """
+        Called at shutdown: log errors for the stored EventualResults that
+        have error results and will be lost.
+        """
+
+
+@implementer(IResultStore)
 class ResultStore(object):
     """
     An in-memory store for EventualResult instances.
@@ -19,38 +104,145 @@ class ResultStore(object):
 
     EventualResults that are not retrieved by shutdown will be logged if they
     have an error result.
+
+    So that results nobody retrieves don't accumulate forever, the store can
+    be limited to max_size results, evicting the least recently stored one to
+    make room, and results can expire ttl seconds after being stored. Expired
+    results are removed whenever the store is used. Evicted and expired
+    results are logged like those left at shutdown, and counted by the
+    evicted and expired attributes.
     """
 
-    def __init__(self):
+    def __init__(self, max_size=None, ttl=None, clock=time.monotonic):
         self._counter = 0
-        self._stored = {}
+        self._stored = OrderedDict()
+        # (deadline, uid) pairs for results with a TTL; entries for results
+        # that are no longer stored are discarded lazily:
+        self._deadlines = []
+        self._clock = clock
         self._lock = threading.Lock()
+        self.evicted = 0
+        self.expired = 0
+        self.configure(max_size, ttl)
+
+    def __len__(self):
+        """
+        Return the number of stored EventualResults.
+        """
+        return len(self._stored)
+
+    def stats(self):
+        """
+        Return a dictionary with "results", the number of stored results, and
+        the "evicted" and "expired" counts, after removing expired results.
+        """
+        self.expire()
+        return {
+            "results": len(self._stored),
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+    @synchronized
+    def configure(self, max_size=None, ttl=None):
+        """
+        Limit the store to max_size results, and set the default number of
+        seconds before stored results expire. None means no limit.
+
+        If the store holds more than max_size results, the oldest are evicted
+        immediately. The new TTL only applies to results stored afterwards.
+        """
+        _check_limits(max_size, ttl)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._evict()
 
     @synchronized
-    def store(self, deferred_result):
+    def store(self, deferred_result, ttl=None):
         """
         Store a EventualResult.
 
+        It expires after ttl seconds, or the store's default TTL if ttl is
+        None.
+
         Return an integer, a unique identifier that can be used to retrieve
         the object.
         """
+        self._expire()
         self._counter += 1
         self._stored[self._counter] = deferred_result
+        if ttl is None:
+            ttl = self.ttl
+        if ttl is not None:
+            heapq.heappush(
+                self._deadlines, (self._clock() + ttl, self._counter))
+        self._evict()
         return self._counter
 
     @synchronized
     def retrieve(self, result_id):
         """
         Return the given EventualResult, and remove it from the store.
+
+        Raises KeyError if there is no such result, including if it was
+        evicted or has expired.
         """
+        self._expire()
         return self._stored.pop(result_id)
 
+    @synchronized
+    def expire(self):
+        """
+        Remove results whose TTL has passed.
+        """
+        self._expire()
+
+    def _expire(self):
+        deadlines = self._deadlines
+        now = self._clock()
+        while deadlines and deadlines[0][0] <= now:
+            _, uid = heapq.heappop(deadlines)
+            result = self._stored.pop(uid, None)
+            if result is not None:
+                self.expired += 1
+                _log_error(result, "expired")
+        if len(deadlines) > 2 * len(self._stored) + 64:
+            self._deadlines = [
+                entry for entry in deadlines if entry[1] in self._stored]
+            heapq.heapify(self._deadlines)
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        while len(self._stored) > self.max_size:
+            _, result = self._stored.popitem(last=False)
+            self.evicted += 1
+            _log_error(result, "evicted")
+
     @synchronized
     def log_errors(self):
         """
         Log errors for all stored EventualResults that have error results.
         """
         for result in self._stored.values():
-            failure = result.original_failure()
-            if failure is not None:
-                log.err(failure, "Unhandled error in stashed EventualResult:")
+            _log_error(result)
+
+
+def _log_error(result, reason=None):
+    """
+    Log the EventualResult's error result, if it has one.
+    """
+    failure = result.original_failure()
+    if failure is not None:
+        _log_failure(failure, reason)
+
+
+def _log_failure(failure, reason=None):
+    """
+    Log the error result of a stashed EventualResult.
+    """
+    if reason is None:
+        why = "Unhandled error in stashed EventualResult:"
+    else:
+        why = "Unhandled error in %s stashed EventualResult:" % (reason, )
+    log.err(failure, why)
@@ -0,0 +1,176 @@
+"""
+Detection of callbacks that block the reactor thread.
+"""
+
+import logging
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+
+from twisted.python import log
+
+
+def _is_internal(frame):
+    """
+    Return whether a frame is part of Twisted's or Crochet's machinery.
+    """
+    module = frame.f_globals.get("__name__", "")
+    return module.startswith(("twisted.", "crochet._"))
+
+
+def _function_name(frame):
+    code = frame.f_code
+    return "%s.%s" % (
+        frame.f_globals.get("__name__"),
+        getattr(code, "co_qualname", code.co_name))
+
+
+def _blamed_function(frame):
+    """
+    Given the innermost frame of the reactor thread, return the name of the
+    function that the reactor called: the outermost frame inside the
+    innermost Twisted or Crochet frame.
+    """
+    blamed = frame
+    while frame is not None and not _is_internal(frame):
+        blamed = frame
+        frame = frame.f_back
+    return _function_name(blamed)
+
+
+class SlowCallback(object):
+    """
+    A period of time in which the reactor thread was blocked.
+
+    function is the name of the function the reactor was running, duration
+    is roughly how long it blocked, in seconds, and stack is the reactor
+    thread's stack when the blocking was noticed, as a string.
+    """
+    __slots__ = ("function", "duration", "stack")
+
+    def __init__(self, function, duration, stack):
+        self.function = function
+        self.duration = duration
+        self.stack = stack
+
+    def __repr__(self):
+        return "<SlowCallback %s %.3fs>" % (self.function, self.duration)
+
+
+class _Stall(object):
+    """
+    A stall that is still in progress.
+    """
+    __slots__ = ("beat", "started", "function", "stack")
+
+    def __init__(self, beat, started, function, stack):
+        self.beat = beat
+        self.started = started
+        self.function = function
+        self.stack = stack
+
+
+class SlowCallbackDetector(object):
+    """
+    Notice when the reactor thread is blocked for longer than threshold
+    seconds, and capture what it is doing.
+
+    A heartbeat timer runs in the reactor thread every threshold / 2 seconds.
+    A watchdog thread checks just as often that it ran recently; if it is
+    overdue by more than threshold, the watchdog captures the reactor
+    thread's stack with sys._current_frames() and logs it. Once the reactor
+    thread gets going again, a SlowCallback recording how long it was blocked
+    is appended to slow_callbacks, which keeps the most recent ones. While
+    nothing is slow, the cost is one timer call and one comparison per
+    heartbeat.
+    """
+
+    def __init__(self, reactor, threshold=0.1, capacity=100,
+                 clock=time.monotonic):
+        self._reactor = reactor
+        self.threshold = threshold
+        self._interval = threshold / 2
+        self._clock = clock
+        self._reactor_thread = None
+        self._last_beat = None
+        self._beat_call = None
+        self._stall = None
+        self._stopped = threading.Event()
+        self._thread = None
+        self.detected = 0
+        self.slow_callbacks = deque(maxlen=capacity)
+
+    def start(self):
+        """
+        Start the heartbeat and the watchdog thread.
+
+        Should only be run in Twisted thread.
+        """
+        self._reactor_thread = threading.get_ident()
+        self._beat()
+        self._thread = threading.Thread(
+            target=self._watch, name="CrochetSlowCallbackDetector",
+            daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stop the heartbeat and the watchdog thread.
+
+        Should only be run in Twisted thread.
+        """
+        self._stopped.set()
+        if self._beat_call is not None and self._beat_call.active():
+            self._beat_call.cancel()
+
+    def _beat(self):
+        self._last_beat = self._clock()
+        self._beat_call = self._reactor.callLater(self._interval, self._beat)
+
+    def _watch(self):
+        while not self._stopped.wait(self._interval):
+            self.check()
+
+    def check(self):
+        """
+        Check whether the reactor thread is blocked, or has stopped being
+        blocked.
+
+        Runs in the watchdog thread.
+        """
+        last_beat = self._last_beat
+        stall = self._stall
+        if stall is not None:
+            if last_beat != stall.beat:
+                # The heartbeat ran again, so the reactor got unblocked:
+                self._stall = None
+                self._finished(stall, last_beat)
+            return
+        if self._clock() - last_beat <= self._interval + self.threshold:
+            return
+        frame = sys._current_frames().get(self._reactor_thread)
+        if frame is None:
+            return
+        self._stall = _Stall(
+            last_beat, last_beat + self._interval, _blamed_function(frame),
+            "".join(traceback.format_stack(frame)))
+        del frame
+        self.detected += 1
+        log.msg(
+            "Reactor thread has been blocked for over %.3f seconds in %s:\n%s"
+            % (self.threshold, self._stall.function, self._stall.stack),
+            logLevel=logging.WARNING)
+
+    def _finished(self, stall, ended):
+        """
+        Record a stall that is over.
+        """
+        slow_callback = SlowCallback(
+            stall.function, ended - stall.started, stall.stack)
+        self.slow_callbacks.append(slow_callback)
+        log.msg(
+            "Reactor thread was blocked for %.3f seconds in %s"
+            % (slow_callback.duration, slow_callback.function),
+            logLevel=logging.WARNING)
@@ -0,0 +1,389 @@
+"""
+A ResultStore that keeps results in an SQLite database, so they can be
+retrieved by other processes.
+"""
+
+import pickle
+import sqlite3
+import threading
+import time
+from functools import partial
+from queue import Empty, SimpleQueue
+
+from twisted.internet.defer import fail, succeed
+from twisted.python import log
+from twisted.python.failure import Failure
+from zope.interface import implementer
+
+from ._eventloop import EventualResult
+from ._resultstore import (
+    IResultStore, ResultNotReady, _check_limits, _log_error, _log_failure)
+from ._util import synchronized
+
+# States of a row:
+_PENDING = 0
+_VALUE = 1
+_ERROR = 2
+# Couldn't be serialized, so only the process that stored it has it:
+_LOCAL = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS crochet_results (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    state INTEGER NOT NULL,
+    data BLOB,
+    expires REAL
+);
+CREATE INDEX IF NOT EXISTS crochet_results_expires
+    ON crochet_results (expires);
+"""
+
+_STOP = object()
+
+
+class PickleSerializer(object):
+    """
+    Serialize results with pickle.
+
+    A serializer has a dumps() method that turns an object into bytes, and a
+    loads() method that turns those bytes back into an equivalent object.
+    SQLiteResultStore passes it a result's value, or for error results the
+    exception.
+
+    Loading a pickle can run arbitrary code, so only use this with a database
+    that nobody untrusted can write to.
+    """
+
+    def __init__(self, protocol=pickle.HIGHEST_PROTOCOL):
+        self.protocol = protocol
+
+    def dumps(self, obj):
+        return pickle.dumps(obj, self.protocol)
+
+    def loads(self, data):
+        return pickle.loads(data)
+
+
+@implementer(IResultStore)
+class SQLiteResultStore(object):
+    """
+    A store for EventualResult instances, backed by an SQLite database in WAL
+    mode, that any process on the host opening the same file can retrieve
+    results from.
+
+    Storing an EventualResult reserves its identifier in the database. Once
+    it has a result, a writer thread serializes it with the serializer, a
+    PickleSerializer by default, and writes it to the database, so the
+    reactor thread never waits for serialization or the disk. Until then,
+    this process retrieves the original EventualResult, while other
+    processes get ResultNotReady. Results retrieved from the database are
+    new EventualResults with the deserialized value or exception. Results
+    that can't be serialized are logged, and can then only be retrieved by
+    this process; other processes get KeyError.
+
+    Results outlive the process, and so are not logged at shutdown; results
+    still without a result at shutdown are removed, since they will never
+    get one. max_size and ttl limit the database like they limit a
+    ResultStore; the evicted and expired attributes count the results this
+    process removed. The writer thread also removes expired results, and
+    counts the stored results for stats(), every REFRESH_INTERVAL seconds.
+    """
+    REFRESH_INTERVAL = 1.0
+
+    def __init__(self, path, serializer=None, max_size=None, ttl=None,
+                 clock=time.time, timeout=5.0):
+        if serializer is None:
+            serializer = PickleSerializer()
+        self._serializer = serializer
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None,
+            check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        # EventualResults stored by this process that haven't been written to
+        # the database yet:
+        self._pending = {}
+        self._queue = SimpleQueue()
+        self.evicted = 0
+        self.expired = 0
+        self.configure(max_size, ttl)
+        # The number of stored results, as of the writer thread's last
+        # refresh:
+        self._size = len(self)
+        self._thread = threading.Thread(
+            target=self._writer, name="CrochetResultStoreWriter",
+            daemon=True)
+        self._thread.start()
+
+    def __len__(self):
+        """
+        Return the number of stored EventualResults, from all processes.
+        """
+        with self._lock:
+            return self._count()
+
+    def _count(self):
+        return self._db.execute(
+            "SELECT COUNT(*) FROM crochet_results").fetchone()[0]
+
+    def stats(self):
+        """
+        Return a dictionary with "results", the number of stored results as
+        of the writer thread's last refresh, and the "evicted" and "expired"
+        counts.
+
+        This doesn't touch the database, so it can be called in the reactor
+        thread.
+        """
+        return {
+            "results": self._size,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+    @synchronized
+    def configure(self, max_size=None, ttl=None):
+        """
+        Limit the database to max_size results, and set the default number of
+        seconds before results stored by this process expire. None means no
+        limit.
+        """
+        _check_limits(max_size, ttl)
+        self.max_size = max_size
+        self.ttl = ttl
+        self._evict()
+
+    def store(self, deferred_result, ttl=None):
+        """
+        Store a EventualResult.
+
+        It expires after ttl seconds, or the store's default TTL if ttl is
+        None.
+
+        Return an integer, a unique identifier that any process using the
+        same database can use to retrieve the result.
+        """
+        if ttl is None:
+            ttl = self.ttl
+        expires = None if ttl is None else self._clock() + ttl
+        with self._lock:
+            self._expire()
+            uid = self._db.execute(
+                "INSERT INTO crochet_results (state, expires) VALUES (?, ?)",
+                (_PENDING, expires)).lastrowid
+            self._pending[uid] = deferred_result
+            self._evict()
+        completed = partial(self._completed, uid)
+        if not deferred_result._add_waiter(completed):
+            completed(deferred_result)
+        return uid
+
+    def _completed(self, uid, deferred_result):
+        """
+        Queue a stored EventualResult that has a result to be written.
+        """
+        self._queue.put((uid, deferred_result))
+
+    def retrieve(self, result_id):
+        """
+        Return the given EventualResult, and remove it from the store.
+
+        Raises KeyError if there is no such result, including if it was
+        evicted or has expired, and ResultNotReady if another process stored
+        it and it doesn't have a result yet.
+        """
+        with self._lock:
+            self._expire()
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._db.execute(
+                    "SELECT state, data FROM crochet_results WHERE id = ?",
+                    (result_id, )).fetchone()
+                if row is None:
+                    # Possibly removed by another process:
+                    self._pending.pop(result_id, None)
+                    raise KeyError(result_id)
+                state, data = row
+                if result_id in self._pending:
+                    result = self._pending.pop(result_id)
+                elif state == _LOCAL:
+                    raise KeyError(result_id)
+                elif state == _PENDING:
+                    raise ResultNotReady(result_id)
+                else:
+                    result = None
+                self._db.execute(
+                    "DELETE FROM crochet_results WHERE id = ?", (result_id, ))
+            finally:
+                self._db.execute("COMMIT")
+        if result is not None:
+            return result
+        if state == _ERROR:
+            return EventualResult(fail(self._serializer.loads(data)), None)
+        return EventualResult(succeed(self._serializer.loads(data)), None)
+
+    @synchronized
+    def expire(self):
+        """
+        Remove results whose TTL has passed.
+        """
+        self._expire()
+
+    def _expire(self):
+        rows = self._db.execute(
+            "SELECT id, state, data FROM crochet_results WHERE expires <= ?",
+            (self._clock(), )).fetchall()
+        self.expired += self._remove(rows, "expired")
+
+    def _evict(self):
+        if self.max_size is None:
+            return
+        rows = self._db.execute(
+            "SELECT id, state, data FROM crochet_results "
+            "WHERE id <= (SELECT id FROM crochet_results "
+            "ORDER BY id DESC LIMIT 1 OFFSET ?)",
+            (self.max_size, )).fetchall()
+        self.evicted += self._remove(rows, "evicted")
+
+    def _remove(self, rows, reason):
+        """
+        Delete the given rows, logging any error results, and return how many
+        were deleted.
+        """
+        removed = 0
+        for uid, state, data in rows:
+            if self._db.execute(
+                    "DELETE FROM crochet_results WHERE id = ?",
+                    (uid, )).rowcount == 0:
+                # Another process got there first.
+                continue
+            removed += 1
+            result = self._pending.pop(uid, None)
+            if state == _ERROR:
+                try:
+                    _log_failure(
+                        Failure(self._serializer.loads(data)), reason)
+                except Exception:
+                    log.err(None, "Could not load stashed result %d:" % uid)
+            elif result is not None:
+                _log_error(result, reason)
+        return removed
+
+    def _serialize(self, deferred_result):
+        """
+        Return the state and serialized data for an EventualResult that has a
+        result.
+        """
+        value = deferred_result._value
+        if isinstance(value, Failure):
+            return _ERROR, self._serializer.dumps(value.value)
+        return _VALUE, self._serializer.dumps(value)
+
+    def _writer(self):
+        """
+        Runs in a thread, writes batches of completed results to the
+        database.
+        """
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.REFRESH_INTERVAL)]
+            except Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            rows = []
+            flushed = []
+            for item in batch:
+                if item is _STOP or isinstance(item, threading.Event):
+                    flushed.append(item)
+                else:
+                    uid, deferred_result = item
+                    try:
+                        state, data = self._serialize(deferred_result)
+                    except Exception:
+                        log.err(
+                            None,
+                            "Could not serialize stashed result %d:" % uid)
+                        state, data = _LOCAL, None
+                    rows.append((uid, deferred_result, state, data))
+            if rows:
+                self._write(rows)
+            self._refresh()
+            for item in flushed:
+                if item is _STOP:
+                    return
+                item.set()
+
+    def _write(self, rows):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                for uid, deferred_result, state, data in rows:
+                    if uid not in self._pending:
+                        # Retrieved or removed in the meantime.
+                        continue
+                    self._db.execute(
+                        "UPDATE crochet_results SET state = ?, data = ? "
+                        "WHERE id = ?", (state, data, uid))
+                    if state == _LOCAL:
+                        # Still only retrievable from this process:
+                        continue
+                    del self._pending[uid]
+                    # The database is now responsible for the result:
+                    deferred_result._result_retrieved = True
+            finally:
+                self._db.execute("COMMIT")
+
+    def _refresh(self):
+        """
+        Remove expired results, and update the count returned by stats().
+        """
+        with self._lock:
+            try:
+                self._expire()
+                self._size = self._count()
+            except sqlite3.Error:
+                log.err(None, "Could not refresh stashed results:")
+
+    def flush(self, timeout=None):
+        """
+        Wait until results that are already available have been written, and
+        stats() has been refreshed.
+        """
+        written = threading.Event()
+        self._queue.put(written)
+        return written.wait(timeout)
+
+    def log_errors(self):
+        """
+        Write results that are already available, and remove the results only
+        this process has: those that don't have a result yet, and those that
+        couldn't be serialized, whose errors are logged.
+
+        Results in the database are left for other processes to retrieve, so
+        their errors aren't logged.
+        """
+        self.flush(5)
+        with self._lock:
+            pending = list(self._pending.items())
+            self._pending.clear()
+            for uid, result in pending:
+                self._db.execute(
+                    "DELETE FROM crochet_results WHERE id = ?", (uid, ))
+                _log_error(result)
+
+    def close(self):
+        """
+        Stop the writer thread, once queued results have been written, and
+        close the database.
+        """
+        self._queue.put(_STOP)
+        self._thread.join()
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,181 @@
+"""
+Per-function call statistics for decorated functions.
+"""
+
+import threading
+import time
+import weakref
+from collections import deque
+
+from twisted.internet.defer import CancelledError
+from twisted.python.failure import Failure
+
+from ._metrics import latency_histogram
+
+
+class _StatsShard(object):
+    """
+    The statistics recorded by a single thread for a single function.
+
+    Only the owning thread writes to it, so no locking is needed.
+    """
+    __slots__ = (
+        "calls", "errors", "timeouts", "cancellations", "submit_to_start",
+        "start_to_fire", "fire_to_wake")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.cancellations = 0
+        self.submit_to_start = latency_histogram()
+        self.start_to_fire = latency_histogram()
+        self.fire_to_wake = latency_histogram()
+
+    def merge(self, other):
+        """
+        Add the statistics recorded in another shard.
+        """
+        for counter in ("calls", "errors", "timeouts", "cancellations"):
+            setattr(self, counter, getattr(self, counter) +
+                    getattr(other, counter))
+        for phase in ("submit_to_start", "start_to_fire", "fire_to_wake"):
+            getattr(self, phase).merge(getattr(other, phase))
+
+
+class _ShardOwner(object):
+    """
+    Kept in a thread's thread-local storage, so it is garbage collected when
+    the thread exits.
+    """
+    __slots__ = ("__weakref__", )
+
+
+class FunctionStats(object):
+    """
+    Statistics for calls to a decorated function.
+
+    Each thread records into its own shard; shards are only combined when a
+    snapshot is taken. When a thread exits its shard is merged into a shard
+    for retired threads, so short-lived threads don't accumulate shards.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._local = threading.local()
+        self._shards = []
+        # Shards of exited threads, not yet merged into the retired shard.
+        # Finalizers can run in any thread at any point, including while
+        # the lock is held, so they only append here:
+        self._exited = deque()
+        self._retired = _StatsShard()
+        self._lock = threading.Lock()
+
+    def shard(self):
+        """
+        Return the current thread's shard, creating it if necessary.
+        """
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = _StatsShard()
+            with self._lock:
+                self._retire()
+                self._shards.append(shard)
+            owner = _ShardOwner()
+            weakref.finalize(owner, self._exited.append, shard).atexit = False
+            self._local.owner = owner
+            self._local.shard = shard
+            return shard
+
+    def _retire(self):
+        """
+        Merge the shards of threads that have exited into the retired shard.
+
+        Must be called with the lock held.
+        """
+        while self._exited:
+            shard = self._exited.popleft()
+            self._shards.remove(shard)
+            self._retired.merge(shard)
+
+    def snapshot(self):
+        """
+        Return a dictionary combining the statistics from all threads.
+        """
+        total = _StatsShard()
+        with self._lock:
+            self._retire()
+            total.merge(self._retired)
+            for shard in self._shards:
+                total.merge(shard)
+        result = {}
+        for counter in ("calls", "errors", "timeouts", "cancellations"):
+            result[counter] = getattr(total, counter)
+        for phase in ("submit_to_start", "start_to_fire", "fire_to_wake"):
+            result[phase] = getattr(total, phase).snapshot()
+        return result
+
+
+class CallTiming(object):
+    """
+    Timestamps for a single call to a decorated function, recording each phase
+    into the FunctionStats as it ends.
+    """
+    __slots__ = ("_stats", "_submitted", "_started", "fired_at", "_timed_out")
+
+    def __init__(self, stats):
+        """
+        Called in the thread submitting the call.
+        """
+        self._stats = stats
+        self._submitted = time.monotonic()
+        self._started = None
+        self.fired_at = None
+        self._timed_out = False
+        stats.shard().calls += 1
+
+    def started(self):
+        """
+        The reactor has started running the call.
+        """
+        self._started = time.monotonic()
+        self._stats.shard().submit_to_start.record(
+            self._started - self._submitted)
+
+    def fired(self, value):
+        """
+        The call's Deferred has fired with value.
+        """
+        if self._started is None:
+            # Never started, e.g. because admission control shed it.
+            return
+        self.fired_at = time.monotonic()
+        shard = self._stats.shard()
+        shard.start_to_fire.record(self.fired_at - self._started)
+        if isinstance(value, Failure):
+            if not value.check(CancelledError):
+                shard.errors += 1
+            elif not self._timed_out:
+                shard.cancellations += 1
+
+    def cancelled(self):
+        """
+        The call was cancelled before the reactor started running it.
+        """
+        self._stats.shard().cancellations += 1
+
+    def timed_out(self):
+        """
+        The call's deadline passed; called before its Deferred is cancelled.
+        """
+        self._timed_out = True
+        self._stats.shard().timeouts += 1
+
+    def woke(self):
+        """
+        A thread waiting for the result was woken up.
+        """
+        if self.fired_at is not None:
+            self._stats.shard().fire_to_wake.record(
+                time.monotonic() - self.fired_at)
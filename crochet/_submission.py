@@ -0,0 +1,127 @@
+"""
+Coalesced submission of calls from other threads to the reactor thread.
+"""
+
+import threading
+import time
+from collections import deque
+
+from twisted.python import log
+
+from ._util import synchronized
+
+
+class SubmissionQueue(object):
+    """
+    A queue of calls to run in the reactor thread.
+
+    reactor.callFromThread() wakes up the reactor for every single call. When
+    many threads submit many small calls this means the reactor spends much of
+    its time being woken up. Instead, calls are appended to this queue, and
+    only one wakeup is scheduled while the queue is non-empty; the reactor
+    then runs queued calls in batches.
+
+    Each call is submitted with a priority, one of PRIORITIES, and each
+    priority has its own lane. A batch holds at most BUDGET calls, so that the
+    reactor gets to handle I/O between batches and a newly submitted high
+    priority call never waits behind more than one batch. When more calls are
+    queued than fit in a batch, the lanes are visited in weighted round-robin
+    order, taking up to WEIGHTS calls from each lane per round, so higher
+    priorities get more of each batch without starving the lower ones.
+
+    If wait_times is set to a Histogram, the time from each wakeup being
+    scheduled until the reactor runs it is recorded there, in seconds. This
+    is how long the oldest call in each batch waited.
+    """
+    PRIORITIES = ("high", "normal", "low")
+    WEIGHTS = (4, 2, 1)
+    BUDGET = 1000
+
+    def __init__(self, reactor):
+        self._reactor = reactor
+        self._lanes = tuple(deque() for _ in self.PRIORITIES)
+        self._lane_by_priority = dict(zip(self.PRIORITIES, self._lanes))
+        self._scheduled = False
+        # When the pending wakeup was scheduled, in time.monotonic() terms:
+        self._woken_at = 0
+        self._lock = threading.Lock()
+        self.wait_times = None
+
+    def __len__(self):
+        """
+        Return the number of calls waiting to be run.
+        """
+        return sum(len(lane) for lane in self._lanes)
+
+    @synchronized
+    def _append(self, lane, call):
+        """
+        Add a call to the given lane.
+
+        Return whether the caller needs to wake up the reactor.
+        """
+        lane.append(call)
+        if self._scheduled:
+            return False
+        self._scheduled = True
+        self._woken_at = time.monotonic()
+        return True
+
+    @synchronized
+    def _take(self):
+        """
+        Remove and return the next batch of calls, highest priority first.
+
+        Return a tuple of (list of calls, whether more calls remain queued,
+        when the current wakeup was scheduled). If more remain, another wakeup
+        is considered to be scheduled already.
+        """
+        woken_at = self._woken_at
+        if len(self) <= self.BUDGET:
+            calls = []
+            for lane in self._lanes:
+                calls.extend(lane)
+                lane.clear()
+            self._scheduled = False
+            return calls, False, woken_at
+        # More calls than fit in one batch, so this loop always fills it:
+        taken = tuple([] for _ in self._lanes)
+        budget = self.BUDGET
+        while budget > 0:
+            for lane, weight, batch in zip(self._lanes, self.WEIGHTS, taken):
+                for _ in range(min(weight, len(lane), budget)):
+                    batch.append(lane.popleft())
+                    budget -= 1
+        return [call for batch in taken for call in batch], True, woken_at
+
+    def submit(self, f, *args, priority="normal"):
+        """
+        Arrange for f(*args) to be called in the reactor thread, with the
+        given priority.
+
+        May be called in any thread.
+        """
+        # The wakeup happens outside the lock, since some reactors (and fake
+        # reactors in tests) may run the drain immediately:
+        if self._append(self._lane_by_priority[priority], (f, args)):
+            self._reactor.callFromThread(self._drain)
+
+    def _drain(self):
+        """
+        Run the next batch of queued calls, scheduling another wakeup if more
+        are waiting.
+
+        Runs in the reactor thread.
+        """
+        calls, more, woken_at = self._take()
+        if self.wait_times is not None:
+            self.wait_times.record(time.monotonic() - woken_at)
+        for f, args in calls:
+            try:
+                f(*args)
+            except Exception:
+                log.err(None, "Unexpected error in call submitted to reactor")
+        if more:
+            # No other thread touches this while a wakeup is scheduled:
+            self._woken_at = time.monotonic()
+            self._reactor.callFromThread(self._drain)
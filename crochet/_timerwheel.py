@@ -0,0 +1,138 @@
+"""
+A timing wheel for tracking large numbers of timeouts in the reactor thread.
+"""
+
+import math
+
+from twisted.python import log
+
+
+class _Timer(object):
+    """
+    A timer added to a TimerWheel.
+
+    Like IDelayedCall, it has active() and cancel() methods.
+    """
+    __slots__ = ("_wheel", "_slot", "_tick", "_f", "_args")
+
+    def __init__(self, wheel, slot, tick, f, args):
+        self._wheel = wheel
+        self._slot = slot
+        self._tick = tick
+        self._f = f
+        self._args = args
+
+    def active(self):
+        """
+        Return whether the timer has neither fired nor been cancelled.
+        """
+        return self._slot is not None
+
+    def cancel(self):
+        """
+        Cancel the timer, if it is still active.
+        """
+        if self._slot is not None:
+            del self._slot[self]
+            self._slot = None
+            self._wheel._removed()
+
+
+class TimerWheel(object):
+    """
+    A hashed timing wheel.
+
+    Scheduling every timeout with reactor.callLater() puts each one in the
+    reactor's heap, which gets expensive with very many pending timeouts.
+    Instead, time is divided into ticks of the given resolution, and each
+    timer is put in one of a fixed number of slots according to the tick in
+    which it expires. Adding and cancelling a timer are O(1). A single
+    reactor.callLater() processes one slot per tick, firing the timers in it
+    that have expired; timers more than one revolution of the wheel away are
+    left for a later visit.
+
+    Timers fire up to one tick late, but never early.
+
+    Should only be used in the reactor thread.
+    """
+
+    def __init__(self, reactor, resolution=0.01, slots=512):
+        self._reactor = reactor
+        self._resolution = resolution
+        self._slots = [{} for _ in range(slots)]
+        # The next tick whose slot needs processing:
+        self._next_tick = 0
+        self._count = 0
+        self._call = None
+
+    def __len__(self):
+        """
+        Return the number of active timers.
+        """
+        return self._count
+
+    def _current_tick(self):
+        return int(math.floor(self._reactor.seconds() / self._resolution))
+
+    def add(self, delay, f, *args):
+        """
+        Call f(*args) once the given number of seconds have passed.
+
+        Returns an object with active() and cancel() methods.
+        """
+        if self._call is None:
+            self._next_tick = self._current_tick() + 1
+            self._schedule()
+        expires = self._reactor.seconds() + delay
+        # Ticks before _next_tick have already been processed:
+        tick = max(int(math.ceil(expires / self._resolution)),
+                   self._next_tick)
+        slot = self._slots[tick % len(self._slots)]
+        timer = _Timer(self, slot, tick, f, args)
+        slot[timer] = None
+        self._count += 1
+        return timer
+
+    def _removed(self):
+        """
+        A timer was cancelled; stop ticking if there are no timers left.
+        """
+        self._count -= 1
+        if self._count == 0 and self._call is not None:
+            self._call.cancel()
+            self._call = None
+
+    def _schedule(self):
+        """
+        Schedule processing of the next tick.
+        """
+        delay = self._next_tick * self._resolution - self._reactor.seconds()
+        self._call = self._reactor.callLater(max(delay, 0), self._advance)
+
+    def _advance(self):
+        """
+        Fire all timers that expired since the last call.
+        """
+        self._call = None
+        # We were scheduled for the start of _next_tick, but floating point
+        # rounding may make the current time appear to be slightly before it:
+        now = max(self._current_tick(), self._next_tick)
+        # No need to visit a slot more than once, even if we're behind:
+        ticks = min(now - self._next_tick + 1, len(self._slots))
+        for tick in range(self._next_tick, self._next_tick + ticks):
+            slot = self._slots[tick % len(self._slots)]
+            expired = [timer for timer in slot if timer._tick <= now]
+            for timer in expired:
+                if timer._slot is None:
+                    # Cancelled by an earlier timer's function.
+                    continue
+                del slot[timer]
+                timer._slot = None
+                self._count -= 1
+                try:
+                    timer._f(*timer._args)
+                except Exception:
+                    log.err(None, "Unexpected error in timer")
+        self._next_tick = now + 1
+        if self._count > 0 and self._call is None:
+            self._schedule()
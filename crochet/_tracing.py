@@ -0,0 +1,249 @@
+"""
+Tracing spans for calls to decorated functions.
+"""
+
+import json
+import random
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from twisted.python import log
+from twisted.python.reflect import qual
+
+# The Span of the traced call or Tracer.span() block code is running in:
+_current_span = ContextVar("crochet_current_span", default=None)
+
+# Spans may be finished by the reactor thread and a waiting thread at the
+# same time, so finishing is done under a lock:
+_finish_lock = threading.Lock()
+
+
+def current_span():
+    """
+    Return the Span of the traced call or Tracer.span() block the caller is
+    running in, or None.
+    """
+    return _current_span.get()
+
+
+def _new_id(bits):
+    """
+    Return a random identifier of the given number of bits, in hex.
+    """
+    return "%0*x" % (bits // 4, random.getrandbits(bits))
+
+
+class Span(object):
+    """
+    A timed operation within a trace.
+
+    Times are in seconds since the epoch, as returned by time.time(). Spans
+    that weren't sampled don't record anything, and are never exported.
+    """
+    __slots__ = (
+        "name", "trace_id", "span_id", "parent_id", "start_time", "end_time",
+        "status", "attributes", "events", "_exporter")
+
+    def __init__(self, name, trace_id, span_id, parent_id, exporter,
+                 attributes=None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.start_time = time.time()
+        self.end_time = None
+        self.status = "ok"
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self._exporter = exporter
+
+    @property
+    def recording(self):
+        """
+        Whether this span was sampled.
+        """
+        return self._exporter is not None
+
+    def set_attribute(self, key, value):
+        """
+        Set an attribute, e.g. an HTTP status code.
+        """
+        if self._exporter is not None:
+            self.attributes[key] = value
+
+    def add_event(self, name):
+        """
+        Record that something happened at the current time.
+        """
+        if self._exporter is not None:
+            self.events.append((name, time.time()))
+
+    def set_error(self, exc_type):
+        """
+        Mark the span as failed with an exception of the given type.
+        """
+        if self._exporter is not None:
+            self.status = "error"
+            self.attributes["error.type"] = qual(exc_type)
+
+    def finish(self, status=None):
+        """
+        End the span, optionally setting its status, and export it.
+
+        Only the first call has any effect.
+        """
+        if self._exporter is None:
+            return
+        with _finish_lock:
+            if self.end_time is not None:
+                return
+            self.end_time = time.time()
+            if status is not None:
+                self.status = status
+        try:
+            self._exporter.export(self)
+        except Exception:
+            log.err(None, "Error exporting tracing span")
+
+    def to_dict(self):
+        """
+        Return a JSON-compatible dictionary describing the span.
+        """
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_time": self.start_time,
+            "end_time": self.end_time,
+            "status": self.status,
+            "attributes": self.attributes,
+            "events": [
+                {"name": name, "time": when} for (name, when) in self.events],
+        }
+
+
+# Shared by all spans in traces that weren't sampled:
+NOT_SAMPLED = Span(None, None, None, None, None)
+
+
+class Tracer(object):
+    """
+    Creates spans, sampling a fraction of traces, and passes finished spans to
+    an exporter.
+
+    An exporter is any object with an export(span) method. It is called in
+    whichever thread finishes the span, often the reactor thread, so it
+    should be quick and thread-safe.
+    """
+
+    def __init__(self, exporter, sample_rate=1.0):
+        """
+        sample_rate is the fraction of traces to record, from 0 to 1. The
+        decision is made when a trace's root span is started, and applies to
+        all of its descendants.
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+
+    def start_span(self, name, parent=None, attributes=None):
+        """
+        Start and return a new Span, a child of parent if given, or else of
+        the current span, if any.
+
+        The span is not made the current span; call its finish() method once
+        the operation it covers is done.
+        """
+        if parent is None:
+            parent = _current_span.get()
+        if parent is None:
+            if random.random() >= self.sample_rate:
+                return NOT_SAMPLED
+            return Span(name, _new_id(128), _new_id(64), None, self.exporter,
+                        attributes)
+        if parent._exporter is None:
+            return NOT_SAMPLED
+        return Span(name, parent.trace_id, _new_id(64), parent.span_id,
+                    self.exporter, attributes)
+
+    @contextmanager
+    def span(self, name, attributes=None):
+        """
+        A context manager that runs its block in a new child of the current
+        span, finishing it when the block exits.
+        """
+        span = self.start_span(name, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_error(type(e))
+            raise
+        finally:
+            _current_span.reset(token)
+            span.finish()
+
+
+class InMemoryExporter(object):
+    """
+    Keeps the most recently finished spans in memory, e.g. for tests.
+    """
+
+    def __init__(self, capacity=10000):
+        self._spans = deque(maxlen=capacity)
+
+    def export(self, span):
+        self._spans.append(span)
+
+    def spans(self):
+        """
+        Return a list of the stored spans, oldest first.
+        """
+        return list(self._spans)
+
+    def clear(self):
+        """
+        Discard the stored spans.
+        """
+        self._spans.clear()
+
+
+class JSONLinesExporter(object):
+    """
+    Writes each finished span to a file as a line of JSON.
+    """
+
+    def __init__(self, file):
+        """
+        file is a path, which is opened for appending, or a file-like object
+        opened in text mode.
+        """
+        if hasattr(file, "write"):
+            self._file = file
+        else:
+            self._file = open(file, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=repr) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        """
+        Flush buffered spans to the file.
+        """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """
+        Close the file.
+        """
+        with self._lock:
+            self._file.close()
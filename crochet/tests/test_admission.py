@@ -0,0 +1,226 @@
+"""
+Tests for crochet._admission.
+"""
+
+import threading
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import Deferred, CancelledError
+from twisted.python import threadable
+
+from .._admission import InFlightLimit, InFlightLimitExceeded
+from .._eventloop import EventualResult
+from .test_setup import FakeReactor
+
+
+class InFlightLimitTests(TestCase):
+    """
+    Tests for InFlightLimit.
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.patch(threadable, "isInIOThread", lambda: False)
+
+    def result(self):
+        """
+        Return a new EventualResult.
+        """
+        return EventualResult(None, self.reactor)
+
+    def test_invalid(self):
+        """
+        The limit must be positive, and the policy a known one.
+        """
+        self.assertRaises(ValueError, InFlightLimit, 0)
+        self.assertRaises(ValueError, InFlightLimit, 1, "wait")
+
+    def test_admit_under_limit(self):
+        """
+        Results are admitted while under the limit.
+        """
+        limit = InFlightLimit(2, "fail")
+        limit.admit(self.result())
+        limit.admit(self.result())
+        self.assertEqual((limit.in_flight, limit.admitted), (2, 2))
+
+    def test_release_on_result(self):
+        """
+        Once an admitted result has a result its slot is freed.
+        """
+        limit = InFlightLimit(1, "fail")
+        result = self.result()
+        limit.admit(result)
+        result._set_result(123)
+        self.assertEqual(limit.in_flight, 0)
+        limit.admit(self.result())
+        self.assertEqual(limit.admitted, 2)
+
+    def test_fail(self):
+        """
+        The "fail" policy raises InFlightLimitExceeded when the limit is
+        reached.
+        """
+        limit = InFlightLimit(1, "fail")
+        limit.admit(self.result())
+        self.assertRaises(InFlightLimitExceeded, limit.admit, self.result())
+        self.assertEqual((limit.in_flight, limit.rejected), (1, 1))
+
+    def test_block(self):
+        """
+        The "block" policy blocks until a slot is freed.
+        """
+        limit = InFlightLimit(1, "block")
+        first = self.result()
+        limit.admit(first)
+        admitted = threading.Event()
+
+        def admit():
+            limit.admit(self.result())
+            admitted.set()
+
+        thread = threading.Thread(target=admit)
+        thread.start()
+        self.assertFalse(admitted.wait(0.1))
+        first._set_result(None)
+        thread.join(5)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual((limit.blocked, limit.admitted), (1, 2))
+
+    def test_block_timeout(self):
+        """
+        The "block" policy raises InFlightLimitExceeded if no slot is freed
+        within the timeout.
+        """
+        limit = InFlightLimit(1, "block")
+        limit.admit(self.result())
+        self.assertRaises(
+            InFlightLimitExceeded, limit.admit, self.result(), 0.01)
+        self.assertEqual((limit.blocked, limit.rejected), (1, 1))
+
+    def test_block_in_reactor_thread(self):
+        """
+        The "block" policy raises InFlightLimitExceeded instead of blocking
+        in the reactor thread.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+        limit = InFlightLimit(1, "block")
+        limit.admit(self.result())
+        self.assertRaises(InFlightLimitExceeded, limit.admit, self.result())
+        self.assertEqual((limit.blocked, limit.rejected), (0, 1))
+
+    def test_shed_oldest(self):
+        """
+        The "shed-oldest" policy gives the oldest in-flight result an
+        InFlightLimitExceeded failure, cancels its Deferred, and admits the new
+        one.
+        """
+        limit = InFlightLimit(2, "shed-oldest")
+        oldest, newer, newest = self.result(), self.result(), self.result()
+        errors = []
+        d = Deferred().addErrback(errors.append)
+        oldest._connect_deferred(d)
+        limit.admit(oldest)
+        limit.admit(newer)
+        limit.admit(newest)
+        self.assertRaises(InFlightLimitExceeded, oldest.wait, 0)
+        self.assertIsInstance(errors[0].value, CancelledError)
+        self.assertFalse(newer._result_set)
+        self.assertEqual((limit.in_flight, limit.shed, limit.admitted),
+                         (2, 1, 3))
+
+    def test_shed_not_started(self):
+        """
+        A result shed before its call was started has no Deferred to cancel.
+        """
+        limit = InFlightLimit(1, "shed-oldest")
+        oldest = self.result()
+        limit.admit(oldest)
+        limit.admit(self.result())
+        self.assertRaises(InFlightLimitExceeded, oldest.wait, 0)
+
+    def test_shed_not_logged(self):
+        """
+        A shed result that is never retrieved is not logged as an unhandled
+        error.
+        """
+        limit = InFlightLimit(1, "shed-oldest")
+        oldest = self.result()
+        limit.admit(oldest)
+        limit.admit(self.result())
+        del oldest
+        self.assertEqual(self.flushLoggedErrors(InFlightLimitExceeded), [])
+
+    def test_admit_many(self):
+        """
+        admit_many() admits a whole batch, or refuses all of it.
+        """
+        limit = InFlightLimit(3, "fail")
+        limit.admit(self.result())
+        self.assertRaises(
+            InFlightLimitExceeded, limit.admit_many,
+            [self.result() for _ in range(3)])
+        self.assertEqual((limit.in_flight, limit.rejected), (1, 1))
+        limit.admit_many([self.result(), self.result()])
+        self.assertEqual((limit.in_flight, limit.admitted), (3, 3))
+
+    def test_admit_many_block(self):
+        """
+        With the "block" policy admit_many() waits until there is room for the
+        whole batch, without taking any slots in the meantime.
+        """
+        limit = InFlightLimit(2, "block")
+        first, second = self.result(), self.result()
+        limit.admit(first)
+        limit.admit(second)
+        admitted = threading.Event()
+
+        def admit():
+            limit.admit_many([self.result(), self.result()])
+            admitted.set()
+
+        thread = threading.Thread(target=admit)
+        thread.start()
+        first._set_result(None)
+        self.assertFalse(admitted.wait(0.1))
+        self.assertEqual(limit.in_flight, 1)
+        second._set_result(None)
+        thread.join(5)
+        self.assertTrue(admitted.is_set())
+        self.assertEqual(limit.in_flight, 2)
+
+    def test_admit_many_too_large(self):
+        """
+        A batch larger than the limit is refused immediately, even with the
+        "block" policy.
+        """
+        limit = InFlightLimit(2, "block")
+        self.assertRaises(
+            InFlightLimitExceeded, limit.admit_many,
+            [self.result() for _ in range(3)])
+        self.assertEqual((limit.in_flight, limit.blocked), (0, 0))
+
+    def test_admit_many_shed(self):
+        """
+        With the "shed-oldest" policy admit_many() sheds as many of the oldest
+        results as needed to make room for the batch.
+        """
+        limit = InFlightLimit(3, "shed-oldest")
+        old = [self.result() for _ in range(3)]
+        for result in old:
+            limit.admit(result)
+        limit.admit_many([self.result(), self.result()])
+        self.assertEqual(
+            [result._result_set for result in old], [True, True, False])
+        self.assertEqual((limit.in_flight, limit.shed), (3, 2))
+
+    def test_already_set(self):
+        """
+        Admitting a result that already has a result doesn't hold on to a
+        slot.
+        """
+        limit = InFlightLimit(1, "fail")
+        result = self.result()
+        result._set_result(None)
+        limit.admit(result)
+        self.assertEqual(limit.in_flight, 0)
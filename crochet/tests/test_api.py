@@ -4,6 +4,8 @@ Tests for the crochet APIs.
 
 from __future__ import absolute_import
 
+import asyncio
+import contextvars
 import threading
 import subprocess
 import time
@@ -18,15 +20,20 @@ from unittest import SkipTest
 from twisted.trial.unittest import TestCase
 from twisted.internet.defer import succeed, Deferred, fail, CancelledError
 from twisted.python.failure import Failure
-from twisted.python import threadable
+from twisted.python import threadable, log
 from twisted.python.runtime import platform
 
+from .. import _eventloop
 from .._eventloop import (
-    EventLoop, EventualResult, TimeoutError, ResultRegistry, ReactorStopped)
+    EventLoop, EventualResult, TimeoutError, ResultRegistry, ReactorStopped,
+    _RegistryShard, _store)
 from .test_setup import FakeReactor
 from .. import (
-    _main, setup as setup_crochet, retrieve_result, _store, no_setup,
-    run_in_reactor, wait_for)
+    _main, setup as setup_crochet, retrieve_result, no_setup,
+    run_in_reactor, wait_for, submit_many, wait_all, wait_any, as_completed,
+    ReactorExecutor, set_in_flight_limit, InFlightLimit, InFlightLimitExceeded,
+    reactor_stats, stats, set_tracer, Tracer, InMemoryExporter, current_span,
+    set_stash_limit, set_result_store, ResultStore)
 from ..tests import crochet_directory
 
 if platform.type == "posix":
@@ -44,11 +51,47 @@ else:
     reapAllProcesses = None
 
 
+class DelayingFakeReactor(FakeReactor):
+    """
+    A FakeReactor whose callFromThread calls are only run when run_calls() is
+    called.
+    """
+
+    def __init__(self):
+        FakeReactor.__init__(self)
+        self.calls = []
+
+    def callFromThread(self, f, *args, **kwargs):
+        self.calls.append((f, args, kwargs))
+
+    def run_calls(self):
+        while self.calls:
+            f, args, kwargs = self.calls.pop(0)
+            f(*args, **kwargs)
+
+
 class ResultRegistryTests(TestCase):
     """
     Tests for ResultRegistry.
     """
 
+    def test_len(self):
+        """
+        The length of the registry is the number of registered results that
+        are still alive, across all shards.
+        """
+        registry = ResultRegistry()
+        results = [EventualResult(None, None) for _ in range(3)]
+        registry.register(results[0])
+        thread = threading.Thread(
+            target=registry.register_many, args=(results[1:], ))
+        thread.start()
+        thread.join()
+        self.assertEqual(len(registry), 3)
+        del results[:]
+        gc.collect()
+        self.assertEqual(len(registry), 0)
+
     def test_stopped_registered(self):
         """
         ResultRegistery.stop() fires registered EventualResult with
@@ -83,6 +126,28 @@ class ResultRegistryTests(TestCase):
         self.assertEqual(er.wait(0.1), 123)
         self.assertEqual(er.wait(0.1), 123)
 
+    def test_register_many(self):
+        """
+        ResultRegistery.register_many() registers all the given
+        EventualResults, so that stop() fires them with ReactorStopped.
+        """
+        registry = ResultRegistry()
+        results = [EventualResult(None, None), EventualResult(None, None)]
+        registry.register_many(results)
+        registry.stop()
+        for er in results:
+            self.assertRaises(ReactorStopped, er.wait, timeout=0)
+
+    def test_stopped_new_registration_many(self):
+        """
+        After ResultRegistery.stop() is called subsequent register_many()
+        calls raise ReactorStopped.
+        """
+        registry = ResultRegistry()
+        registry.stop()
+        self.assertRaises(
+            ReactorStopped, registry.register_many, [EventualResult(None, None)])
+
     def test_weakref(self):
         """
         Registering an EventualResult with a ResultRegistry does not prevent
@@ -98,11 +163,62 @@ class ResultRegistryTests(TestCase):
 
     def test_runs_with_lock(self):
         """
-        All code in ResultRegistry.stop() and register() is protected by a
-        lock.
+        All code in the registry shards' stop(), register() and
+        register_many() is protected by a lock.
+        """
+        self.assertTrue(_RegistryShard.stop.synchronized)
+        self.assertTrue(_RegistryShard.register.synchronized)
+        self.assertTrue(_RegistryShard.register_many.synchronized)
+
+    def test_contains(self):
+        """
+        Registered EventualResults are in the ResultRegistry.
+        """
+        registry = ResultRegistry()
+        er = EventualResult(None, None)
+        self.assertNotIn(er, registry)
+        registry.register(er)
+        self.assertIn(er, registry)
+
+    def test_stopped_registered_other_threads(self):
+        """
+        ResultRegistery.stop() fires EventualResults registered from many
+        different threads.
         """
-        self.assertTrue(ResultRegistry.stop.synchronized)
-        self.assertTrue(ResultRegistry.register.synchronized)
+        registry = ResultRegistry()
+        results = [EventualResult(None, None) for i in range(50)]
+        threads = [
+            threading.Thread(target=registry.register, args=(er, ))
+            for er in results]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        registry.stop()
+        for er in results:
+            self.assertRaises(ReactorStopped, er.wait, timeout=0)
+
+    def test_stopped_new_registration_other_threads(self):
+        """
+        After ResultRegistery.stop() is called, register() calls from any
+        thread raise ReactorStopped.
+        """
+        registry = ResultRegistry()
+        registry.stop()
+        errors = []
+
+        def register():
+            try:
+                registry.register(EventualResult(None, None))
+            except ReactorStopped:
+                errors.append(True)
+
+        threads = [threading.Thread(target=register) for i in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [True] * 50)
 
 
 def append_in_thread(a_list, f, *args, **kwargs):
@@ -257,6 +373,31 @@ class EventualResultTests(TestCase):
         self.assertTrue(cancelled[0])
         self.assertIsInstance(cancelled[1].value, CancelledError)
 
+    def test_cancel_before_start(self):
+        """
+        cancel() of a call the reactor hasn't started yet, because it is
+        queued behind an earlier batch, gives it a CancelledError result and
+        the function is never called.
+        """
+        reactor = DelayingFakeReactor()
+        eventloop = EventLoop(lambda: reactor, lambda f, g: None)
+        eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+        self.patch(eventloop._submissions, "BUDGET", 1)
+        calls = []
+
+        @eventloop.run_in_reactor
+        def func(i):
+            calls.append(i)
+
+        func(1)
+        dr = func(2)
+        dr.cancel()
+        reactor.run_calls()
+        self.assertEqual(calls, [1])
+        self.assertRaises(CancelledError, dr.wait, 0)
+        self.assertEqual(reactor.calls, [])
+
     def test_stash(self):
         """
         EventualResult.stash() stores the object in the global ResultStore.
@@ -265,6 +406,15 @@ class EventualResultTests(TestCase):
         uid = dr.stash()
         self.assertIdentical(dr, _store.retrieve(uid))
 
+    def test_stash_ttl(self):
+        """
+        EventualResult.stash() passes its TTL on to the global ResultStore.
+        """
+        dr = EventualResult(Deferred(), None)
+        uid = dr.stash(ttl=0.000001)
+        time.sleep(0.001)
+        self.assertRaises(KeyError, _store.retrieve, uid)
+
     def test_original_failure(self):
         """
         original_failure() returns the underlying Failure of the Deferred
@@ -334,6 +484,60 @@ class EventualResultTests(TestCase):
         excs = self.flushLoggedErrors(ZeroDivisionError)
         self.assertEqual(len(excs), 1)
 
+    def test_success_after_gc_not_logged(self):
+        """
+        If the result is not an error and occurs after all user references to
+        the EventualResult are lost, nothing is logged.
+        """
+        logged = []
+        log.addObserver(logged.append)
+        self.addCleanup(log.removeObserver, logged.append)
+        d = Deferred()
+        dr = EventualResult(d, None)
+        del dr
+        gc.collect()
+        d.callback(123)
+        self.assertEqual(logged, [])
+
+    def test_slots(self):
+        """
+        EventualResult instances have no __dict__, to keep them small.
+        """
+        dr = EventualResult(None, None)
+        self.assertFalse(hasattr(dr, "__dict__"))
+
+    def test_no_waiters_unless_blocked(self):
+        """
+        No waiters are allocated if the result is available before wait() is
+        called.
+        """
+        dr = EventualResult(succeed(1), None)
+        dr.wait(0.1)
+        self.assertIdentical(dr._waiters, None)
+
+    def test_waiter_removed_on_timeout(self):
+        """
+        If wait() times out, its waiter is removed.
+        """
+        dr = EventualResult(Deferred(), None)
+        self.assertRaises(TimeoutError, dr.wait, 0.01)
+        self.assertEqual(dr._waiters, [])
+
+    def test_multiple_waiting_threads(self):
+        """
+        All threads blocked in wait() are woken up when the result becomes
+        available.
+        """
+        d = Deferred()
+        dr = EventualResult(d, None)
+        result_list = []
+        dones = [append_in_thread(result_list, dr.wait, 100) for i in range(5)]
+        time.sleep(0.1)
+        d.callback(345)
+        for done in dones:
+            done.wait(100)
+        self.assertEqual(result_list, [True, 345] * 5)
+
     def test_control_c_is_possible(self):
         """
         If you're wait()ing on an EventualResult in main thread, make sure the
@@ -526,6 +730,440 @@ EventualResult(Deferred(), None).wait(1.0)
         self.assertRaises(RuntimeError, __import__, "shouldbeunimportable")
 
 
+class AsFutureTests(TestCase):
+    """
+    Tests for EventualResult.as_future().
+    """
+
+    def test_result_available(self):
+        """
+        If the result is already available, the Future already has it.
+        """
+        future = EventualResult(succeed(123), None).as_future()
+        self.assertEqual(future.result(0), 123)
+
+    def test_later_result(self):
+        """
+        The Future gets the result once it is available.
+        """
+        d = Deferred()
+        future = EventualResult(d, None).as_future()
+        self.assertFalse(future.done())
+        d.callback(456)
+        self.assertEqual(future.result(0), 456)
+
+    def test_failure(self):
+        """
+        If the result is an error, the Future's exception is set.
+        """
+        d = Deferred()
+        future = EventualResult(d, None).as_future()
+        d.errback(ZeroDivisionError())
+        self.assertIsInstance(future.exception(0), ZeroDivisionError)
+
+    def test_failure_not_logged(self):
+        """
+        An error result is not logged as unhandled once as_future() has been
+        called, since the Future's user is responsible for it.
+        """
+        dr = EventualResult(fail(ZeroDivisionError()), None)
+        dr.as_future()
+        del dr
+        gc.collect()
+        self.assertEqual(self.flushLoggedErrors(ZeroDivisionError), [])
+
+    def test_cancel(self):
+        """
+        Cancelling the Future cancels the EventualResult.
+        """
+        reactor = FakeReactor()
+        d = Deferred()
+        dr = EventualResult(d, _reactor=reactor)
+        future = dr.as_future()
+        self.assertTrue(future.cancel())
+        self.assertIsInstance(dr.original_failure().value, CancelledError)
+        self.assertTrue(future.cancelled())
+
+    def test_multiple(self):
+        """
+        Multiple Futures can be created for the same EventualResult.
+        """
+        d = Deferred()
+        dr = EventualResult(d, None)
+        futures = [dr.as_future(), dr.as_future()]
+        d.callback(1)
+        self.assertEqual([f.result(0) for f in futures], [1, 1])
+
+
+async def await_result(eventual_result):
+    """
+    Await the EventualResult, returning its result.
+    """
+    return await eventual_result
+
+
+class AwaitTests(TestCase):
+    """
+    Tests for awaiting an EventualResult from an asyncio event loop.
+    """
+
+    def test_result_available(self):
+        """
+        Awaiting an EventualResult that already has a result returns it.
+        """
+        dr = EventualResult(succeed(123), None)
+        self.assertEqual(asyncio.run(await_result(dr)), 123)
+
+    def test_later_result(self):
+        """
+        Awaiting an EventualResult returns its result once it is set from
+        another thread.
+        """
+        d = Deferred()
+        dr = EventualResult(d, None)
+        threading.Timer(0.05, d.callback, (456, )).start()
+        self.assertEqual(asyncio.run(await_result(dr)), 456)
+
+    def test_failure(self):
+        """
+        Awaiting an EventualResult with an error result raises the exception.
+        """
+        d = Deferred()
+        dr = EventualResult(d, None)
+        threading.Timer(0.05, d.errback, (ZeroDivisionError(), )).start()
+        self.assertRaises(
+            ZeroDivisionError, asyncio.run, await_result(dr))
+        del dr
+        gc.collect()
+        self.assertEqual(self.flushLoggedErrors(ZeroDivisionError), [])
+
+    def test_many_no_threads(self):
+        """
+        Many EventualResults can be awaited concurrently without using any
+        additional threads.
+        """
+        deferreds = [Deferred() for i in range(200)]
+        results = [EventualResult(d, None) for d in deferreds]
+        thread_counts = []
+
+        def fire():
+            thread_counts.append(threading.active_count())
+            for i, d in enumerate(deferreds):
+                d.callback(i)
+
+        async def main():
+            threading.Timer(0.05, fire).start()
+            return await asyncio.gather(*[await_result(r) for r in results])
+
+        before = threading.active_count()
+        self.assertEqual(asyncio.run(main()), list(range(200)))
+        # Only the Timer thread was added:
+        self.assertEqual(thread_counts, [before + 1])
+
+    def test_cancel(self):
+        """
+        Cancelling the task awaiting an EventualResult cancels the
+        EventualResult.
+        """
+        reactor = FakeReactor()
+        dr = EventualResult(Deferred(), _reactor=reactor)
+
+        async def main():
+            task = asyncio.ensure_future(await_result(dr))
+            await asyncio.sleep(0)
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                return True
+
+        self.assertTrue(asyncio.run(main()))
+        self.assertIsInstance(dr.original_failure().value, CancelledError)
+        self.assertEqual(dr._waiters, None)
+
+
+class ReactorExecutorTests(TestCase):
+    """
+    Tests for ReactorExecutor.
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.executor = ReactorExecutor(self.eventloop)
+
+    def test_submit(self):
+        """
+        submit() runs the callable in the reactor thread and returns a Future
+        with its result.
+        """
+        calls = []
+
+        def add(a, b):
+            calls.append(self.reactor.in_call_from_thread)
+            return a + b
+
+        future = self.executor.submit(add, 1, b=2)
+        self.assertEqual(future.result(0), 3)
+        self.assertEqual(calls, [True])
+
+    def test_deferred(self):
+        """
+        If the callable returns a Deferred, the Future gets its result.
+        """
+        d = Deferred()
+        future = self.executor.submit(lambda: d)
+        self.assertFalse(future.done())
+        d.callback(5)
+        self.assertEqual(future.result(0), 5)
+
+    def test_coroutine(self):
+        """
+        Async functions, and functions returning coroutines, are supported.
+        """
+        async def double(x):
+            return x * 2
+
+        self.assertEqual(self.executor.submit(double, 2).result(0), 4)
+        self.assertEqual(
+            self.executor.submit(lambda: double(3)).result(0), 6)
+
+    def test_exception(self):
+        """
+        If the callable raises an exception, it is set on the Future.
+        """
+        future = self.executor.submit(lambda: 1 / 0)
+        self.assertIsInstance(future.exception(0), ZeroDivisionError)
+
+    def test_map(self):
+        """
+        The Executor.map() API works.
+        """
+        self.assertEqual(
+            list(self.executor.map(lambda x: x * 2, [1, 2, 3], timeout=1)),
+            [2, 4, 6])
+
+    def test_shutdown(self):
+        """
+        After shutdown(), submit() raises RuntimeError.
+        """
+        self.executor.shutdown()
+        self.assertRaises(RuntimeError, self.executor.submit, lambda: None)
+
+    def test_shutdown_waits(self):
+        """
+        shutdown(wait=True) waits for submitted calls to finish.
+        """
+        d = Deferred()
+        future = self.executor.submit(lambda: d)
+        threading.Timer(0.1, d.callback, (7, )).start()
+        self.executor.shutdown(wait=True)
+        self.assertEqual(future.result(0), 7)
+
+    def test_shutdown_cancel_futures(self):
+        """
+        shutdown(cancel_futures=True) cancels submitted calls.
+        """
+        errors = []
+        d = Deferred().addErrback(errors.append)
+        future = self.executor.submit(lambda: d)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.assertTrue(future.cancelled())
+        self.assertIsInstance(errors[0].value, CancelledError)
+
+    def test_in_flight_limit_shed(self):
+        """
+        Submitting a call that sheds an earlier call because of a
+        "shed-oldest" InFlightLimit doesn't deadlock when the shed call's
+        Future is done.
+        """
+        self.patch(threadable, "isInIOThread", lambda: False)
+        self.eventloop.set_in_flight_limit(InFlightLimit(1, "shed-oldest"))
+        first = self.executor.submit(Deferred)
+        futures = []
+        thread = threading.Thread(
+            target=lambda: futures.append(self.executor.submit(Deferred)),
+            daemon=True)
+        thread.start()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertIsInstance(first.exception(0), InFlightLimitExceeded)
+        self.assertEqual(self.executor._futures, set(futures))
+
+    def test_in_flight_limit_block(self):
+        """
+        While a submit() is blocked by a "block" InFlightLimit the executor
+        isn't locked, and if it is shut down in the meantime the call is
+        cancelled and submit() raises RuntimeError.
+        """
+        self.patch(threadable, "isInIOThread", lambda: False)
+        limit = InFlightLimit(1, "block")
+        self.eventloop.set_in_flight_limit(limit)
+        d = Deferred()
+        self.executor.submit(lambda: d)
+        errors = []
+        cancelled = []
+
+        def submit():
+            try:
+                self.executor.submit(
+                    lambda: Deferred().addErrback(cancelled.append))
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=submit, daemon=True)
+        thread.start()
+        while not limit.blocked:
+            time.sleep(0.001)
+        done = threading.Thread(
+            target=self.executor.shutdown, kwargs={"wait": False},
+            daemon=True)
+        done.start()
+        done.join(5)
+        self.assertFalse(done.is_alive())
+        d.callback(None)
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(cancelled[0].value, CancelledError)
+
+    def test_default_eventloop(self):
+        """
+        By default, the global EventLoop is used.
+        """
+        self.assertIdentical(ReactorExecutor()._eventloop, _main)
+
+
+class MultipleResultsTests(TestCase):
+    """
+    Tests for wait_all(), wait_any() and as_completed().
+    """
+
+    def setUp(self):
+        self.patch(threadable, "isInIOThread", lambda: False)
+
+    def test_wait_all(self):
+        """
+        wait_all() returns the results of all the EventualResults, in order.
+        """
+        d1, d2 = Deferred(), Deferred()
+        results = [
+            EventualResult(d1, None), EventualResult(succeed(2), None),
+            EventualResult(d2, None)]
+        result_list = []
+        done = append_in_thread(result_list, wait_all, results, 100)
+        time.sleep(0.1)
+        d2.callback(3)
+        d1.callback(1)
+        done.wait(100)
+        self.assertEqual(result_list, [True, [1, 2, 3]])
+
+    def test_wait_all_failure(self):
+        """
+        wait_all() raises the exception of the first failed result.
+        """
+        results = [
+            EventualResult(succeed(1), None),
+            EventualResult(fail(ZeroDivisionError()), None),
+            EventualResult(fail(RuntimeError()), None)]
+        self.assertRaises(ZeroDivisionError, wait_all, results, 0.1)
+        # The later error is still available:
+        self.assertRaises(RuntimeError, results[2].wait, 0)
+
+    def test_wait_all_timeout(self):
+        """
+        wait_all() raises TimeoutError if not all results are available in
+        time, and leaves no waiters behind.
+        """
+        results = [
+            EventualResult(succeed(1), None), EventualResult(Deferred(), None)]
+        start = time.time()
+        self.assertRaises(TimeoutError, wait_all, results, 0.05)
+        self.assertTrue(time.time() - start < 1)
+        self.assertEqual(results[1]._waiters, [])
+
+    def test_wait_any(self):
+        """
+        wait_any() returns the first EventualResult to have a result.
+        """
+        d1, d2 = Deferred(), Deferred()
+        results = [EventualResult(d1, None), EventualResult(d2, None)]
+        result_list = []
+        done = append_in_thread(result_list, wait_any, results, 100)
+        time.sleep(0.1)
+        d2.callback(2)
+        done.wait(100)
+        self.assertEqual(result_list, [True, results[1]])
+        self.assertEqual(results[0]._waiters, [])
+
+    def test_wait_any_already_available(self):
+        """
+        wait_any() returns immediately if a result is already available.
+        """
+        results = [
+            EventualResult(Deferred(), None), EventualResult(succeed(1), None)]
+        self.assertIdentical(wait_any(results, 0), results[1])
+        self.assertEqual(results[0]._waiters, [])
+
+    def test_wait_any_timeout(self):
+        """
+        wait_any() raises TimeoutError if no result is available in time.
+        """
+        results = [EventualResult(Deferred(), None)]
+        self.assertRaises(TimeoutError, wait_any, results, 0.01)
+        self.assertEqual(results[0]._waiters, [])
+
+    def test_wait_any_empty(self):
+        """
+        wait_any() requires at least one EventualResult.
+        """
+        self.assertRaises(ValueError, wait_any, [], 0.01)
+
+    def test_as_completed(self):
+        """
+        as_completed() yields already available results first, then others in
+        the order they become available.
+        """
+        d1, d2 = Deferred(), Deferred()
+        results = [
+            EventualResult(d1, None), EventualResult(d2, None),
+            EventualResult(succeed(3), None)]
+        result_list = []
+        done = append_in_thread(
+            result_list, lambda: list(as_completed(results, 100)))
+        time.sleep(0.1)
+        d2.callback(2)
+        time.sleep(0.1)
+        d1.callback(1)
+        done.wait(100)
+        self.assertEqual(
+            result_list, [True, [results[2], results[1], results[0]]])
+
+    def test_as_completed_timeout(self):
+        """
+        as_completed() raises TimeoutError once the timeout passes, having
+        yielded the results that were available.
+        """
+        results = [
+            EventualResult(succeed(1), None), EventualResult(Deferred(), None)]
+        completed = as_completed(results, 0.01)
+        self.assertIdentical(next(completed), results[0])
+        self.assertRaises(TimeoutError, next, completed)
+        self.assertEqual(results[1]._waiters, [])
+
+    def test_reactor_thread_disallowed(self):
+        """
+        wait_all(), wait_any() and as_completed() cannot be called from the
+        reactor thread.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+        results = [EventualResult(Deferred(), None)]
+        self.assertRaises(RuntimeError, wait_all, results, 0)
+        self.assertRaises(RuntimeError, wait_any, results, 0)
+        self.assertRaises(RuntimeError, as_completed, results, 0)
+
+
 class RunInReactorTests(TestCase):
     """
     Tests for the run_in_reactor decorator.
@@ -710,7 +1348,7 @@ class RunInReactorTests(TestCase):
             return
 
         result = run()
-        self.assertIn(result, c._registry._results)
+        self.assertIn(result, c._registry)
 
     def test_wrapped_function(self):
         """
@@ -744,6 +1382,951 @@ class RunInReactorTests(TestCase):
         self.assertEqual(len(calls), 2)
         self.assertFalse(inspect.iscoroutinefunction(go))
 
+    def test_async_classmethod(self):
+        """
+        Async classmethods can be wrapped with @run_in_reactor.
+        """
+        myreactor = FakeReactor()
+        c = EventLoop(lambda: myreactor, lambda f, g: None)
+        c.no_setup()
+
+        class C(object):
+            @c.run_in_reactor
+            @classmethod
+            async def go(cls):
+                return cls
+
+        self.assertIdentical(C.go().wait(0.1), C)
+
+    def test_dispatch_resolved_once(self):
+        """
+        Whether the function is an async function is determined when it is
+        decorated, not on every call.
+        """
+        myreactor = FakeReactor()
+        c = EventLoop(lambda: myreactor, lambda f, g: None)
+        c.no_setup()
+
+        @c.run_in_reactor
+        async def go():
+            return 23
+
+        self.patch(_eventloop, "iscoroutinefunction", lambda f: 1 / 0)
+        self.assertEqual(go().wait(0.1), 23)
+
+
+class RunInReactorTimeoutTests(TestCase):
+    """
+    Tests for @run_in_reactor(timeout=...).
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+
+    def test_timeout_without_waiter(self):
+        """
+        Once the timeout passes, the reactor cancels the underlying Deferred
+        and the EventualResult's result is a TimeoutError, even if nobody has
+        called wait().
+        """
+        error = []
+        d = Deferred().addErrback(error.append)
+
+        @self.eventloop.run_in_reactor(timeout=5)
+        def func():
+            return d
+
+        result = func()
+        self.reactor.advance(4.9)
+        self.assertEqual(error, [])
+        self.reactor.advance(0.1)
+        self.assertIsInstance(error[0].value, CancelledError)
+        self.assertRaises(TimeoutError, result.wait, 0)
+
+    def test_timeout_not_logged(self):
+        """
+        A timed out result that is never retrieved is not logged as an
+        unhandled error.
+        """
+        @self.eventloop.run_in_reactor(timeout=5)
+        def func():
+            return Deferred()
+
+        result = func()
+        self.reactor.advance(5)
+        del result
+        gc.collect()
+        self.assertEqual(self.flushLoggedErrors(TimeoutError), [])
+
+    def test_result_before_timeout(self):
+        """
+        A result that arrives before the timeout is unaffected by it.
+        """
+        d = Deferred()
+
+        @self.eventloop.run_in_reactor(timeout=5)
+        def func():
+            return d
+
+        result = func()
+        d.callback(7)
+        self.reactor.advance(5)
+        self.assertEqual(result.wait(0), 7)
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+
+    def test_inline_timeout(self):
+        """
+        For inline calls from the reactor thread, the returned Deferred is
+        cancelled once the timeout passes.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+
+        @self.eventloop.run_in_reactor(inline=True, timeout=5)
+        def func():
+            return Deferred()
+
+        d = func()
+        self.reactor.advance(5)
+        self.failureResultOf(d)
+
+
+class StatsTests(TestCase):
+    """
+    Tests for per-function statistics, EventLoop.stats().
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+
+    def stats_for(self, function):
+        return self.eventloop.stats()[
+            "%s.%s" % (function.__module__, function.__qualname__)]
+
+    def test_calls(self):
+        """
+        Calls to functions decorated with run_in_reactor and wait_for are
+        counted, with each phase recorded.
+        """
+        @self.eventloop.run_in_reactor
+        def background():
+            return 1
+
+        @self.eventloop.wait_for(timeout=1)
+        def blocking():
+            return 2
+
+        background().wait(1)
+        background()
+        blocking()
+        self.assertEqual(self.stats_for(background)["calls"], 2)
+        self.assertEqual(
+            self.stats_for(background)["start_to_fire"]["count"], 2)
+        self.assertEqual(
+            self.stats_for(blocking)["submit_to_start"]["count"], 1)
+
+    def test_errors(self):
+        """
+        Calls that fail are counted as errors.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            return 1 / 0
+
+        self.assertRaises(ZeroDivisionError, func().wait, 1)
+        self.assertEqual(self.stats_for(func)["errors"], 1)
+
+    def test_cancellations(self):
+        """
+        Cancelled calls are counted.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            return Deferred()
+
+        result = func()
+        result.cancel()
+        self.assertRaises(CancelledError, result.wait, 1)
+        self.assertEqual(self.stats_for(func)["cancellations"], 1)
+
+    def test_cancellations_before_start(self):
+        """
+        Calls cancelled before the reactor started them are counted as
+        cancellations.
+        """
+        reactor = DelayingFakeReactor()
+        eventloop = EventLoop(lambda: reactor, lambda f, g: None)
+        eventloop.no_setup()
+        self.patch(eventloop._submissions, "BUDGET", 1)
+
+        @eventloop.run_in_reactor
+        def func():
+            return 1
+
+        func()
+        result = func()
+        result.cancel()
+        reactor.run_calls()
+        self.assertRaises(CancelledError, result.wait, 0)
+        name = "%s.%s" % (func.__module__, func.__qualname__)
+        snapshot = eventloop.stats()[name]
+        self.assertEqual(
+            (snapshot["calls"], snapshot["cancellations"]), (2, 1))
+
+    def test_timeouts(self):
+        """
+        Calls that time out are counted as timeouts.
+        """
+        @self.eventloop.run_in_reactor(timeout=1)
+        def func():
+            return Deferred()
+
+        result = func()
+        self.reactor.advance(2)
+        self.assertRaises(TimeoutError, result.wait, 1)
+        snapshot = self.stats_for(func)
+        self.assertEqual(
+            (snapshot["timeouts"], snapshot["cancellations"]), (1, 0))
+
+    def test_fire_to_wake(self):
+        """
+        When a thread blocked in wait() is woken up, the time since the result
+        became available is recorded.
+        """
+        d = Deferred()
+
+        @self.eventloop.run_in_reactor
+        def func():
+            return d
+
+        result = func()
+        threading.Timer(0.05, d.callback, [1]).start()
+        self.assertEqual(result.wait(5), 1)
+        # Already available, so nothing more is recorded:
+        result.wait(5)
+        self.assertEqual(self.stats_for(func)["fire_to_wake"]["count"], 1)
+
+    def test_inline_not_counted(self):
+        """
+        Inline calls from the reactor thread aren't counted.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+
+        @self.eventloop.run_in_reactor(inline=True)
+        def func():
+            return 1
+
+        func()
+        self.assertEqual(self.stats_for(func)["calls"], 0)
+
+
+_request_id = contextvars.ContextVar("_request_id", default=None)
+
+
+class ContextPropagationTests(TestCase):
+    """
+    Tests for running calls in the caller's contextvars context.
+    """
+
+    def setUp(self):
+        self.reactor = DelayingFakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+
+    def call_with_request_id(self, f, *args):
+        """
+        Call f(*args) with _request_id set, in a separate context so it is not
+        set when the reactor runs the submitted calls.
+        """
+        def run():
+            _request_id.set("req-1")
+            return f(*args)
+        return contextvars.copy_context().run(run)
+
+    def test_run_in_reactor(self):
+        """
+        Functions decorated with run_in_reactor run in the context of the
+        caller.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            return _request_id.get()
+
+        result = self.call_with_request_id(func)
+        self.reactor.run_calls()
+        self.assertEqual(result.wait(0), "req-1")
+
+    def test_timeout(self):
+        """
+        The context is propagated for calls with a timeout too.
+        """
+        @self.eventloop.run_in_reactor(timeout=10)
+        def func():
+            return _request_id.get()
+
+        result = self.call_with_request_id(func)
+        self.reactor.run_calls()
+        self.assertEqual(result.wait(0), "req-1")
+
+    def test_async(self):
+        """
+        The context is propagated to async functions.
+        """
+        @self.eventloop.run_in_reactor
+        async def func():
+            return _request_id.get()
+
+        result = self.call_with_request_id(func)
+        self.reactor.run_calls()
+        self.assertEqual(result.wait(0), "req-1")
+
+    def test_submit_many(self):
+        """
+        Calls submitted with submit_many() run in the context of the caller.
+        """
+        results = self.call_with_request_id(
+            self.eventloop.submit_many, lambda: _request_id.get(), [(), ()])
+        self.reactor.run_calls()
+        self.assertEqual([r.wait(0) for r in results], ["req-1", "req-1"])
+
+    def test_disabled(self):
+        """
+        With propagate_context=False, the function doesn't see the caller's
+        context.
+        """
+        @self.eventloop.run_in_reactor(propagate_context=False)
+        def func():
+            return _request_id.get()
+
+        result = self.call_with_request_id(func)
+        self.reactor.run_calls()
+        self.assertEqual(result.wait(0), None)
+
+    def test_copy(self):
+        """
+        Changes made by the function don't affect the caller's context, or
+        other calls.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            previous = _request_id.get()
+            _request_id.set("changed")
+            return previous
+
+        first = func()
+        second = func()
+        self.reactor.run_calls()
+        self.assertEqual((first.wait(0), second.wait(0)), (None, None))
+        self.assertEqual(_request_id.get(), None)
+
+
+class TracingTests(TestCase):
+    """
+    Tests for tracing calls, EventLoop.set_tracer().
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+        self.exporter = InMemoryExporter()
+        self.tracer = Tracer(self.exporter)
+        self.eventloop.set_tracer(self.tracer)
+
+    def test_span(self):
+        """
+        Each call gets a span named after the function, recording when the
+        reactor started it and when its result was available.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            return 1
+
+        func()
+        [span] = self.exporter.spans()
+        self.assertEqual(
+            span.name, "%s.%s" % (func.__module__, func.__qualname__))
+        self.assertEqual(
+            [name for (name, _) in span.events], ["started", "fired"])
+        self.assertEqual(span.status, "ok")
+
+    def test_waiter(self):
+        """
+        If a thread is blocked waiting for the result, the span ends once it
+        wakes up.
+        """
+        d = Deferred()
+
+        @self.eventloop.run_in_reactor
+        def func():
+            return d
+
+        result = func()
+        thread = threading.Thread(target=lambda: result.wait(10))
+        thread.start()
+        while result._waiters is None:
+            time.sleep(0.001)
+        d.callback(1)
+        thread.join()
+        [span] = self.exporter.spans()
+        self.assertEqual(span.events[-1][0], "fired")
+        self.assertGreaterEqual(span.end_time, span.events[-1][1])
+
+    def test_status(self):
+        """
+        Failures, timeouts and cancellations are recorded as the span status.
+        """
+        @self.eventloop.run_in_reactor
+        def fails():
+            return 1 / 0
+
+        def hang():
+            return Deferred()
+
+        self.assertRaises(ZeroDivisionError, fails().wait, 0)
+        cancelled = self.eventloop.run_in_reactor(hang)()
+        cancelled.cancel()
+        self.assertRaises(CancelledError, cancelled.wait, 0)
+        self.eventloop.run_in_reactor(timeout=1)(hang)()
+        self.reactor.pump([0.1] * 20)
+        self.assertEqual(
+            [span.status for span in self.exporter.spans()],
+            ["error", "cancelled", "timeout"])
+        self.assertEqual(
+            self.exporter.spans()[0].attributes["error.type"],
+            "builtins.ZeroDivisionError")
+
+    def test_current_span(self):
+        """
+        The call's span is the current span while the function runs, so spans
+        started within it are its children.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            with self.tracer.span("child"):
+                return current_span()
+
+        with self.tracer.span("caller") as caller:
+            child = func().wait(0)
+        self.assertIsNone(current_span())
+        child_span, call_span, caller_span = self.exporter.spans()
+        self.assertIs(child, child_span)
+        self.assertIs(caller, caller_span)
+        self.assertEqual(child.parent_id, call_span.span_id)
+        self.assertEqual(call_span.parent_id, caller.span_id)
+        self.assertEqual(
+            len(set(span.trace_id for span in self.exporter.spans())), 1)
+
+    def test_not_sampled(self):
+        """
+        Calls in traces that aren't sampled aren't recorded, and nor are spans
+        they start.
+        """
+        self.eventloop.set_tracer(Tracer(self.exporter, 0))
+
+        @self.eventloop.run_in_reactor
+        def func():
+            return self.tracer.start_span("child").recording
+
+        self.assertFalse(func().wait(0))
+        self.assertEqual(self.exporter.spans(), [])
+
+    def test_no_tracer(self):
+        """
+        With no tracer set calls aren't traced.
+        """
+        self.eventloop.set_tracer(None)
+
+        @self.eventloop.run_in_reactor
+        def func():
+            return current_span()
+
+        self.assertIsNone(func().wait(0))
+        self.assertEqual(self.exporter.spans(), [])
+
+
+class PriorityTests(TestCase):
+    """
+    Tests for the priority argument to run_in_reactor and wait_for.
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+        self.priorities = []
+        submit = self.eventloop._submissions.submit
+
+        def record(f, *args, priority="normal"):
+            self.priorities.append(priority)
+            submit(f, *args, priority=priority)
+
+        self.patch(self.eventloop._submissions, "submit", record)
+
+    def test_run_in_reactor(self):
+        """
+        The priority given to run_in_reactor is used when submitting calls,
+        with "normal" as the default.
+        """
+        @self.eventloop.run_in_reactor(priority="high")
+        def high():
+            return 1
+
+        @self.eventloop.run_in_reactor
+        def normal():
+            return 2
+
+        self.assertEqual(high().wait(0), 1)
+        self.assertEqual(normal().wait(0), 2)
+        self.assertEqual(self.priorities, ["high", "normal"])
+
+    def test_run_in_reactor_timeout(self):
+        """
+        The priority is also used for calls with a timeout.
+        """
+        @self.eventloop.run_in_reactor(timeout=1, priority="low")
+        def low():
+            return 1
+
+        self.assertEqual(low().wait(0), 1)
+        self.assertEqual(self.priorities, ["low"])
+
+    def test_wait_for(self):
+        """
+        The priority given to wait_for is used when submitting calls.
+        """
+        @self.eventloop.wait_for(timeout=1, priority="low")
+        def low():
+            return 1
+
+        self.assertEqual(low(), 1)
+        self.assertEqual(self.priorities, ["low"])
+
+    def test_invalid(self):
+        """
+        An unknown priority is rejected when decorating.
+        """
+        self.assertRaises(
+            ValueError, self.eventloop.run_in_reactor(priority="urgent"),
+            lambda: None)
+        self.assertRaises(
+            ValueError, self.eventloop.wait_for, 1, priority="urgent")
+
+
+class InFlightLimitTests(TestCase):
+    """
+    Tests for limiting the number of calls in flight via EventLoop.
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+
+    def test_per_function(self):
+        """
+        An InFlightLimit passed to run_in_reactor limits calls of that
+        function.
+        """
+        limit = InFlightLimit(1, "fail")
+        ds = [Deferred(), Deferred()]
+
+        @self.eventloop.run_in_reactor(in_flight_limit=limit)
+        def func():
+            return ds.pop(0)
+
+        @self.eventloop.run_in_reactor
+        def other():
+            return Deferred()
+
+        func()
+        self.assertRaises(InFlightLimitExceeded, func)
+        other()
+        self.assertEqual((limit.in_flight, limit.rejected), (1, 1))
+        # The rejected call was never run:
+        self.assertEqual(len(ds), 1)
+
+    def test_wait_for(self):
+        """
+        An InFlightLimit passed to wait_for limits calls of that function.
+        """
+        limit = InFlightLimit(1, "fail")
+        limit.admit(EventualResult(None, self.reactor))
+
+        @self.eventloop.wait_for(timeout=1, in_flight_limit=limit)
+        def func():
+            return 1
+
+        self.assertRaises(InFlightLimitExceeded, func)
+
+    def test_wait_for_block_timeout(self):
+        """
+        A "block" InFlightLimit passed to wait_for waits at most the timeout
+        for a slot.
+        """
+        limit = InFlightLimit(1, "block")
+        limit.admit(EventualResult(None, self.reactor))
+
+        @self.eventloop.wait_for(timeout=0.01, in_flight_limit=limit)
+        def func():
+            return 1
+
+        self.assertRaises(InFlightLimitExceeded, func)
+        self.assertEqual((limit.blocked, limit.rejected), (1, 1))
+
+    def test_wait_for_block_counts_towards_timeout(self):
+        """
+        Time spent waiting for a slot under a "block" InFlightLimit counts
+        towards a wait_for timeout, rather than the timeout starting again
+        once the call is admitted.
+        """
+        limit = InFlightLimit(1, "block")
+        first = EventualResult(None, self.reactor)
+        limit.admit(first)
+        release = threading.Timer(0.3, first._set_result, (None, ))
+        release.start()
+        self.addCleanup(release.join)
+
+        @self.eventloop.wait_for(timeout=0.5, in_flight_limit=limit)
+        def func():
+            return Deferred()
+
+        start = time.monotonic()
+        self.assertRaises(TimeoutError, func)
+        elapsed = time.monotonic() - start
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertLess(elapsed, 0.75)
+
+    def test_wait_for_block_both_limits(self):
+        """
+        When both the per-function and the global InFlightLimit block, the
+        wait for both together is limited by the wait_for timeout.
+        """
+        limit = InFlightLimit(1, "block")
+        first = EventualResult(None, self.reactor)
+        limit.admit(first)
+        release = threading.Timer(0.3, first._set_result, (None, ))
+        release.start()
+        self.addCleanup(release.join)
+        global_limit = InFlightLimit(1, "block")
+        global_limit.admit(EventualResult(None, self.reactor))
+        self.eventloop.set_in_flight_limit(global_limit)
+
+        @self.eventloop.wait_for(timeout=0.5, in_flight_limit=limit)
+        def func():
+            return Deferred()
+
+        start = time.monotonic()
+        self.assertRaises(InFlightLimitExceeded, func)
+        self.assertLess(time.monotonic() - start, 0.7)
+
+    def test_global(self):
+        """
+        A limit set with set_in_flight_limit() applies to all functions, until
+        it is removed by passing None.
+        """
+        limit = InFlightLimit(1, "fail")
+        self.eventloop.set_in_flight_limit(limit)
+
+        @self.eventloop.run_in_reactor
+        def func():
+            return Deferred()
+
+        @self.eventloop.run_in_reactor
+        def other():
+            return Deferred()
+
+        func()
+        self.assertRaises(InFlightLimitExceeded, other)
+        self.eventloop.set_in_flight_limit(None)
+        other()
+        self.assertEqual(limit.in_flight, 1)
+
+    def test_global_rejection_frees_function_slot(self):
+        """
+        If the global limit refuses a call already admitted by the per-function
+        limit, the per-function slot is freed.
+        """
+        global_limit = InFlightLimit(1, "fail")
+        global_limit.admit(EventualResult(None, self.reactor))
+        self.eventloop.set_in_flight_limit(global_limit)
+        limit = InFlightLimit(1, "fail")
+
+        @self.eventloop.run_in_reactor(in_flight_limit=limit)
+        def func():
+            return Deferred()
+
+        self.assertRaises(InFlightLimitExceeded, func)
+        self.assertEqual((limit.admitted, limit.in_flight), (1, 0))
+
+    def test_shed(self):
+        """
+        With the "shed-oldest" policy the oldest call's result is an
+        InFlightLimitExceeded failure and its Deferred is cancelled.
+        """
+        self.eventloop.set_in_flight_limit(InFlightLimit(1, "shed-oldest"))
+        errors = []
+        d = Deferred().addErrback(errors.append)
+
+        @self.eventloop.run_in_reactor
+        def func(result):
+            return result
+
+        oldest = func(d)
+        func(Deferred())
+        self.assertRaises(InFlightLimitExceeded, oldest.wait, 0)
+        self.assertIsInstance(errors[0].value, CancelledError)
+
+    def test_shed_before_start(self):
+        """
+        If a call's EventualResult already has a result by the time the
+        reactor gets to it, the function isn't called.
+        """
+        calls = []
+        result = EventualResult(None, self.reactor)
+        result._set_result(Failure(InFlightLimitExceeded()))
+        result._result_retrieved = True
+        _eventloop._start(
+            _eventloop._call_function, calls.append, result, (1, ), {})
+        self.assertEqual(calls, [])
+        # Cancellation still works:
+        result.cancel()
+
+    def test_submit_many(self):
+        """
+        The global limit applies to each call submitted with submit_many(); if
+        any is refused none are run, and no slots are left in use.
+        """
+        limit = InFlightLimit(2, "fail")
+        self.eventloop.set_in_flight_limit(limit)
+        calls = []
+        self.assertRaises(
+            InFlightLimitExceeded, self.eventloop.submit_many, calls.append,
+            [(1, ), (2, ), (3, )])
+        self.assertEqual(calls, [])
+        self.assertEqual(limit.in_flight, 0)
+        self.eventloop.submit_many(calls.append, [(1, ), (2, )])
+        self.assertEqual(calls, [1, 2])
+
+    def test_submit_many_larger_than_block_limit(self):
+        """
+        With the "block" policy, a batch larger than the global limit is
+        refused rather than waiting forever for room that can never appear.
+        """
+        limit = InFlightLimit(2, "block")
+        self.eventloop.set_in_flight_limit(limit)
+        calls = []
+        self.assertRaises(
+            InFlightLimitExceeded, self.eventloop.submit_many, calls.append,
+            [(i, ) for i in range(3)])
+        self.assertEqual((calls, limit.in_flight), ([], 0))
+
+    def test_inline_not_limited(self):
+        """
+        Inline calls from the reactor thread are not limited.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+        limit = InFlightLimit(1, "fail")
+        limit.admit(EventualResult(None, self.reactor))
+
+        @self.eventloop.run_in_reactor(inline=True, in_flight_limit=limit)
+        def func():
+            return 1
+
+        self.assertEqual(self.successResultOf(func()), 1)
+
+
+class InlineRunInReactorTests(TestCase):
+    """
+    Tests for @run_in_reactor(inline=True).
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+
+    def test_reactor_thread_runs_immediately(self):
+        """
+        When called from the reactor thread, the wrapped function is called
+        immediately, without going through callFromThread(), and a Deferred
+        with its result is returned.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+        calls = []
+
+        @self.eventloop.run_in_reactor(inline=True)
+        def func(a, b):
+            calls.append(self.reactor.in_call_from_thread)
+            return a + b
+
+        d = func(1, b=2)
+        self.assertIsInstance(d, Deferred)
+        self.assertEqual(self.successResultOf(d), 3)
+        self.assertEqual(calls, [False])
+
+    def test_reactor_thread_exception(self):
+        """
+        When called from the reactor thread, exceptions raised by the wrapped
+        function result in a failed Deferred.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+
+        @self.eventloop.run_in_reactor(inline=True)
+        def raiser():
+            1 / 0
+
+        self.failureResultOf(raiser(), ZeroDivisionError)
+
+    def test_reactor_thread_async(self):
+        """
+        Async functions are supported when called from the reactor thread.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+
+        @self.eventloop.run_in_reactor(inline=True)
+        async def go():
+            return 17
+
+        self.assertEqual(self.successResultOf(go()), 17)
+
+    def test_other_thread(self):
+        """
+        When called from another thread, the wrapped function runs in the
+        reactor thread and an EventualResult is returned.
+        """
+        self.patch(threadable, "isInIOThread", lambda: False)
+        calls = []
+
+        @self.eventloop.run_in_reactor(inline=True)
+        def func():
+            calls.append(self.reactor.in_call_from_thread)
+            return 4
+
+        result = func()
+        self.assertIsInstance(result, EventualResult)
+        self.assertEqual(result.wait(0.1), 4)
+        self.assertEqual(calls, [True])
+
+    def test_not_inline_by_default(self):
+        """
+        Without inline=True, calls from the reactor thread still go through
+        callFromThread() and return an EventualResult.
+        """
+        self.patch(threadable, "isInIOThread", lambda: True)
+        calls = []
+
+        @self.eventloop.run_in_reactor()
+        def func():
+            calls.append(self.reactor.in_call_from_thread)
+
+        self.assertIsInstance(func(), EventualResult)
+        self.assertEqual(calls, [True])
+
+    def test_signature(self):
+        """
+        The decorated function has the same name and signature as the
+        original function.
+        """
+        def some_name(arg1, arg2, karg1=2, *args, **kw):
+            pass
+        decorated = self.eventloop.run_in_reactor(inline=True)(some_name)
+        self.assertEqual(decorated.__name__, "some_name")
+        self.assertEqual(inspect.signature(some_name),
+                         inspect.signature(decorated))
+
+
+class SubmitManyTests(TestCase):
+    """
+    Tests for EventLoop.submit_many().
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+
+    def test_results_in_order(self):
+        """
+        submit_many() calls the function in the reactor thread once per tuple
+        of arguments, and returns a list of EventualResults with the
+        corresponding results.
+        """
+        calls = []
+
+        def add(a, b):
+            calls.append(self.reactor.in_call_from_thread)
+            return a + b
+
+        results = self.eventloop.submit_many(add, [(1, 2), (3, 4), (5, 6)])
+        self.assertEqual([r.wait(0.1) for r in results], [3, 7, 11])
+        self.assertEqual(calls, [True, True, True])
+
+    def test_single_submission(self):
+        """
+        submit_many() hands over the whole batch to the reactor in one call.
+        """
+        submissions = []
+        self.patch(
+            self.eventloop._submissions, "submit",
+            lambda *args: submissions.append(args))
+        self.eventloop.submit_many(lambda x: x, [(1, ), (2, ), (3, )])
+        self.assertEqual(len(submissions), 1)
+
+    def test_errors(self):
+        """
+        A failure of one call only affects the corresponding EventualResult.
+        """
+        results = self.eventloop.submit_many(
+            lambda x: 1 / x, [(1, ), (0, ), (2, )])
+        self.assertEqual(results[0].wait(0.1), 1)
+        self.assertRaises(ZeroDivisionError, results[1].wait, 0.1)
+        self.assertEqual(results[2].wait(0.1), 0.5)
+
+    def test_deferreds(self):
+        """
+        If the function returns a Deferred, the EventualResult is hooked up to
+        it.
+        """
+        d = Deferred()
+        results = self.eventloop.submit_many(lambda x: x, [(d, )])
+        self.assertRaises(TimeoutError, results[0].wait, 0)
+        d.callback(17)
+        self.assertEqual(results[0].wait(0.1), 17)
+
+    def test_async_function(self):
+        """
+        Async functions can be passed to submit_many().
+        """
+        async def double(x):
+            return x * 2
+
+        results = self.eventloop.submit_many(double, [(1, ), (2, )])
+        self.assertEqual([r.wait(0.1) for r in results], [2, 4])
+
+    def test_registry(self):
+        """
+        submit_many() registers the EventualResults in the ResultRegistry.
+        """
+        results = self.eventloop.submit_many(lambda: None, [(), ()])
+        for result in results:
+            self.assertIn(result, self.eventloop._registry)
+
+    def test_empty(self):
+        """
+        submit_many() with no arguments returns an empty list.
+        """
+        self.assertEqual(self.eventloop.submit_many(lambda: None, []), [])
+
 
 class WaitTests(TestCase):
     """
@@ -1003,20 +2586,55 @@ except crochet.ReactorStopped:
 
     def test_timeoutCancels(self):
         """
-        If a function wrapped with wait_for hits the timeout, it cancels
-        the underlying Deferred.
+        If a function wrapped with wait_for hits the timeout, the reactor
+        cancels the underlying Deferred.
         """
         result = Deferred()
         error = []
         result.addErrback(error.append)
 
-        @self.eventloop.wait_for(timeout=0.0)
+        @self.eventloop.wait_for(timeout=0.01)
         def times_out():
             return result
 
         self.assertRaises(TimeoutError, times_out)
+        self.reactor.advance(0.01)
         self.assertIsInstance(error[0].value, CancelledError)
 
+    def test_timeoutBeforeStart(self):
+        """
+        If the timeout has already passed by the time the reactor gets to a
+        call, the function is not called at all.
+        """
+        calls = []
+
+        @self.eventloop.wait_for(timeout=0.0)
+        def times_out():
+            calls.append(1)
+
+        self.assertRaises(TimeoutError, times_out)
+        self.assertEqual(calls, [])
+
+    def test_timerCancelledOnResult(self):
+        """
+        Once a result is available, the reactor-side timeout is cancelled.
+        """
+        d = Deferred()
+        self.reactor.callLater(1, d.callback, 3)
+
+        @self.eventloop.wait_for(timeout=10)
+        def func():
+            return d
+
+        result = []
+        done = append_in_thread(result, func)
+        time.sleep(0.1)
+        self.assertEqual(len(self.reactor.getDelayedCalls()), 2)
+        self.reactor.advance(1)
+        done.wait(10)
+        self.assertEqual(result, [True, 3])
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+
     def test_async_function(self):
         """
         Async functions can be wrapped with @wait_for.
@@ -1029,6 +2647,22 @@ except crochet.ReactorStopped:
         self.assertEqual((go(), go()), (17, 17))
         self.assertFalse(inspect.iscoroutinefunction(go))
 
+    def test_dispatch_resolved_once(self):
+        """
+        Whether the function is an async function is determined when it is
+        decorated, not on every call.
+        """
+        @self.eventloop.wait_for(timeout=0.1)
+        async def go():
+            return 17
+
+        @self.eventloop.wait_for(timeout=0.1)
+        def go2():
+            return 18
+
+        self.patch(_eventloop, "iscoroutinefunction", lambda f: 1 / 0)
+        self.assertEqual((go(), go2()), (17, 18))
+
 
 class PublicAPITests(TestCase):
     """
@@ -1053,16 +2687,21 @@ class PublicAPITests(TestCase):
         An EventLoop object configured with the real reactor and
         _shutdown.register is exposed via its public methods.
         """
-        from twisted.python.log import startLoggingWithObserver
+        from twisted.logger import globalLogBeginner
         from crochet import _shutdown
         self.assertIsInstance(_main, EventLoop)
         self.assertEqual(_main.setup, setup_crochet)
         self.assertEqual(_main.no_setup, no_setup)
         self.assertEqual(_main.run_in_reactor, run_in_reactor)
         self.assertEqual(_main.wait_for, wait_for)
+        self.assertEqual(_main.submit_many, submit_many)
+        self.assertEqual(_main.set_in_flight_limit, set_in_flight_limit)
+        self.assertEqual(_main.reactor_stats, reactor_stats)
+        self.assertEqual(_main.stats, stats)
+        self.assertEqual(_main.set_tracer, set_tracer)
         self.assertIdentical(_main._atexit_register, _shutdown.register)
-        self.assertIdentical(
-            _main._startLoggingWithObserver, startLoggingWithObserver)
+        self.assertEqual(
+            _main._beginLoggingTo, globalLogBeginner.beginLoggingTo)
         self.assertIdentical(_main._watchdog_thread, _shutdown._watchdog)
 
     def test_eventloop_api_reactor(self):
@@ -1082,6 +2721,48 @@ class PublicAPITests(TestCase):
         uid = dr.stash()
         self.assertIdentical(dr, retrieve_result(uid))
 
+    def test_set_stash_limit(self):
+        """
+        set_stash_limit() configures the global ResultStore.
+        """
+        self.addCleanup(set_stash_limit)
+        set_stash_limit(10, 60)
+        self.assertEqual((_store.max_size, _store.ttl), (10, 60))
+
+    def test_set_result_store(self):
+        """
+        set_result_store() replaces the store used by stash() and
+        retrieve_result().
+        """
+        store = ResultStore()
+        set_result_store(store)
+        self.addCleanup(set_result_store, _store)
+        dr = EventualResult(Deferred(), None)
+        uid = dr.stash()
+        self.assertEqual(len(store), 1)
+        self.assertIdentical(dr, retrieve_result(uid))
+        self.assertEqual(len(store), 0)
+
+    def test_sqlite_optional(self):
+        """
+        crochet can be imported without the sqlite3 module, which is only
+        imported once SQLiteResultStore is used.
+        """
+        program = """\
+import sys
+sys.modules["sqlite3"] = None
+import crochet
+from crochet import *
+assert "crochet._sqlitestore" not in sys.modules
+try:
+    crochet.SQLiteResultStore
+except ImportError:
+    print("ok")
+"""
+        output = subprocess.check_output(
+            [sys.executable, "-c", program], cwd=crochet_directory)
+        self.assertEqual(output.strip(), b"ok")
+
     def test_reapAllProcesses(self):
         """
         An EventLoop object configured with the real reapAllProcesses on POSIX
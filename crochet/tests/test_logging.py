@@ -3,11 +3,13 @@
 from __future__ import absolute_import
 
 from twisted.trial.unittest import SynchronousTestCase
+import logging
 import threading
 
 from twisted.python import threadable
+from twisted.logger import LogLevel, STDLibLogObserver
 
-from .._eventloop import ThreadLogObserver
+from .._eventloop import ThreadLogObserver, _log_level
 
 
 class ThreadLogObserverTest(SynchronousTestCase):
@@ -49,6 +51,23 @@ class ThreadLogObserverTest(SynchronousTestCase):
         threadLog._thread.join()
         self.assertEqual(messages, [(ident, msg1), (ident, msg2)])
 
+    def test_len(self):
+        """
+        The length of a ThreadLogObserver is the number of messages waiting to
+        be written.
+        """
+        blocker = threading.Event()
+        threadLog = ThreadLogObserver(lambda msg: blocker.wait(5))
+        threadLog({"m": "1"})
+        threadLog({"m": "2"})
+        threadLog({"m": "3"})
+        # The first may or may not have been picked up by the thread yet:
+        self.assertIn(len(threadLog), (2, 3))
+        blocker.set()
+        threadLog.stop()
+        threadLog._thread.join()
+        self.assertEqual(len(threadLog), 0)
+
     def test_errors(self):
         """
         ThreadLogObserver.emit catches and silently drops exceptions from its
@@ -88,3 +107,217 @@ class ThreadLogObserverTest(SynchronousTestCase):
             # Either reactor was never run, or run in thread running
             # the tests:
             (None, threading.current_thread().ident))
+
+
+class BoundedThreadLogObserverTest(SynchronousTestCase):
+    """
+    Tests for ThreadLogObserver's batching and queue limit.
+    """
+
+    def blocked_observer(self, **kwargs):
+        """
+        Return a ThreadLogObserver, and the list of messages it wrote, whose
+        thread is blocked writing a first message until the returned Event is
+        set.
+        """
+        messages = []
+        writing = threading.Event()
+        unblock = threading.Event()
+
+        def observer(msg):
+            writing.set()
+            unblock.wait(5)
+            messages.append(msg)
+
+        threadLog = ThreadLogObserver(observer, **kwargs)
+        threadLog({"m": "first"})
+        writing.wait(5)
+        return threadLog, messages, unblock
+
+    def finish(self, threadLog, unblock):
+        unblock.set()
+        threadLog.stop()
+        threadLog._thread.join()
+
+    def test_batch(self):
+        """
+        Messages queued while the thread is busy are all taken from the queue,
+        and written, in one batch.
+        """
+        threadLog, messages, unblock = self.blocked_observer()
+        for i in range(3):
+            threadLog({"m": i})
+        self.assertEqual(len(threadLog), 4)
+        unblock.set()
+        while threadLog._queue or len(messages) < 2:
+            threading.Event().wait(0.001)
+        self.assertEqual(len(threadLog._queue), 0)
+        self.finish(threadLog, unblock)
+        self.assertEqual(
+            [msg["m"] for msg in messages], ["first", 0, 1, 2])
+        self.assertEqual(len(threadLog), 0)
+
+    def test_drop_newest(self):
+        """
+        With the "drop-newest" policy, messages arriving when the queue is
+        full are dropped, and a summary is written once it has been emptied.
+        """
+        threadLog, messages, unblock = self.blocked_observer(limit=2)
+        for i in range(4):
+            threadLog({"m": i})
+        self.assertEqual(threadLog.dropped, 2)
+        self.finish(threadLog, unblock)
+        self.assertEqual(
+            [msg.get("m") for msg in messages], ["first", 0, 1, None])
+        summary = messages[-1]
+        self.assertEqual(
+            (summary["dropped"], summary["log_level"]), (2, LogLevel.warn))
+        self.assertIn("Dropped {dropped} log messages", summary["log_format"])
+
+    def test_drop_oldest(self):
+        """
+        With the "drop-oldest" policy, the oldest queued message is dropped to
+        make room for new messages.
+        """
+        threadLog, messages, unblock = self.blocked_observer(
+            limit=2, policy="drop-oldest")
+        for i in range(4):
+            threadLog({"m": i})
+        self.assertEqual(threadLog.dropped, 2)
+        self.finish(threadLog, unblock)
+        self.assertEqual(
+            [msg.get("m") for msg in messages], ["first", 2, 3, None])
+
+    def test_drop_by_level(self):
+        """
+        With the "drop-by-level" policy, messages below the given level are
+        dropped when the queue is full, while more important messages make
+        room by dropping the oldest queued message.
+        """
+        threadLog, messages, unblock = self.blocked_observer(
+            limit=2, policy="drop-by-level", level=logging.WARNING)
+        threadLog({"m": "info1"})
+        threadLog({"m": "info2"})
+        threadLog({"m": "error", "log_level": LogLevel.error})
+        threadLog({"m": "info3"})
+        threadLog({"m": "warning", "log_level": LogLevel.warn})
+        self.assertEqual(threadLog.dropped, 3)
+        self.finish(threadLog, unblock)
+        self.assertEqual(
+            [msg.get("m") for msg in messages],
+            ["first", "error", "warning", None])
+
+    def test_drop_by_level_keeps_important(self):
+        """
+        With the "drop-by-level" policy, messages at or above the level only
+        make room by dropping messages below it; if there are none, the new
+        message is dropped instead.
+        """
+        threadLog, messages, unblock = self.blocked_observer(
+            limit=3, policy="drop-by-level", level=logging.ERROR)
+        threadLog({"m": "critical", "log_level": LogLevel.critical})
+        for i in range(5):
+            threadLog({"m": "warn%d" % (i, ), "log_level": LogLevel.warn})
+        threadLog({"m": "error", "log_level": LogLevel.error})
+        threadLog({"m": "error2", "log_level": LogLevel.error})
+        self.assertEqual(threadLog.dropped, 5)
+        self.finish(threadLog, unblock)
+        self.assertEqual(
+            [msg.get("m") for msg in messages],
+            ["first", "critical", "error", "error2", None])
+
+    def test_summary_interval(self):
+        """
+        While messages keep being dropped, a summary is written at most every
+        SUMMARY_INTERVAL seconds even if the queue never empties.
+        """
+        threadLog, messages, unblock = self.blocked_observer(limit=1)
+        threadLog.SUMMARY_INTERVAL = 0
+        threadLog({"m": 0})
+        threadLog({"m": 1})
+        # Make sure the queue isn't empty when the first batch is done:
+        threadLog._queue.append({"m": 2})
+        self.finish(threadLog, unblock)
+        self.assertEqual(
+            [msg.get("m", "summary") for msg in messages],
+            ["first", "summary", 0, 2])
+
+    def test_invalid(self):
+        """
+        The limit must be at least 1, and the policy one of POLICIES.
+        """
+        self.assertRaises(ValueError, ThreadLogObserver, None, limit=0)
+        self.assertRaises(
+            ValueError, ThreadLogObserver, None, policy="drop-everything")
+
+
+class LevelFilteringTest(SynchronousTestCase):
+    """
+    Tests for ThreadLogObserver's filtering of messages by level.
+    """
+
+    def test_log_level(self):
+        """
+        _log_level() returns the logging level STDLibLogObserver will use for
+        an event.
+        """
+        self.assertEqual(
+            _log_level({"log_level": LogLevel.warn}), logging.WARNING)
+        self.assertEqual(
+            _log_level({"log_level": LogLevel.debug}), logging.DEBUG)
+        self.assertEqual(_log_level({}), logging.INFO)
+
+    def test_filtering(self):
+        """
+        Messages below the logger's effective level are never queued, and
+        changes to the level take effect immediately.
+        """
+        logger = logging.getLogger("crochet.tests.test_logging.filtering")
+        self.addCleanup(logger.setLevel, logging.NOTSET)
+        logger.setLevel(logging.ERROR)
+        messages = []
+        threadLog = ThreadLogObserver(messages.append, logger=logger)
+        threadLog({"m": "info", "log_level": LogLevel.info})
+        self.assertEqual(len(threadLog), 0)
+        threadLog({"m": "error", "log_level": LogLevel.error})
+        logger.setLevel(logging.INFO)
+        threadLog({"m": "info2", "log_level": LogLevel.info})
+        threadLog.stop()
+        threadLog._thread.join()
+        self.assertEqual([msg["m"] for msg in messages], ["error", "info2"])
+        self.assertEqual(threadLog.dropped, 0)
+
+    def test_lazy_formatting(self):
+        """
+        When wrapping a STDLibLogObserver, events are only formatted in the
+        writer thread, and only if a handler emits them.
+        """
+        logger = logging.getLogger("crochet.tests.test_logging.lazy")
+        self.addCleanup(logger.setLevel, logging.NOTSET)
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        self.addCleanup(setattr, logger, "propagate", True)
+        handler = logging.Handler(logging.WARNING)
+        records = []
+        handler.emit = lambda record: records.append(record.getMessage())
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+
+        formatted = []
+
+        class Value(object):
+            def __format__(self, spec):
+                formatted.append(threading.current_thread().ident)
+                return "value"
+
+        threadLog = ThreadLogObserver(
+            STDLibLogObserver(logger.name), logger=logger)
+        threadLog({"log_format": "info {v}", "v": Value(),
+                   "log_level": LogLevel.info})
+        threadLog({"log_format": "warning {v}", "v": Value(),
+                   "log_level": LogLevel.warn})
+        self.assertEqual(formatted, [])
+        threadLog.stop()
+        threadLog._thread.join()
+        self.assertEqual(records, ["warning value"])
+        self.assertEqual(formatted, [threadLog._thread.ident])
@@ -0,0 +1,81 @@
+"""
+Tests for crochet._metrics.
+"""
+
+from twisted.trial.unittest import TestCase
+
+from .._metrics import Histogram, exponential_bounds
+
+
+class ExponentialBoundsTests(TestCase):
+    """
+    Tests for exponential_bounds().
+    """
+
+    def test_bounds(self):
+        """
+        Each bound is the previous one multiplied by the factor.
+        """
+        self.assertEqual(exponential_bounds(1, 2, 4), [1, 2, 4, 8])
+
+
+class HistogramTests(TestCase):
+    """
+    Tests for Histogram.
+    """
+
+    def test_empty(self):
+        """
+        An empty histogram has zero count, mean and percentiles.
+        """
+        snapshot = Histogram([1, 2]).snapshot()
+        self.assertEqual(
+            (snapshot["count"], snapshot["mean"], snapshot["p99"]), (0, 0, 0))
+
+    def test_buckets(self):
+        """
+        Values are counted in the first bucket whose upper bound they don't
+        exceed, with larger values going in an overflow bucket.
+        """
+        histogram = Histogram([1, 2, 4])
+        for value in [0.5, 1, 1.5, 3, 4, 10]:
+            histogram.record(value)
+        self.assertEqual(
+            histogram.snapshot()["buckets"],
+            [(1, 2), (2, 1), (4, 2), (float("inf"), 1)])
+
+    def test_summary(self):
+        """
+        The snapshot includes the count, sum, mean and maximum.
+        """
+        histogram = Histogram([1, 2, 4])
+        for value in [1, 2, 3]:
+            histogram.record(value)
+        snapshot = histogram.snapshot()
+        self.assertEqual(
+            (snapshot["count"], snapshot["sum"], snapshot["mean"],
+             snapshot["max"]),
+            (3, 6, 2, 3))
+
+    def test_percentile(self):
+        """
+        Percentiles are the upper bound of the bucket they fall in, but no
+        more than the maximum.
+        """
+        histogram = Histogram([1, 2, 4, 8])
+        for _ in range(90):
+            histogram.record(0.5)
+        for _ in range(10):
+            histogram.record(5)
+        self.assertEqual(histogram.percentile(0.5), 1)
+        self.assertEqual(histogram.percentile(0.9), 1)
+        self.assertEqual(histogram.percentile(0.95), 5)
+
+    def test_percentile_overflow(self):
+        """
+        A percentile in the overflow bucket is the maximum value.
+        """
+        histogram = Histogram([1])
+        histogram.record(0.5)
+        histogram.record(30)
+        self.assertEqual(histogram.percentile(0.99), 30)
@@ -0,0 +1,68 @@
+"""
+Tests for crochet._monitor.
+"""
+
+from twisted.trial.unittest import TestCase
+
+from .._monitor import ReactorMonitor
+from .._submission import SubmissionQueue
+from .test_setup import FakeReactor
+
+
+class ReactorMonitorTests(TestCase):
+    """
+    Tests for ReactorMonitor.
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.submissions = SubmissionQueue(self.reactor)
+        self.monitor = ReactorMonitor(
+            self.reactor, self.submissions, interval=0.1)
+        self.monitor.start()
+
+    def test_periodic(self):
+        """
+        A sample is taken every interval.
+        """
+        self.reactor.pump([0.1] * 5)
+        self.assertEqual(self.monitor.loop_lag.count, 5)
+        self.assertEqual(self.monitor.loop_lag.max, 0)
+
+    def test_loop_lag(self):
+        """
+        If the reactor fires the timer late, the delay is recorded as loop
+        lag.
+        """
+        self.reactor.advance(0.35)
+        self.assertEqual(self.monitor.loop_lag.count, 1)
+        self.assertAlmostEqual(self.monitor.loop_lag.max, 0.25)
+
+    def test_queue_depth(self):
+        """
+        The lengths of Crochet's submission queue and the reactor's
+        callFromThread() queue are sampled.
+        """
+        self.reactor.threadCallQueue = [object()] * 3
+        self.patch(SubmissionQueue, "__len__", lambda self: 7)
+        self.reactor.advance(0.1)
+        self.assertEqual(self.monitor.queue_depth.max, 7)
+        self.assertEqual(self.monitor.reactor_queue_depth.max, 3)
+
+    def test_queue_wait(self):
+        """
+        Once started, the monitor records how long submissions wait.
+        """
+        self.submissions.submit(lambda: None)
+        self.assertEqual(self.monitor.queue_wait.count, 1)
+
+    def test_stats(self):
+        """
+        stats() returns snapshots of all the histograms.
+        """
+        self.reactor.advance(0.1)
+        stats = self.monitor.stats()
+        self.assertEqual(
+            sorted(stats),
+            ["loop_lag", "queue_depth", "queue_wait", "reactor_queue_depth"])
+        self.assertEqual(stats["loop_lag"]["count"], 1)
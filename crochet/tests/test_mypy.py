@@ -277,6 +277,115 @@ class MypyTests(TestCase):
             with self.subTest(result_type=result_type):
                 _assert_mypy(good, template.format(result_type=result_type))
 
+    def test_run_in_reactor_inline(self) -> None:
+        """
+        @run_in_reactor can be called with an inline keyword argument.
+        """
+        _assert_mypy(
+            True,
+            dedent(
+                """\
+                from crochet import run_in_reactor
+
+                @run_in_reactor(inline=True)
+                def foo(x: int) -> int:
+                    return x
+                """
+            ),
+        )
+        _assert_mypy(
+            False,
+            dedent(
+                """\
+                from crochet import run_in_reactor
+
+                @run_in_reactor(inline="yes")
+                def foo(x: int) -> int:
+                    return x
+                """
+            ),
+        )
+
+    def test_run_in_reactor_keywords_typed_eventual(self) -> None:
+        """
+        When called with keyword arguments, run_in_reactor still preserves the
+        decorated function's return type through an EventualResult, unless
+        inline is true.
+        """
+        template = dedent(
+            """\
+            from crochet import EventualResult, run_in_reactor
+
+            @run_in_reactor({kwargs})
+            def foo() -> int:
+                return 1
+
+            final_result: str = foo().wait(1)
+            """
+        )
+        for kwargs, good in (
+            ("timeout=5.0", False),
+            ("inline=False, priority='high'", False),
+            ("inline=True", True),
+        ):
+            with self.subTest(kwargs=kwargs):
+                _assert_mypy(good, template.format(kwargs=kwargs))
+        _assert_mypy(
+            True,
+            dedent(
+                """\
+                from crochet import EventualResult, run_in_reactor
+
+                @run_in_reactor(timeout=5.0)
+                def foo() -> int:
+                    return 1
+
+                result: EventualResult[int] = foo()
+                final_result: int = result.wait(1)
+
+                def bar(inline: bool) -> None:
+                    run_in_reactor(inline=inline)(foo)
+                """
+            ),
+        )
+
+    def test_in_flight_limit(self) -> None:
+        """
+        @run_in_reactor and @wait_for accept an InFlightLimit, which can also be
+        set globally.
+        """
+        _assert_mypy(
+            True,
+            dedent(
+                """\
+                from crochet import (
+                    run_in_reactor, wait_for, InFlightLimit,
+                    set_in_flight_limit)
+
+                set_in_flight_limit(InFlightLimit(100, "fail"))
+                set_in_flight_limit(None)
+
+                @run_in_reactor(in_flight_limit=InFlightLimit(10))
+                def foo(x: int) -> int:
+                    return x
+
+                @wait_for(1, in_flight_limit=InFlightLimit(10))
+                def bar(x: int) -> int:
+                    return x
+                """
+            ),
+        )
+        _assert_mypy(
+            False,
+            dedent(
+                """\
+                from crochet import set_in_flight_limit
+
+                set_in_flight_limit(100)
+                """
+            ),
+        )
+
     def test_eventual_result_cancel_signature(self) -> None:
         """
         EventualResult's cancel() method takes no arguments.
@@ -463,6 +572,59 @@ class MypyTests(TestCase):
             with self.subTest(result_type=result_type):
                 _assert_mypy(good, template.format(result_type=result_type))
 
+    def test_set_result_store(self) -> None:
+        """
+        set_result_store() accepts the built-in stores, and any other object
+        with IResultStore's methods and attributes.
+        """
+        for store, good in (
+            ("crochet.ResultStore()", True),
+            ("crochet.SQLiteResultStore('results.db')", True),
+            ("Store()", True),
+            ("Incomplete()", False),
+        ):
+            with self.subTest(store=store):
+                _assert_mypy(
+                    good,
+                    dedent(
+                        """\
+                        from typing import Any, Dict, Optional
+                        import crochet
+
+                        class Incomplete:
+                            evicted = 0
+                            expired = 0
+                            def __len__(self) -> int:
+                                return 0
+                            def configure(
+                                self, max_size: Optional[int] = None,
+                                ttl: Optional[float] = None,
+                            ) -> None:
+                                pass
+                            def store(
+                                self,
+                                deferred_result: crochet.EventualResult[Any],
+                                ttl: Optional[float] = None,
+                            ) -> int:
+                                return 0
+                            def retrieve(
+                                self, result_id: int
+                            ) -> crochet.EventualResult[object]:
+                                raise KeyError(result_id)
+                            def expire(self) -> None:
+                                pass
+                            def log_errors(self) -> None:
+                                pass
+
+                        class Store(Incomplete):
+                            def stats(self) -> Dict[str, int]:
+                                return {{}}
+
+                        crochet.set_result_store({store})
+                        """
+                    ).format(store=store),
+                )
+
     def test_version_string(self) -> None:
         """
         __version__ is a string.
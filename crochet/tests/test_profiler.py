@@ -0,0 +1,134 @@
+"""
+Tests for crochet._profiler.
+"""
+
+import threading
+
+from twisted.trial.unittest import TestCase
+from twisted.python import threadable
+
+from .._admission import InFlightLimit
+from .._eventloop import EventLoop, EventualResult
+from .._profiler import ReactorProfile, sample_thread
+from .test_setup import FakeReactor
+
+
+def blocked(event):
+    """
+    Block until the event is set.
+    """
+    event.wait()
+
+
+class SampleThreadTests(TestCase):
+    """
+    Tests for sample_thread() and ReactorProfile.
+    """
+
+    def blocked_thread(self):
+        """
+        Start a thread blocked in blocked(), and return its identifier.
+        """
+        started = threading.Event()
+        unblock = threading.Event()
+
+        def run():
+            started.set()
+            blocked(unblock)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(unblock.set)
+        started.wait()
+        return thread.ident
+
+    def test_samples(self):
+        """
+        The thread's stack is sampled every interval until the given number of
+        seconds has passed, with function names from outermost to innermost.
+        """
+        ident = self.blocked_thread()
+        times = iter([0, 0.5, 0.75, 1.0])
+        sleeps = []
+        profile = sample_thread(
+            ident, 1, 0.3, clock=lambda: next(times), sleep=sleeps.append)
+        self.assertEqual(profile.samples, 3)
+        self.assertEqual(profile.duration, 1.0)
+        self.assertEqual(sleeps, [0.3, 0.25])
+        [(stack, count)] = profile.stacks.items()
+        self.assertEqual(count, 3)
+        functions = stack.split(";")
+        self.assertTrue(functions[0].startswith("threading."))
+        self.assertIn("crochet.tests.test_profiler.blocked", functions)
+        self.assertTrue(functions[-1].endswith(".wait"))
+
+    def test_unknown_thread(self):
+        """
+        If the thread doesn't exist, no samples are taken.
+        """
+        times = iter([0, 1])
+        profile = sample_thread(
+            -1, 1, 0.5, clock=lambda: next(times), sleep=lambda _: None)
+        self.assertEqual((profile.samples, profile.stacks), (0, {}))
+
+    def test_folded(self):
+        """
+        ReactorProfile.folded() returns one line per stack, most common first.
+        """
+        profile = ReactorProfile({"a;b": 2, "a;c": 5, "a": 2}, 9, 1.0)
+        self.assertEqual(profile.folded(), "a;c 5\na 2\na;b 2\n")
+
+
+class ProfileReactorTests(TestCase):
+    """
+    Tests for EventLoop.profile_reactor().
+    """
+
+    def test_profile_reactor(self):
+        """
+        profile_reactor() samples the thread the reactor runs in.
+        """
+        reactor = FakeReactor()
+        eventloop = EventLoop(lambda: reactor, lambda f, g: None)
+        eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+        # The fake reactor runs calls in this thread:
+        profile = eventloop.profile_reactor(0.02, 0.01)
+        self.assertGreater(profile.samples, 0)
+        for stack in profile.stacks:
+            self.assertIn("test_profile_reactor", stack)
+
+    def test_bypasses_limits(self):
+        """
+        profile_reactor() finds the reactor thread with a "high" priority
+        call that isn't subject to the in-flight limit.
+        """
+        reactor = FakeReactor()
+        eventloop = EventLoop(lambda: reactor, lambda f, g: None)
+        eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+        limit = InFlightLimit(1, "fail")
+        limit.admit(EventualResult(None, reactor))
+        eventloop.set_in_flight_limit(limit)
+        priorities = []
+        submit = eventloop._submissions.submit
+
+        def record(f, *args, priority="normal"):
+            priorities.append(priority)
+            submit(f, *args, priority=priority)
+
+        self.patch(eventloop._submissions, "submit", record)
+        profile = eventloop.profile_reactor(0.02, 0.01)
+        self.assertGreater(profile.samples, 0)
+        self.assertEqual(priorities, ["high"])
+        self.assertEqual(limit.rejected, 0)
+
+    def test_not_in_reactor_thread(self):
+        """
+        profile_reactor() can't be called from the reactor thread.
+        """
+        eventloop = EventLoop(lambda: FakeReactor(), lambda f, g: None)
+        eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: True)
+        self.assertRaises(RuntimeError, eventloop.profile_reactor, 1)
@@ -0,0 +1,190 @@
+"""
+Tests for crochet._prometheus.
+"""
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import Deferred
+from twisted.python import threadable
+from twisted.web.test.requesthelper import DummyRequest
+
+from .._eventloop import EventLoop, EventualResult
+from .._admission import InFlightLimit
+from .._prometheus import MetricsResource, render_metrics, listen_metrics
+from .test_setup import FakeReactor
+
+
+class RenderMetricsTests(TestCase):
+    """
+    Tests for render_metrics().
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+        self.patch(threadable, "isInIOThread", lambda: False)
+
+    def samples(self):
+        """
+        Render the metrics, returning a dictionary mapping each sample's name
+        and labels to its value.
+        """
+        text = render_metrics(self.eventloop)
+        self.assertTrue(text.endswith("\n"))
+        samples = {}
+        for line in text.splitlines():
+            if line.startswith("#"):
+                continue
+            name, value = line.rsplit(" ", 1)
+            samples[name] = value
+        return samples
+
+    def test_gauges(self):
+        """
+        The queue lengths and result counts from reactor_stats() are rendered
+        as gauges.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            return Deferred()
+
+        result = func()
+        samples = self.samples()
+        self.assertEqual(samples["crochet_queued_calls"], "0")
+        self.assertEqual(samples["crochet_registered_results"], "1")
+        self.assertIn("crochet_stashed_results", samples)
+        self.assertIn("crochet_stashed_evicted_results_total", samples)
+        self.assertIn("crochet_stashed_expired_results_total", samples)
+        self.assertIn("crochet_log_queue_depth", samples)
+        del result
+
+    def test_types(self):
+        """
+        Each metric has HELP and TYPE lines.
+        """
+        text = render_metrics(self.eventloop)
+        self.assertIn("# TYPE crochet_queued_calls gauge\n", text)
+        self.assertIn("# HELP crochet_queued_calls ", text)
+
+    def test_monitor_histograms(self):
+        """
+        With monitoring enabled, the monitor's histograms are rendered as
+        Prometheus histograms with cumulative buckets.
+        """
+        self.assertNotIn("crochet_loop_lag_seconds_count", self.samples())
+        self.eventloop._start_monitor()
+        self.reactor.pump([0.1, 0.1])
+        samples = self.samples()
+        self.assertEqual(samples["crochet_loop_lag_seconds_count"], "2")
+        self.assertEqual(
+            samples['crochet_loop_lag_seconds_bucket{le="+Inf"}'], "2")
+        self.assertEqual(
+            samples['crochet_loop_lag_seconds_bucket{le="1e-05"}'], "2")
+        self.assertIn("crochet_queue_wait_seconds_sum", samples)
+
+    def test_in_flight_limit(self):
+        """
+        The global in-flight limit's state and counters are rendered.
+        """
+        limit = InFlightLimit(5, "fail")
+        self.eventloop.set_in_flight_limit(limit)
+
+        @self.eventloop.run_in_reactor
+        def func():
+            return Deferred()
+
+        result = func()
+        samples = self.samples()
+        self.assertEqual(samples["crochet_in_flight_calls"], "1")
+        self.assertEqual(samples["crochet_in_flight_limit"], "5")
+        self.assertEqual(samples["crochet_in_flight_admitted_total"], "1")
+        self.assertEqual(samples["crochet_in_flight_shed_total"], "0")
+        del result
+
+    def test_function_stats(self):
+        """
+        Per-function statistics are rendered with a function label, and a
+        phase label for the histograms.
+        """
+        @self.eventloop.run_in_reactor
+        def func():
+            return 1 / 0
+
+        self.assertRaises(ZeroDivisionError, func().wait, 0)
+        name = "%s.%s" % (func.__module__, func.__qualname__)
+        samples = self.samples()
+        self.assertEqual(
+            samples['crochet_calls_total{function="%s"}' % (name, )], "1")
+        self.assertEqual(
+            samples['crochet_call_errors_total{function="%s"}' % (name, )],
+            "1")
+        self.assertEqual(
+            samples['crochet_call_phase_seconds_count{function="%s",'
+                    'phase="start_to_fire"}' % (name, )], "1")
+
+    def test_escaping(self):
+        """
+        Label values are escaped.
+        """
+        self.eventloop._stats_for(type(
+            "F", (), {"__module__": 'a"b\\c', "__qualname__": "d\ne"}))
+        self.assertIn(
+            'crochet_calls_total{function="a\\"b\\\\c.d\\ne"} 0',
+            render_metrics(self.eventloop))
+
+
+class MetricsResourceTests(TestCase):
+    """
+    Tests for MetricsResource and listen_metrics().
+    """
+
+    def setUp(self):
+        self.reactor = FakeReactor()
+        self.listening = []
+        self.reactor.listenTCP = (
+            lambda port, factory, interface: self.listening.append(
+                (port, factory, interface)))
+        self.eventloop = EventLoop(lambda: self.reactor, lambda f, g: None)
+        self.eventloop.no_setup()
+
+    def test_render(self):
+        """
+        GET returns the rendered metrics, with the Prometheus content type.
+        """
+        request = DummyRequest([b""])
+        body = MetricsResource(self.eventloop).render_GET(request)
+        self.assertEqual(body.decode("utf-8"), render_metrics(self.eventloop))
+        self.assertEqual(
+            request.responseHeaders.getRawHeaders(b"content-type"),
+            [b"text/plain; version=0.0.4; charset=utf-8"])
+
+    def test_listen(self):
+        """
+        listen_metrics() listens on the given port and interface with a Site
+        serving a MetricsResource.
+        """
+        listen_metrics(self.eventloop, 9123, "127.0.0.1")
+        port, site, interface = self.listening[0]
+        self.assertEqual((port, interface), (9123, "127.0.0.1"))
+        self.assertIsInstance(site.resource, MetricsResource)
+
+    def test_serve_metrics(self):
+        """
+        EventLoop.serve_metrics() starts listening in the reactor thread.
+        """
+        self.patch(threadable, "isInIOThread", lambda: False)
+        self.eventloop.serve_metrics(9124)
+        self.assertEqual(self.listening[0][0], 9124)
+
+    def test_serve_metrics_bypasses_limits(self):
+        """
+        EventLoop.serve_metrics() starts listening even if the in-flight limit
+        is full.
+        """
+        self.patch(threadable, "isInIOThread", lambda: False)
+        limit = InFlightLimit(1, "fail")
+        limit.admit(EventualResult(None, self.reactor))
+        self.eventloop.set_in_flight_limit(limit)
+        self.eventloop.serve_metrics(9125)
+        self.assertEqual(self.listening[0][0], 9125)
+        self.assertEqual(limit.rejected, 0)
@@ -4,8 +4,9 @@ Tests for _resultstore.
 
 from twisted.trial.unittest import TestCase
 from twisted.internet.defer import Deferred, fail, succeed
+from zope.interface.verify import verifyObject
 
-from .._resultstore import ResultStore
+from .._resultstore import IResultStore, ResultStore
 from .._eventloop import EventualResult
 
 
@@ -14,6 +15,12 @@ class ResultStoreTests(TestCase):
     Tests for ResultStore.
     """
 
+    def test_interface(self):
+        """
+        ResultStore provides IResultStore.
+        """
+        self.assertTrue(verifyObject(IResultStore, ResultStore()))
+
     def test_store_and_retrieve(self):
         """
         EventualResult instances be be stored in a ResultStore and then
@@ -34,6 +41,17 @@ class ResultStoreTests(TestCase):
         store.retrieve(uid)
         self.assertRaises(KeyError, store.retrieve, uid)
 
+    def test_len(self):
+        """
+        The length of the store is the number of stored results.
+        """
+        store = ResultStore()
+        uid = store.store(EventualResult(Deferred(), None))
+        store.store(EventualResult(Deferred(), None))
+        self.assertEqual(len(store), 2)
+        store.retrieve(uid)
+        self.assertEqual(len(store), 1)
+
     def test_synchronized(self):
         """
         store() and retrieve() are synchronized.
@@ -71,3 +89,115 @@ class ResultStoreTests(TestCase):
         self.assertEqual(len(excs), 1)
         excs = self.flushLoggedErrors(RuntimeError)
         self.assertEqual(len(excs), 1)
+
+
+class ResultStoreLimitTests(TestCase):
+    """
+    Tests for ResultStore's size limit and TTLs.
+    """
+
+    def setUp(self):
+        self.now = 0
+        self.store = ResultStore(clock=lambda: self.now)
+
+    def test_max_size(self):
+        """
+        Once max_size results are stored, the least recently stored one is
+        evicted to make room, and counted.
+        """
+        self.store.configure(max_size=2)
+        uids = [
+            self.store.store(EventualResult(Deferred(), None))
+            for _ in range(3)]
+        self.assertEqual(len(self.store), 2)
+        self.assertEqual(self.store.evicted, 1)
+        self.assertRaises(KeyError, self.store.retrieve, uids[0])
+        self.store.retrieve(uids[1])
+        self.store.retrieve(uids[2])
+
+    def test_configure_evicts(self):
+        """
+        Lowering max_size evicts results immediately.
+        """
+        for _ in range(3):
+            self.store.store(EventualResult(Deferred(), None))
+        self.store.configure(max_size=1)
+        self.assertEqual((len(self.store), self.store.evicted), (1, 2))
+
+    def test_ttl(self):
+        """
+        Results expire once their TTL has passed, whether it comes from the
+        store's default or was given to store().
+        """
+        self.store.configure(ttl=10)
+        default = self.store.store(EventualResult(Deferred(), None))
+        short = self.store.store(EventualResult(Deferred(), None), ttl=1)
+        self.now = 1
+        self.assertRaises(KeyError, self.store.retrieve, short)
+        self.assertEqual((len(self.store), self.store.expired), (1, 1))
+        self.now = 10
+        self.store.expire()
+        self.assertEqual((len(self.store), self.store.expired), (0, 2))
+        self.assertRaises(KeyError, self.store.retrieve, default)
+
+    def test_stats(self):
+        """
+        stats() removes expired results, then reports how many are stored,
+        evicted and expired.
+        """
+        self.store.configure(max_size=1)
+        self.store.store(EventualResult(Deferred(), None))
+        self.store.store(EventualResult(Deferred(), None), ttl=1)
+        self.now = 1
+        self.assertEqual(
+            self.store.stats(), {"results": 0, "evicted": 1, "expired": 1})
+
+    def test_retrieved_before_ttl(self):
+        """
+        Results retrieved before their TTL passes aren't counted as expired.
+        """
+        uid = self.store.store(EventualResult(Deferred(), None), ttl=1)
+        self.store.retrieve(uid)
+        self.now = 2
+        self.store.expire()
+        self.assertEqual(self.store.expired, 0)
+
+    def test_deadlines_compacted(self):
+        """
+        Deadlines of results retrieved early don't accumulate.
+        """
+        for _ in range(1000):
+            self.store.retrieve(
+                self.store.store(EventualResult(Deferred(), None), ttl=5))
+        self.assertLess(len(self.store._deadlines), 100)
+
+    def test_log_discarded_errors(self):
+        """
+        Evicted and expired results have their errors, if any, logged.
+        """
+        self.store.configure(max_size=1)
+        self.store.store(
+            EventualResult(fail(ZeroDivisionError()), None), ttl=1)
+        self.store.store(EventualResult(fail(RuntimeError()), None), ttl=1)
+        self.store.store(EventualResult(succeed(1), None), ttl=1)
+        self.now = 1
+        self.store.expire()
+        self.assertEqual(
+            (self.store.evicted, self.store.expired, len(self.store)),
+            (2, 1, 0))
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+        self.assertEqual(len(self.flushLoggedErrors(RuntimeError)), 1)
+
+    def test_invalid(self):
+        """
+        max_size must be at least 1, and the TTL positive.
+        """
+        self.assertRaises(ValueError, self.store.configure, max_size=0)
+        self.assertRaises(ValueError, self.store.configure, ttl=0)
+
+    def test_synchronized(self):
+        """
+        configure() and expire() are synchronized.
+        """
+        self.assertTrue(ResultStore.configure.synchronized)
+        self.assertTrue(ResultStore.expire.synchronized)
@@ -8,15 +8,16 @@ import threading
 import warnings
 import subprocess
 import sys
+from logging import getLogger
 from unittest import SkipTest, TestCase
 
 import twisted
-from twisted.python.log import PythonLoggingObserver
-from twisted.python import log
+from twisted.logger import STDLibLogObserver, globalLogBeginner
 from twisted.python.runtime import platform
 from twisted.internet.task import Clock
 
-from .._eventloop import EventLoop, ThreadLogObserver, _store
+from .._eventloop import (
+    EventLoop, EventualResult, ThreadLogObserver, _store, _log_stashed_errors)
 from ..tests import crochet_directory
 
 
@@ -105,10 +106,137 @@ class SetupTests(TestCase):
         f(*args)
         self.assertTrue(reactor.stopping)
         f, args = atexit[1]
-        self.assertEqual(f, _store.log_errors)
+        self.assertEqual(f, _log_stashed_errors)
         self.assertEqual(args, ())
         f(*args)  # make sure it doesn't throw an exception
 
+    def test_monitor(self):
+        """
+        setup(monitor=True) starts a ReactorMonitor, whose statistics are
+        included in reactor_stats().
+        """
+        reactor = FakeReactor()
+        s = EventLoop(lambda: reactor, lambda f, *g: None,
+                      reapAllProcesses=lambda: None)
+        self.assertNotIn("loop_lag", s.reactor_stats())
+        s.setup(monitor=True)
+        reactor.pump([0.1] * 10)
+        stats = s.reactor_stats()
+        self.assertEqual(stats["queued_calls"], 0)
+        self.assertEqual(stats["loop_lag"]["count"], 10)
+
+    def test_monitor_later(self):
+        """
+        setup(monitor=True) starts monitoring even if setup() was already
+        called, but only one monitor is ever started.
+        """
+        reactor = FakeReactor()
+        s = EventLoop(lambda: reactor, lambda f, *g: None,
+                      reapAllProcesses=lambda: None)
+        s.setup()
+        self.assertNotIn("loop_lag", s.reactor_stats())
+        s.setup(monitor=True)
+        monitor = s._monitor
+        s.setup(monitor=True)
+        self.assertIs(s._monitor, monitor)
+        reactor.advance(0.1)
+        self.assertEqual(s.reactor_stats()["loop_lag"]["count"], 1)
+
+    def test_monitor_after_no_setup(self):
+        """
+        setup(monitor=True) starts monitoring even after no_setup().
+        """
+        reactor = FakeReactor()
+        s = EventLoop(lambda: reactor, lambda f, *g: None)
+        s.no_setup()
+        s.setup(monitor=True)
+        self.assertEqual(reactor.runs, 0)
+        self.assertIsNotNone(s._monitor)
+
+    def test_slow_callbacks(self):
+        """
+        setup(slow_callback_threshold=...) starts a SlowCallbackDetector,
+        which is stopped when the reactor shuts down.
+        """
+        reactor = FakeReactor()
+        s = EventLoop(lambda: reactor, lambda f, *g: None,
+                      reapAllProcesses=lambda: None)
+        self.assertEqual(s.slow_callbacks(), [])
+        s.setup(slow_callback_threshold=0.5)
+        detector = s._slow_callback_detector
+        self.addCleanup(detector.stop)
+        self.assertEqual(detector.threshold, 0.5)
+        self.assertEqual(s.reactor_stats()["slow_callbacks"], 0)
+        self.assertEqual(s.slow_callbacks(), [])
+        self.assertIn(("before", "shutdown", detector.stop), reactor.events)
+
+    def test_slow_callbacks_after_no_setup(self):
+        """
+        setup(slow_callback_threshold=...) starts detection even after
+        no_setup(), but only one detector is ever started.
+        """
+        reactor = FakeReactor()
+        s = EventLoop(lambda: reactor, lambda f, *g: None)
+        s.no_setup()
+        self.assertNotIn("slow_callbacks", s.reactor_stats())
+        s.setup(slow_callback_threshold=0.5)
+        detector = s._slow_callback_detector
+        self.addCleanup(detector.stop)
+        s.setup(slow_callback_threshold=1)
+        self.assertIs(s._slow_callback_detector, detector)
+        self.assertEqual(reactor.runs, 0)
+
+    def test_reactor_stats_before_setup(self):
+        """
+        reactor_stats() can be called before setup.
+        """
+        s = EventLoop(lambda: None, lambda f, *g: None)
+        stats = s.reactor_stats()
+        self.assertEqual(
+            (stats["queued_calls"], stats["reactor_queued_calls"],
+             stats["registered_results"], stats["log_queue_depth"]),
+            (0, 0, 0, 0))
+        self.assertEqual(stats["stashed_results"], len(_store))
+        self.assertEqual(
+            (stats["stashed_evicted"], stats["stashed_expired"]),
+            (_store.evicted, _store.expired))
+
+    def test_reactor_stats_sizes(self):
+        """
+        reactor_stats() includes the number of registered results and the
+        length of the log queue.
+        """
+        reactor = FakeReactor()
+        s = EventLoop(lambda: reactor, lambda f, *g: None,
+                      lambda observers, redirectStandardIO=True: None)
+        s.setup()
+        self.addCleanup(s._log_observer.stop)
+        result = EventualResult(None, reactor)
+        s._registry.register(result)
+        stats = s.reactor_stats()
+        self.assertEqual(stats["registered_results"], 1)
+        self.assertEqual(stats["log_queue_depth"], 0)
+
+    def test_log_queue_limit(self):
+        """
+        set_log_queue_limit() configures the ThreadLogObserver created by
+        setup(), and reconfigures it afterwards.
+        """
+        reactor = FakeReactor()
+        s = EventLoop(lambda: reactor, lambda f, *g: None,
+                      lambda observers, redirectStandardIO=True: None)
+        s.set_log_queue_limit(10, "drop-oldest")
+        s.setup()
+        observer = s._log_observer
+        self.addCleanup(observer.stop)
+        self.assertEqual((observer.limit, observer.policy), (10, "drop-oldest"))
+        s.set_log_queue_limit(20, "drop-by-level", 30)
+        self.assertEqual(
+            (observer.limit, observer.policy, observer.level),
+            (20, "drop-by-level", 30))
+        self.assertEqual(s.reactor_stats()["log_dropped"], 0)
+        self.assertRaises(ValueError, s.set_log_queue_limit, 10, "drop-all")
+
     def test_runs_with_lock(self):
         """
         All code in setup() and no_setup() is protected by a lock.
@@ -118,25 +246,24 @@ class SetupTests(TestCase):
 
     def test_logging(self):
         """
-        setup() registers a PythonLoggingObserver wrapped in a
+        setup() begins logging to a STDLibLogObserver wrapped in a
         ThreadLogObserver, removing the default log observer.
         """
         logging = []
 
-        def fakeStartLoggingWithObserver(observer, setStdout=1):
+        def fakeBeginLoggingTo(observers, redirectStandardIO=True):
+            [observer] = observers
             self.assertIsInstance(observer, ThreadLogObserver)
-            wrapped = observer._observer
-            expected = PythonLoggingObserver.emit
-            # Python 3 and 2 differ in value of __func__:
-            expected = getattr(expected, "__func__", expected)
-            self.assertIs(wrapped.__func__, expected)
-            self.assertEqual(setStdout, False)
+            self.assertIsInstance(observer._observer, STDLibLogObserver)
+            self.assertIs(observer._observer.logger, getLogger("twisted"))
+            self.assertIs(observer._logger, getLogger("twisted"))
+            self.assertEqual(redirectStandardIO, False)
             self.assertTrue(reactor.in_call_from_thread)
             logging.append(observer)
 
         reactor = FakeReactor()
         loop = EventLoop(
-            lambda: reactor, lambda f, *g: None, fakeStartLoggingWithObserver)
+            lambda: reactor, lambda f, *g: None, fakeBeginLoggingTo)
         loop.setup()
         self.assertTrue(logging)
         logging[0].stop()
@@ -151,7 +278,8 @@ class SetupTests(TestCase):
         s = EventLoop(
             lambda: reactor,
             lambda f, *arg: None,
-            lambda observer, setStdout=1: observers.append(observer))
+            lambda observers_, redirectStandardIO=True: observers.extend(
+                observers_))
         s.setup()
         self.addCleanup(observers[0].stop)
         self.assertIn(("after", "shutdown", observers[0].stop), reactor.events)
@@ -162,14 +290,14 @@ class SetupTests(TestCase):
         overriding the change made by normal Twisted logging setup.
         """
 
-        def fakeStartLoggingWithObserver(observer, setStdout=1):
-            warnings.showwarning = log.showwarning
-            self.addCleanup(observer.stop)
+        def fakeBeginLoggingTo(observers, redirectStandardIO=True):
+            warnings.showwarning = globalLogBeginner.showwarning
+            self.addCleanup(observers[0].stop)
 
         original = warnings.showwarning
         reactor = FakeReactor()
         loop = EventLoop(
-            lambda: reactor, lambda f, *g: None, fakeStartLoggingWithObserver)
+            lambda: reactor, lambda f, *g: None, fakeBeginLoggingTo)
         loop.setup()
         self.assertIs(warnings.showwarning, original)
 
@@ -196,7 +324,7 @@ class SetupTests(TestCase):
         loop = EventLoop(
             lambda: reactor,
             lambda f, *arg: atexit.append(f),
-            lambda observer, *a, **kw: observers.append(observer),
+            lambda observers_, *a, **kw: observers.extend(observers_),
             watchdog_thread=thread)
 
         loop.no_setup()
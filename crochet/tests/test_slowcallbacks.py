@@ -0,0 +1,168 @@
+"""
+Tests for crochet._slowcallbacks.
+"""
+
+import subprocess
+import sys
+import threading
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import succeed
+from twisted.internet.task import Clock
+from twisted.python import log
+
+from .._slowcallbacks import SlowCallbackDetector
+from ..tests import crochet_directory
+
+
+def blocking_callback(_, event):
+    """
+    A callback that blocks until the event is set.
+    """
+    event.wait()
+
+
+class SlowCallbackDetectorTests(TestCase):
+    """
+    Tests for SlowCallbackDetector.
+    """
+
+    def setUp(self):
+        self.now = 100.0
+        self.reactor = Clock()
+        self.detector = SlowCallbackDetector(
+            self.reactor, 0.2, clock=lambda: self.now)
+        self.messages = []
+        log.addObserver(self.messages.append)
+        self.addCleanup(log.removeObserver, self.messages.append)
+
+    def block_reactor_thread(self):
+        """
+        Start a thread that pretends to be the reactor thread, running a
+        Deferred callback that blocks until the test finishes.
+        """
+        started = threading.Event()
+        unblock = threading.Event()
+
+        def run():
+            self.detector._reactor_thread = threading.get_ident()
+            self.detector._beat()
+            started.set()
+            succeed(None).addCallback(blocking_callback, unblock)
+
+        thread = threading.Thread(target=run)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(unblock.set)
+        started.wait()
+
+    def test_not_slow(self):
+        """
+        Nothing is reported while the heartbeat keeps running.
+        """
+        self.block_reactor_thread()
+        self.now += 0.3
+        self.detector.check()
+        self.assertEqual(self.detector.detected, 0)
+        self.assertEqual(self.messages, [])
+
+    def test_slow(self):
+        """
+        If the heartbeat is overdue by more than the threshold, the reactor
+        thread's stack is captured and logged, blaming the callback the
+        reactor was running.
+        """
+        self.block_reactor_thread()
+        self.now += 0.31
+        self.detector.check()
+        self.assertEqual(self.detector.detected, 1)
+        [message] = self.messages
+        text = "".join(message["message"])
+        self.assertIn(
+            "blocked for over 0.200 seconds in "
+            "crochet.tests.test_slowcallbacks.blocking_callback", text)
+        self.assertIn("event.wait()", text)
+        # Only reported once:
+        self.detector.check()
+        self.assertEqual(self.detector.detected, 1)
+        self.assertEqual(list(self.detector.slow_callbacks), [])
+
+    def test_finished(self):
+        """
+        Once the heartbeat runs again, a SlowCallback is recorded with how
+        long the reactor was blocked.
+        """
+        self.block_reactor_thread()
+        self.now += 0.5
+        self.detector.check()
+        self.now += 1
+        self.detector._beat()
+        self.detector.check()
+        [slow] = self.detector.slow_callbacks
+        self.assertEqual(
+            slow.function,
+            "crochet.tests.test_slowcallbacks.blocking_callback")
+        self.assertAlmostEqual(slow.duration, 1.4)
+        self.assertIn("event.wait()", slow.stack)
+        self.assertIn(
+            "was blocked for 1.400 seconds",
+            "".join(self.messages[-1]["message"]))
+
+    def test_capacity(self):
+        """
+        Only the most recent SlowCallbacks are kept.
+        """
+        self.detector = SlowCallbackDetector(
+            self.reactor, 0.2, capacity=2, clock=lambda: self.now)
+        self.block_reactor_thread()
+        for _ in range(3):
+            self.now += 1
+            self.detector.check()
+            self.detector._beat()
+            self.detector.check()
+        self.assertEqual(len(self.detector.slow_callbacks), 2)
+        self.assertEqual(self.detector.detected, 3)
+
+    def test_start_stop(self):
+        """
+        start() starts the heartbeat in the reactor and the watchdog thread;
+        stop() stops both.
+        """
+        self.detector.start()
+        self.assertEqual(
+            self.detector._reactor_thread, threading.get_ident())
+        self.assertEqual(len(self.reactor.getDelayedCalls()), 1)
+        self.reactor.advance(0.1)
+        self.assertEqual(len(self.reactor.getDelayedCalls()), 1)
+        self.detector.stop()
+        self.assertEqual(self.reactor.getDelayedCalls(), [])
+        self.detector._thread.join(5)
+        self.assertFalse(self.detector._thread.is_alive())
+
+
+class EndToEndTests(TestCase):
+    """
+    Tests for slow callback detection with a real reactor.
+    """
+
+    def test_wait_for(self):
+        """
+        A @wait_for function that blocks the reactor thread is detected.
+        """
+        program = """\
+import time
+import crochet
+crochet.setup(slow_callback_threshold=0.05)
+
+@crochet.wait_for(timeout=5)
+def block():
+    time.sleep(0.3)
+
+block()
+time.sleep(0.2)
+[slow] = crochet.slow_callbacks()
+print(slow.function, slow.duration > 0.1)
+"""
+        output = subprocess.check_output(
+            [sys.executable, "-c", program], cwd=crochet_directory)
+        self.assertEqual(output, b"__main__.block True\n")
@@ -0,0 +1,288 @@
+"""
+Tests for crochet._sqlitestore.
+"""
+
+import gc
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import Deferred, fail, succeed
+from zope.interface.verify import verifyObject
+
+from .._eventloop import EventualResult
+from .._resultstore import IResultStore, ResultNotReady
+from .._sqlitestore import SQLiteResultStore, PickleSerializer
+from ..tests import crochet_directory
+
+
+def database_path(test):
+    """
+    Return the path of a database file in a temporary directory that is
+    removed once the test is done.
+    """
+    directory = tempfile.mkdtemp()
+    test.addCleanup(shutil.rmtree, directory)
+    return os.path.join(directory, "results.db")
+
+
+class JSONSerializer(object):
+    """
+    A serializer that only handles JSON-compatible values.
+    """
+
+    def dumps(self, obj):
+        return json.dumps(obj).encode("utf-8")
+
+    def loads(self, data):
+        return json.loads(data.decode("utf-8"))
+
+
+class SQLiteResultStoreTests(TestCase):
+    """
+    Tests for SQLiteResultStore.
+    """
+
+    def setUp(self):
+        self.path = database_path(self)
+        self.now = 1000.0
+
+    def open_store(self, **kwargs):
+        """
+        Return a SQLiteResultStore for the test's database, as another process
+        would open it.
+        """
+        store = SQLiteResultStore(
+            self.path, clock=lambda: self.now, **kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def test_interface(self):
+        """
+        SQLiteResultStore provides IResultStore.
+        """
+        self.assertTrue(verifyObject(IResultStore, self.open_store()))
+
+    def test_wal(self):
+        """
+        The database is in WAL mode.
+        """
+        store = self.open_store()
+        self.assertEqual(
+            store._db.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+
+    def test_retrieve_pending_locally(self):
+        """
+        Before it has a result, the process that stored an EventualResult
+        retrieves the original instance, and only once.
+        """
+        store = self.open_store()
+        dr = EventualResult(Deferred(), None)
+        uid = store.store(dr)
+        self.assertEqual(len(store), 1)
+        self.assertIdentical(store.retrieve(uid), dr)
+        self.assertRaises(KeyError, store.retrieve, uid)
+        self.assertEqual(len(store), 0)
+
+    def test_pending_elsewhere(self):
+        """
+        Other processes get ResultNotReady for an EventualResult without a
+        result, and its result once it has one.
+        """
+        store = self.open_store()
+        other = self.open_store()
+        d = Deferred()
+        uid = store.store(EventualResult(d, None))
+        self.assertRaises(ResultNotReady, other.retrieve, uid)
+        d.callback({"answer": 42})
+        store.flush()
+        result = other.retrieve(uid)
+        self.assertEqual(result.wait(0), {"answer": 42})
+        self.assertRaises(KeyError, store.retrieve, uid)
+
+    def test_cancel_retrieved(self):
+        """
+        Cancelling a result retrieved from the database has no effect.
+        """
+        store = self.open_store()
+        uid = store.store(EventualResult(succeed(3), None))
+        store.flush()
+        result = self.open_store().retrieve(uid)
+        result.cancel()
+        self.assertEqual(result.wait(0), 3)
+
+    def test_uids_unique(self):
+        """
+        Identifiers are unique across all stores using the database.
+        """
+        store = self.open_store()
+        other = self.open_store()
+        uids = set()
+        for _ in range(5):
+            uids.add(store.store(EventualResult(succeed(1), None)))
+            uids.add(other.store(EventualResult(succeed(2), None)))
+        self.assertEqual(len(uids), 10)
+
+    def test_error(self):
+        """
+        Error results are stored as their exception, and the original
+        EventualResult no longer logs it once it has been written.
+        """
+        store = self.open_store()
+        dr = EventualResult(fail(ZeroDivisionError("oops")), None)
+        uid = store.store(dr)
+        store.flush()
+        del dr
+        gc.collect()
+        self.assertEqual(self.flushLoggedErrors(ZeroDivisionError), [])
+        result = self.open_store().retrieve(uid)
+        exc = self.assertRaises(ZeroDivisionError, result.wait, 0)
+        self.assertEqual(exc.args, ("oops", ))
+
+    def test_unserializable(self):
+        """
+        Results that can't be serialized are logged, and can only be
+        retrieved by the process that stored them.
+        """
+        store = self.open_store(serializer=JSONSerializer())
+        value = object()
+        uid = store.store(EventualResult(succeed(value), None))
+        store.flush()
+        self.assertEqual(len(self.flushLoggedErrors(TypeError)), 1)
+        self.assertRaises(KeyError, self.open_store().retrieve, uid)
+        self.assertIdentical(store.retrieve(uid).wait(0), value)
+        self.assertRaises(KeyError, store.retrieve, uid)
+
+    def test_unserializable_error_logged(self):
+        """
+        Unserializable error results still held at shutdown have their errors
+        logged.
+        """
+        store = self.open_store(serializer=JSONSerializer())
+        store.store(EventualResult(fail(ZeroDivisionError(object())), None))
+        store.flush()
+        self.assertEqual(len(self.flushLoggedErrors(TypeError)), 1)
+        store.log_errors()
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+        self.assertEqual(len(store), 0)
+
+    def test_serializer(self):
+        """
+        Results are serialized with the given serializer.
+        """
+        store = self.open_store(serializer=JSONSerializer())
+        uid = store.store(EventualResult(succeed([1, "2"]), None))
+        store.flush()
+        [(data, )] = store._db.execute(
+            "SELECT data FROM crochet_results").fetchall()
+        self.assertEqual(data, b'[1, "2"]')
+        self.assertEqual(store.retrieve(uid).wait(0), [1, "2"])
+
+    def test_ttl(self):
+        """
+        Results expire once their TTL has passed, and their errors are logged
+        by the process that removes them.
+        """
+        store = self.open_store(ttl=10)
+        default = store.store(EventualResult(succeed(1), None))
+        short = store.store(
+            EventualResult(fail(ZeroDivisionError()), None), ttl=1)
+        store.flush()
+        self.now += 1
+        other = self.open_store()
+        self.assertRaises(KeyError, other.retrieve, short)
+        self.assertEqual((len(other), other.expired), (1, 1))
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+        self.now += 9
+        store.expire()
+        self.assertEqual((len(store), store.expired), (0, 1))
+        self.assertRaises(KeyError, store.retrieve, default)
+
+    def test_max_size(self):
+        """
+        Once max_size results are stored, the oldest are evicted, even if
+        another process stored them.
+        """
+        other = self.open_store()
+        first = other.store(EventualResult(succeed(1), None))
+        store = self.open_store(max_size=2)
+        store.store(EventualResult(succeed(2), None))
+        store.store(EventualResult(succeed(3), None))
+        store.flush()
+        self.assertEqual((len(store), store.evicted), (2, 1))
+        self.assertRaises(KeyError, store.retrieve, first)
+
+    def test_stats(self):
+        """
+        stats() reports the number of stored results as of the writer
+        thread's last refresh, without using the database.
+        """
+        store = self.open_store(ttl=10)
+        store.store(EventualResult(succeed(1), None))
+        store.store(EventualResult(succeed(2), None), ttl=1)
+        store.flush()
+        self.assertEqual(
+            store.stats(), {"results": 2, "evicted": 0, "expired": 0})
+        self.now += 1
+        store.flush()
+        # Even while the database is in use:
+        with store._lock:
+            self.assertEqual(
+                store.stats(), {"results": 1, "evicted": 0, "expired": 1})
+
+    def test_log_errors(self):
+        """
+        At shutdown, results without a result are removed, while completed
+        ones are written for other processes to retrieve.
+        """
+        store = self.open_store()
+        pending = store.store(EventualResult(Deferred(), None))
+        done = store.store(EventualResult(succeed(1), None))
+        store.log_errors()
+        other = self.open_store()
+        self.assertRaises(KeyError, other.retrieve, pending)
+        self.assertEqual(other.retrieve(done).wait(0), 1)
+
+    def test_pickle(self):
+        """
+        PickleSerializer round-trips values.
+        """
+        serializer = PickleSerializer()
+        self.assertEqual(
+            serializer.loads(serializer.dumps({"a": [1, 2.5]})),
+            {"a": [1, 2.5]})
+
+
+class EndToEndTests(TestCase):
+    """
+    Tests for sharing results between processes.
+    """
+
+    def test_other_process(self):
+        """
+        A result stashed by one process can be retrieved by another.
+        """
+        path = database_path(self)
+        program = """\
+import sys
+import crochet
+crochet.setup()
+crochet.set_result_store(crochet.SQLiteResultStore(sys.argv[1]))
+
+@crochet.run_in_reactor
+def answer():
+    return 42
+
+result = answer()
+result.wait(5)
+print(result.stash())
+"""
+        output = subprocess.check_output(
+            [sys.executable, "-c", program, path], cwd=crochet_directory)
+        store = SQLiteResultStore(path)
+        self.addCleanup(store.close)
+        self.assertEqual(store.retrieve(int(output)).wait(0), 42)
@@ -0,0 +1,145 @@
+"""
+Tests for crochet._stats.
+"""
+
+import gc
+import threading
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.defer import CancelledError
+from twisted.python.failure import Failure
+
+from .._stats import FunctionStats, CallTiming
+
+
+class FunctionStatsTests(TestCase):
+    """
+    Tests for FunctionStats.
+    """
+
+    def test_shard_per_thread(self):
+        """
+        Each thread gets its own shard, and keeps getting the same one.
+        """
+        stats = FunctionStats("f")
+        shards = []
+        thread = threading.Thread(target=lambda: shards.append(stats.shard()))
+        thread.start()
+        thread.join()
+        self.assertIs(stats.shard(), stats.shard())
+        self.assertIsNot(stats.shard(), shards[0])
+
+    def test_snapshot_combines_shards(self):
+        """
+        A snapshot adds up the counters and histograms of all threads.
+        """
+        stats = FunctionStats("f")
+
+        def record():
+            shard = stats.shard()
+            shard.calls += 2
+            shard.errors += 1
+            shard.submit_to_start.record(0.5)
+
+        thread = threading.Thread(target=record)
+        thread.start()
+        thread.join()
+        record()
+        snapshot = stats.snapshot()
+        self.assertEqual(
+            (snapshot["calls"], snapshot["errors"], snapshot["timeouts"],
+             snapshot["cancellations"]),
+            (4, 2, 0, 0))
+        self.assertEqual(snapshot["submit_to_start"]["count"], 2)
+        self.assertEqual(snapshot["fire_to_wake"]["count"], 0)
+
+    def test_exited_threads_retired(self):
+        """
+        Once a thread exits its shard is discarded, but what it recorded is
+        still included in snapshots.
+        """
+        stats = FunctionStats("f")
+
+        def record():
+            shard = stats.shard()
+            shard.calls += 1
+            shard.start_to_fire.record(0.5)
+
+        for _ in range(10):
+            thread = threading.Thread(target=record)
+            thread.start()
+            thread.join()
+        gc.collect()
+        record()
+        self.assertEqual(stats._shards, [stats.shard()])
+        snapshot = stats.snapshot()
+        self.assertEqual(snapshot["calls"], 11)
+        self.assertEqual(snapshot["start_to_fire"]["count"], 11)
+
+
+class CallTimingTests(TestCase):
+    """
+    Tests for CallTiming.
+    """
+
+    def setUp(self):
+        self.stats = FunctionStats("f")
+
+    def test_phases(self):
+        """
+        Each phase is recorded as it ends.
+        """
+        timing = CallTiming(self.stats)
+        timing.started()
+        timing.fired(123)
+        timing.woke()
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot["calls"], 1)
+        for phase in ("submit_to_start", "start_to_fire", "fire_to_wake"):
+            self.assertEqual(snapshot[phase]["count"], 1)
+        self.assertEqual(snapshot["errors"], 0)
+
+    def test_error(self):
+        """
+        A failure other than cancellation counts as an error.
+        """
+        timing = CallTiming(self.stats)
+        timing.started()
+        timing.fired(Failure(ZeroDivisionError()))
+        self.assertEqual(self.stats.snapshot()["errors"], 1)
+
+    def test_cancellation(self):
+        """
+        A CancelledError counts as a cancellation.
+        """
+        timing = CallTiming(self.stats)
+        timing.started()
+        timing.fired(Failure(CancelledError()))
+        snapshot = self.stats.snapshot()
+        self.assertEqual((snapshot["cancellations"], snapshot["errors"]),
+                         (1, 0))
+
+    def test_timeout(self):
+        """
+        A timeout counts as a timeout, and not as a cancellation even though
+        the Deferred is then cancelled.
+        """
+        timing = CallTiming(self.stats)
+        timing.started()
+        timing.timed_out()
+        timing.fired(Failure(CancelledError()))
+        snapshot = self.stats.snapshot()
+        self.assertEqual((snapshot["timeouts"], snapshot["cancellations"]),
+                         (1, 0))
+
+    def test_never_started(self):
+        """
+        If the call was never started, only the submission is recorded.
+        """
+        timing = CallTiming(self.stats)
+        timing.fired(Failure(CancelledError()))
+        timing.woke()
+        snapshot = self.stats.snapshot()
+        self.assertEqual(snapshot["calls"], 1)
+        self.assertEqual(snapshot["start_to_fire"]["count"], 0)
+        self.assertEqual(snapshot["fire_to_wake"]["count"], 0)
@@ -0,0 +1,237 @@
+"""
+Tests for crochet._submission.
+"""
+
+from twisted.trial.unittest import TestCase
+
+from .._metrics import Histogram
+from .._submission import SubmissionQueue
+
+
+class DelayingReactor(object):
+    """
+    A fake reactor that stores callFromThread calls until told to run them.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def callFromThread(self, f, *args, **kwargs):
+        self.calls.append((f, args, kwargs))
+
+    def run_calls(self):
+        calls, self.calls = self.calls, []
+        for f, args, kwargs in calls:
+            f(*args, **kwargs)
+
+
+class SubmissionQueueTests(TestCase):
+    """
+    Tests for SubmissionQueue.
+    """
+
+    def test_runs_in_reactor(self):
+        """
+        Submitted calls are run, in order, when the reactor runs the
+        callFromThread call scheduled by submit().
+        """
+        reactor = DelayingReactor()
+        queue = SubmissionQueue(reactor)
+        calls = []
+        queue.submit(calls.append, 1)
+        queue.submit(calls.append, 2)
+        self.assertEqual(calls, [])
+        reactor.run_calls()
+        self.assertEqual(calls, [1, 2])
+
+    def test_single_wakeup(self):
+        """
+        Only one callFromThread call is made while the queue is non-empty.
+        """
+        reactor = DelayingReactor()
+        queue = SubmissionQueue(reactor)
+        for i in range(10):
+            queue.submit(lambda: None)
+        self.assertEqual(len(reactor.calls), 1)
+
+    def test_wakeup_after_drain(self):
+        """
+        Once the queue has been drained, the next submit() schedules a new
+        wakeup.
+        """
+        reactor = DelayingReactor()
+        queue = SubmissionQueue(reactor)
+        calls = []
+        queue.submit(calls.append, 1)
+        reactor.run_calls()
+        queue.submit(calls.append, 2)
+        self.assertEqual(len(reactor.calls), 1)
+        reactor.run_calls()
+        self.assertEqual(calls, [1, 2])
+
+    def test_len(self):
+        """
+        The length of the queue is the number of calls waiting to be run.
+        """
+        reactor = DelayingReactor()
+        queue = SubmissionQueue(reactor)
+        queue.submit(lambda: None)
+        queue.submit(lambda: None)
+        self.assertEqual(len(queue), 2)
+        reactor.run_calls()
+        self.assertEqual(len(queue), 0)
+
+    def test_errors_logged(self):
+        """
+        An exception raised by a submitted call is logged, and does not
+        prevent later calls from running.
+        """
+        reactor = DelayingReactor()
+        queue = SubmissionQueue(reactor)
+        calls = []
+        queue.submit(lambda: 1 / 0)
+        queue.submit(calls.append, 1)
+        reactor.run_calls()
+        self.assertEqual(calls, [1])
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+
+    def test_synchronized(self):
+        """
+        Access to the queue's internal state is synchronized.
+        """
+        self.assertTrue(SubmissionQueue._append.synchronized)
+        self.assertTrue(SubmissionQueue._take.synchronized)
+
+
+class PriorityTests(TestCase):
+    """
+    Tests for SubmissionQueue priorities.
+    """
+
+    def setUp(self):
+        self.reactor = DelayingReactor()
+        self.queue = SubmissionQueue(self.reactor)
+        self.patch(self.queue, "BUDGET", 14)
+        self.calls = []
+
+    def submit(self, priority, count):
+        for i in range(count):
+            self.queue.submit(
+                self.calls.append, (priority, i), priority=priority)
+
+    def test_default_priority(self):
+        """
+        Calls have normal priority by default.
+        """
+        self.submit("low", 1)
+        self.queue.submit(self.calls.append, "default")
+        self.submit("normal", 1)
+        self.reactor.run_calls()
+        self.assertEqual(self.calls, ["default", ("normal", 0), ("low", 0)])
+
+    def test_higher_priority_first(self):
+        """
+        Within a batch, higher priority calls are run first, and calls of the
+        same priority run in the order they were submitted.
+        """
+        self.submit("low", 2)
+        self.submit("normal", 2)
+        self.submit("high", 2)
+        self.reactor.run_calls()
+        self.assertEqual(self.calls, [
+            ("high", 0), ("high", 1), ("normal", 0), ("normal", 1),
+            ("low", 0), ("low", 1)])
+
+    def test_budget(self):
+        """
+        At most BUDGET calls are run per wakeup; if more are queued another
+        wakeup is scheduled, without a new submission being needed.
+        """
+        self.submit("normal", 20)
+        self.reactor.run_calls()
+        self.assertEqual(len(self.calls), 14)
+        self.assertEqual(len(self.queue), 6)
+        self.assertEqual(len(self.reactor.calls), 1)
+        self.reactor.run_calls()
+        self.assertEqual(len(self.calls), 20)
+        self.assertEqual(self.reactor.calls, [])
+
+    def test_no_new_wakeup_while_more(self):
+        """
+        While a follow-up wakeup is pending, submissions don't schedule
+        another one.
+        """
+        self.submit("normal", 20)
+        self.reactor.run_calls()
+        self.submit("high", 1)
+        self.assertEqual(len(self.reactor.calls), 1)
+
+    def test_weighted_round_robin(self):
+        """
+        When more calls are queued than fit in a batch, each lane gets a share
+        of the batch according to its weight, so low priority calls are not
+        starved.
+        """
+        self.submit("low", 10)
+        self.submit("normal", 10)
+        self.submit("high", 10)
+        self.reactor.run_calls()
+        counts = dict(
+            (priority, len([c for c in self.calls if c[0] == priority]))
+            for priority in SubmissionQueue.PRIORITIES)
+        self.assertEqual(counts, {"high": 8, "normal": 4, "low": 2})
+
+    def test_unused_share(self):
+        """
+        A lane's unused share of a batch goes to the other lanes.
+        """
+        self.submit("low", 20)
+        self.submit("high", 1)
+        self.reactor.run_calls()
+        self.assertEqual(self.calls[0], ("high", 0))
+        self.assertEqual(len(self.calls), 14)
+
+    def test_high_priority_overtakes(self):
+        """
+        A high priority call submitted while a backlog is queued runs in the
+        next batch.
+        """
+        self.submit("normal", 100)
+        self.reactor.run_calls()
+        self.submit("high", 1)
+        self.reactor.run_calls()
+        self.assertEqual(self.calls[14], ("high", 0))
+
+
+class WaitTimeTests(TestCase):
+    """
+    Tests for SubmissionQueue.wait_times.
+    """
+
+    def test_recorded_per_wakeup(self):
+        """
+        If wait_times is set, the time each wakeup waited is recorded there.
+        """
+        reactor = DelayingReactor()
+        queue = SubmissionQueue(reactor)
+        queue.wait_times = Histogram([1])
+        queue.submit(lambda: None)
+        queue.submit(lambda: None)
+        reactor.run_calls()
+        self.assertEqual(queue.wait_times.count, 1)
+        self.assertTrue(0 <= queue.wait_times.max < 1)
+
+    def test_follow_up_wakeups(self):
+        """
+        Follow-up wakeups, for calls that didn't fit in a batch, are recorded
+        too.
+        """
+        reactor = DelayingReactor()
+        queue = SubmissionQueue(reactor)
+        self.patch(queue, "BUDGET", 1)
+        queue.wait_times = Histogram([1])
+        queue.submit(lambda: None)
+        queue.submit(lambda: None)
+        reactor.run_calls()
+        reactor.run_calls()
+        self.assertEqual(queue.wait_times.count, 2)
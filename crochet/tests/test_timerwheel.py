@@ -0,0 +1,185 @@
+"""
+Tests for crochet._timerwheel.
+"""
+
+from twisted.trial.unittest import TestCase
+from twisted.internet.task import Clock
+
+from .._timerwheel import TimerWheel
+
+
+class TimerWheelTests(TestCase):
+    """
+    Tests for TimerWheel.
+    """
+
+    def setUp(self):
+        self.clock = Clock()
+        self.wheel = TimerWheel(self.clock, resolution=0.01, slots=8)
+
+    def test_fires_after_delay(self):
+        """
+        A timer's function is called with its arguments once the delay has
+        passed, and not before.
+        """
+        calls = []
+        self.wheel.add(0.05, calls.append, 1)
+        self.clock.advance(0.04)
+        self.assertEqual(calls, [])
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [1])
+
+    def test_never_early(self):
+        """
+        A delay that doesn't fall on a tick boundary is rounded up to the next
+        tick.
+        """
+        calls = []
+        self.clock.advance(0.003)
+        self.wheel.add(0.015, calls.append, 1)
+        self.clock.advance(0.014)
+        self.assertEqual(calls, [])
+        self.clock.advance(0.006)
+        self.assertEqual(calls, [1])
+
+    def test_zero_delay(self):
+        """
+        A timer with no delay fires on the next tick.
+        """
+        calls = []
+        self.wheel.add(0, calls.append, 1)
+        self.assertEqual(calls, [])
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [1])
+
+    def test_longer_than_revolution(self):
+        """
+        Timers further away than one revolution of the wheel are not fired
+        when their slot is first visited.
+        """
+        calls = []
+        # 8 slots of 0.01 seconds is a 0.08 second revolution:
+        self.wheel.add(0.25, calls.append, 1)
+        self.clock.pump([0.01] * 24)
+        self.assertEqual(calls, [])
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [1])
+
+    def test_catch_up(self):
+        """
+        If the reactor falls behind, all timers that expired in the meantime
+        are fired on the next tick, even if that is more than one revolution
+        later.
+        """
+        calls = []
+        for i in range(20):
+            self.wheel.add(i * 0.01, calls.append, i)
+        self.clock.advance(1)
+        self.assertEqual(sorted(calls), list(range(20)))
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_cancel(self):
+        """
+        A cancelled timer is not fired, and is no longer active.
+        """
+        calls = []
+        timer = self.wheel.add(0.01, calls.append, 1)
+        self.assertTrue(timer.active())
+        timer.cancel()
+        self.assertFalse(timer.active())
+        self.clock.advance(1)
+        self.assertEqual(calls, [])
+
+    def test_cancel_twice(self):
+        """
+        Cancelling a timer a second time has no effect.
+        """
+        self.wheel.add(0.02, lambda: None)
+        timer = self.wheel.add(0.01, lambda: None)
+        timer.cancel()
+        timer.cancel()
+        self.assertEqual(len(self.wheel), 1)
+
+    def test_fired_inactive(self):
+        """
+        A timer that has fired is no longer active.
+        """
+        timer = self.wheel.add(0.01, lambda: None)
+        self.clock.advance(0.01)
+        self.assertFalse(timer.active())
+
+    def test_cancelled_by_earlier_timer(self):
+        """
+        A timer cancelled by another timer expiring in the same tick is not
+        fired.
+        """
+        calls = []
+        second = []
+        self.wheel.add(0.01, lambda: second[0].cancel())
+        second.append(self.wheel.add(0.01, calls.append, 2))
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [])
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_single_delayed_call(self):
+        """
+        However many timers there are, only a single reactor delayed call is
+        used to drive the wheel.
+        """
+        for i in range(100):
+            self.wheel.add(i * 0.001, lambda: None)
+        self.assertEqual(len(self.clock.getDelayedCalls()), 1)
+
+    def test_stops_when_empty(self):
+        """
+        Once all timers have fired or been cancelled the wheel stops ticking,
+        and starts again when a new timer is added.
+        """
+        calls = []
+        self.wheel.add(0.01, calls.append, 1)
+        timer = self.wheel.add(0.05, calls.append, 2)
+        self.clock.advance(0.01)
+        timer.cancel()
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+        self.wheel.add(0.01, calls.append, 3)
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [1, 3])
+        self.assertEqual(self.clock.getDelayedCalls(), [])
+
+    def test_added_while_running(self):
+        """
+        A timer added by a firing timer is scheduled relative to the current
+        time.
+        """
+        calls = []
+        self.wheel.add(
+            0.01, lambda: self.wheel.add(0.02, calls.append, 1))
+        self.clock.advance(0.01)
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [])
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [1])
+
+    def test_len(self):
+        """
+        The length of the wheel is the number of active timers.
+        """
+        self.wheel.add(0.01, lambda: None)
+        timer = self.wheel.add(0.02, lambda: None)
+        self.assertEqual(len(self.wheel), 2)
+        timer.cancel()
+        self.assertEqual(len(self.wheel), 1)
+        self.clock.advance(0.01)
+        self.assertEqual(len(self.wheel), 0)
+
+    def test_errors_logged(self):
+        """
+        An exception raised by a timer's function is logged, and does not
+        prevent other timers from firing.
+        """
+        calls = []
+        self.wheel.add(0.01, lambda: 1 / 0)
+        self.wheel.add(0.01, calls.append, 1)
+        self.clock.advance(0.01)
+        self.assertEqual(calls, [1])
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
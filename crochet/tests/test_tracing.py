@@ -0,0 +1,186 @@
+"""
+Tests for crochet._tracing.
+"""
+
+import io
+import json
+import os
+import tempfile
+
+from twisted.trial.unittest import TestCase
+
+from .. import _tracing
+from .._tracing import (
+    Tracer, InMemoryExporter, JSONLinesExporter, current_span, NOT_SAMPLED)
+
+
+class TracerTests(TestCase):
+    """
+    Tests for Tracer and Span.
+    """
+
+    def setUp(self):
+        self.exporter = InMemoryExporter()
+        self.tracer = Tracer(self.exporter)
+
+    def test_root_span(self):
+        """
+        With no current span, start_span() starts a new trace.
+        """
+        span = self.tracer.start_span("op", attributes={"a": 1})
+        self.assertTrue(span.recording)
+        self.assertEqual(
+            (span.name, span.parent_id, span.attributes), ("op", None, {"a": 1}))
+        self.assertEqual((len(span.trace_id), len(span.span_id)), (32, 16))
+        self.assertIsNone(span.end_time)
+
+    def test_child_span(self):
+        """
+        A span started with a parent is part of the parent's trace.
+        """
+        parent = self.tracer.start_span("parent")
+        child = self.tracer.start_span("child", parent=parent)
+        self.assertEqual(
+            (child.trace_id, child.parent_id),
+            (parent.trace_id, parent.span_id))
+        self.assertNotEqual(child.span_id, parent.span_id)
+
+    def test_finish(self):
+        """
+        Finishing a span sets its end time and status and exports it, once.
+        """
+        span = self.tracer.start_span("op")
+        span.finish("cancelled")
+        span.finish("ok")
+        self.assertEqual(self.exporter.spans(), [span])
+        self.assertEqual(span.status, "cancelled")
+        self.assertGreaterEqual(span.end_time, span.start_time)
+
+    def test_events_and_errors(self):
+        """
+        Events are recorded with a timestamp, and set_error() records the
+        exception type.
+        """
+        span = self.tracer.start_span("op")
+        span.add_event("started")
+        span.set_error(ZeroDivisionError)
+        self.assertEqual([name for (name, _) in span.events], ["started"])
+        self.assertEqual(span.status, "error")
+        self.assertEqual(
+            span.attributes["error.type"], "builtins.ZeroDivisionError")
+
+    def test_export_error(self):
+        """
+        Errors raised by the exporter are logged.
+        """
+        class BrokenExporter(object):
+            def export(self, span):
+                raise ZeroDivisionError()
+
+        Tracer(BrokenExporter()).start_span("op").finish()
+        self.assertEqual(len(self.flushLoggedErrors(ZeroDivisionError)), 1)
+
+    def test_sample_rate(self):
+        """
+        A new trace is recorded if a random number is below the sample rate.
+        Otherwise a non-recording span is returned, and its descendants don't
+        record either.
+        """
+        tracer = Tracer(self.exporter, 0.25)
+        self.patch(_tracing.random, "random", lambda: 0.2)
+        self.assertTrue(tracer.start_span("op").recording)
+        self.patch(_tracing.random, "random", lambda: 0.3)
+        span = tracer.start_span("op")
+        self.assertIs(span, NOT_SAMPLED)
+        span.set_attribute("a", 1)
+        span.add_event("e")
+        span.finish()
+        self.patch(_tracing.random, "random", lambda: 0)
+        self.assertIs(tracer.start_span("child", parent=span), NOT_SAMPLED)
+        self.assertEqual(self.exporter.spans(), [])
+        self.assertEqual((span.attributes, span.events), ({}, []))
+
+    def test_invalid_sample_rate(self):
+        """
+        The sample rate must be between 0 and 1.
+        """
+        self.assertRaises(ValueError, Tracer, self.exporter, 1.5)
+        self.assertRaises(ValueError, Tracer, self.exporter, -0.1)
+
+    def test_span_context_manager(self):
+        """
+        Tracer.span() makes a new span current for the duration of the block,
+        as a child of the previous current span.
+        """
+        self.assertIsNone(current_span())
+        with self.tracer.span("outer") as outer:
+            self.assertIs(current_span(), outer)
+            with self.tracer.span("inner") as inner:
+                self.assertIs(current_span(), inner)
+            self.assertIs(current_span(), outer)
+        self.assertIsNone(current_span())
+        self.assertEqual(self.exporter.spans(), [inner, outer])
+        self.assertEqual(inner.parent_id, outer.span_id)
+
+    def test_span_context_manager_error(self):
+        """
+        If the block raises an exception, the span is marked as failed.
+        """
+        with self.assertRaises(ZeroDivisionError):
+            with self.tracer.span("op") as span:
+                1 / 0
+        self.assertEqual(self.exporter.spans(), [span])
+        self.assertEqual(span.status, "error")
+        self.assertIsNone(current_span())
+
+
+class ExporterTests(TestCase):
+    """
+    Tests for InMemoryExporter and JSONLinesExporter.
+    """
+
+    def test_in_memory_capacity(self):
+        """
+        InMemoryExporter keeps only the most recent spans.
+        """
+        exporter = InMemoryExporter(capacity=2)
+        tracer = Tracer(exporter)
+        spans = [tracer.start_span(str(i)) for i in range(3)]
+        for span in spans:
+            span.finish()
+        self.assertEqual(exporter.spans(), spans[1:])
+        exporter.clear()
+        self.assertEqual(exporter.spans(), [])
+
+    def test_json_lines_file(self):
+        """
+        JSONLinesExporter writes one JSON object per span to a file-like
+        object.
+        """
+        output = io.StringIO()
+        tracer = Tracer(JSONLinesExporter(output))
+        span = tracer.start_span("op", attributes={"a": object()})
+        span.add_event("started")
+        span.finish()
+        tracer.start_span("op2").finish()
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 2)
+        record = json.loads(lines[0])
+        self.assertEqual(
+            (record["name"], record["span_id"], record["status"],
+             record["events"][0]["name"]),
+            ("op", span.span_id, "ok", "started"))
+        self.assertIn("object", record["attributes"]["a"])
+
+    def test_json_lines_path(self):
+        """
+        JSONLinesExporter appends to the file at a given path.
+        """
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "spans.jsonl")
+        exporter = JSONLinesExporter(path)
+        self.addCleanup(exporter.close)
+        Tracer(exporter).start_span("op").finish()
+        exporter.flush()
+        with open(path) as f:
+            self.assertEqual(json.loads(f.read())["name"], "op")